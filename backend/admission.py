@@ -0,0 +1,216 @@
+"""Admission control for the public write endpoints.
+
+AdmissionControl is an ASGI middleware, so everything here happens before
+FastAPI reads (and for /api/submit, spools to disk) the request body:
+
+1. Body size: the request must declare a Content-Length (411 otherwise)
+   no larger than the route's limit (413). uvicorn refuses a body longer
+   than its declared length, so the check holds for the bytes actually read.
+2. Per-client rate limit: a token bucket per client IP (429). Checked
+   before the upload slots, so a client over its limit never competes
+   for one.
+3. Upload slots: at most UPLOAD_SLOTS uploads in flight across every
+   gunicorn worker (503, and the rate-limit token is given back). A slot
+   is an fcntl lock on one of UPLOAD_SLOTS files, held until the
+   response is sent, so a worker that dies frees its slots with it.
+
+Rejections carry Retry-After. Per-email limits need the parsed form, so
+the routes call RateLimiter.take() themselves once they have it.
+
+Token buckets live in the rate_buckets table, so every worker draws from
+the same bucket. A take is one UPSERT: refill by elapsed time, and spend
+a token only if one is there.
+"""
+import asyncio, json, math, os, time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines run a single process
+    fcntl = None
+
+
+def _rate(name: str, default: str) -> Tuple[float, float]:
+    """A "<burst>/<seconds>" setting: burst requests, refilled evenly over that many seconds."""
+    burst, seconds = os.getenv(name, default).split("/")
+    return float(burst), float(seconds)
+
+
+RATE_SUBMIT_IP     = _rate("RATE_SUBMIT_IP", "20/3600")
+RATE_SUBMIT_EMAIL  = _rate("RATE_SUBMIT_EMAIL", "10/3600")
+RATE_FEEDBACK_IP   = _rate("RATE_FEEDBACK_IP", "5/3600")
+RATE_FEEDBACK_EMAIL = _rate("RATE_FEEDBACK_EMAIL", "3/3600")
+RATE_PRUNE_INTERVAL = float(os.getenv("RATE_PRUNE_INTERVAL", "600"))
+UPLOAD_SLOTS       = int(os.getenv("UPLOAD_SLOTS", "4"))
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", "10"))
+# Proxies in front of the app that append to X-Forwarded-For (Render's router is one)
+PROXY_HOPS         = int(os.getenv("PROXY_HOPS", "1"))
+
+RATE_LIMIT_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS rate_buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID""",
+]
+
+
+class RateLimiter:
+    def __init__(self, get_conn):
+        self.get_conn = get_conn
+        self._pruned_at = 0.0
+
+    def take(self, key: str, limit: Tuple[float, float], now: float = None) -> float:
+        """Spend one token from key's bucket; 0 if allowed, else seconds until a token is back."""
+        burst, seconds = limit
+        rate = burst / seconds
+        now = now or time.time()
+        conn = self.get_conn()
+        try:
+            refill = "min(?, tokens + (? - updated_at) * ?)"
+            row = conn.execute(f"""INSERT INTO rate_buckets (key, tokens, updated_at) VALUES (?, ? - 1, ?)
+                                   ON CONFLICT(key) DO UPDATE SET tokens = {refill} - 1, updated_at = ?
+                                   WHERE {refill} >= 1 RETURNING tokens""",
+                               (key, burst, now, burst, now, rate, now, burst, now, rate)).fetchone()
+            if row is None:
+                left = conn.execute(f"SELECT {refill} AS t FROM rate_buckets WHERE key=?",
+                                    (burst, now, rate, key)).fetchone()["t"]
+                conn.commit()
+                return max(1.0, (1 - left) / rate)
+            if now - self._pruned_at > RATE_PRUNE_INTERVAL:
+                # A bucket idle this long is full again, the same as no row at all
+                self._pruned_at = now
+                conn.execute("DELETE FROM rate_buckets WHERE updated_at < ?", (now - 86400,))
+            conn.commit()
+            return 0.0
+        finally:
+            conn.close()
+
+
+    def refund(self, key: str, limit: Tuple[float, float]):
+        """Give back a token taken for a request that was then turned away."""
+        conn = self.get_conn()
+        try:
+            conn.execute("UPDATE rate_buckets SET tokens = min(?, tokens + 1) WHERE key=?", (limit[0], key))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class UploadSlots:
+    """At most n uploads at once across processes, one fcntl lock per slot."""
+
+    def __init__(self, directory, n: int = UPLOAD_SLOTS):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.n = n
+
+    def acquire(self):
+        """A held slot (pass it to release()), or None when every slot is taken."""
+        if fcntl is None:
+            return True
+        for i in range(self.n):
+            fh = open(self.directory / f"slot-{i}", "a")
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fh.close()
+                continue
+            return fh
+        return None
+
+    def release(self, slot):
+        if slot is not True:
+            slot.close()  # closing the file drops the lock
+
+
+def _size(n: int) -> str:
+    return f"{n // (1024 * 1024)}MB" if n >= 1024 * 1024 else f"{n // 1024}KB"
+
+
+def client_ip(scope) -> str:
+    """The client's address: from X-Forwarded-For when PROXY_HOPS proxies add to it."""
+    if PROXY_HOPS > 0:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                hops = [h.strip() for h in value.decode("latin-1").split(",") if h.strip()]
+                # Entries left of the ones our proxies appended are client-supplied and can be forged
+                if hops:
+                    return hops[max(0, len(hops) - PROXY_HOPS)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionControl:
+    """ASGI middleware applying per-route body limits, IP rate limits and upload slots.
+
+    routes maps "METHOD /path" to {"max_body": bytes, "rate": (burst, seconds),
+    "slot": bool}; other requests pass straight through.
+    """
+
+    def __init__(self, app, routes: Dict[str, dict], limiter: RateLimiter, slots: Optional[UploadSlots] = None):
+        self.app = app
+        self.routes = routes
+        self.limiter = limiter
+        self.slots = slots
+
+    async def __call__(self, scope, receive, send):
+        rule = self.routes.get(f"{scope.get('method')} {scope.get('path')}") if scope["type"] == "http" else None
+        if rule is None:
+            return await self.app(scope, receive, send)
+        route = scope["path"]
+
+        length = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                length = int(value) if value.isdigit() else -1
+                break
+        if length is None or length < 0:
+            return await self._refuse(send, route, 411, "length_required", "Content-Length required")
+        if length > rule["max_body"]:
+            return await self._refuse(send, route, 413, "too_large", f"Request body exceeds {_size(rule['max_body'])}")
+
+        key = f"{route}:ip:{client_ip(scope)}"
+        if rule.get("rate"):
+            # A take is a write that may wait on busy_timeout; keep it off the event loop
+            wait = await asyncio.to_thread(self.limiter.take, key, rule["rate"])
+            if wait:
+                return await self._refuse(send, route, 429, "rate_ip", "Too many requests, please slow down",
+                                          retry_after=wait, receive=receive)
+        slot = None
+        if rule.get("slot") and self.slots is not None:
+            slot = self.slots.acquire()
+            if slot is None:
+                # A client told to come back later shouldn't have paid a token for it
+                if rule.get("rate"):
+                    await asyncio.to_thread(self.limiter.refund, key, rule["rate"])
+                return await self._refuse(send, route, 503, "upload_slots",
+                                          "Server is busy processing uploads, please retry shortly",
+                                          retry_after=UPLOAD_RETRY_AFTER, receive=receive)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if slot is not None:
+                self.slots.release(slot)
+
+    async def _refuse(self, send, route: str, status: int, reason: str, detail: str, retry_after: float = None,
+                      receive=None):
+        """Answer without running the app. With receive, the (size-checked) body is read and
+        discarded first: closing on a client that is still uploading resets the connection,
+        and the client would never see the status or Retry-After."""
+        metrics.inc("admission_rejected_total", route=route, reason=reason)
+        if receive is not None:
+            while True:
+                message = await receive()
+                if message["type"] != "http.request" or not message.get("more_body"):
+                    break
+        body = json.dumps({"detail": detail}).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                   (b"connection", b"close")]
+        if retry_after:
+            headers.append((b"retry-after", str(math.ceil(retry_after)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,190 @@
+"""Streaming reader for uploaded .zip / .tar / .gz archives.
+
+Members are read one at a time straight from the archive (zipfile member
+streams, tarfile in "r|*" stream mode, gzip for a bare .gz), hashed and
+counted as they are decompressed; nothing is unpacked to disk. The
+declared sizes in archive headers are only used to fail early, never
+trusted, so a zip bomb is stopped once the bytes actually produced pass:
+
+- ARCHIVE_MAX_MEMBERS     files in the archive
+- ARCHIVE_MAX_TOTAL_BYTES uncompressed bytes across all members
+- ARCHIVE_MAX_RATIO       uncompressed / compressed size (enforced past
+                          ARCHIVE_RATIO_FLOOR bytes, so small, very
+                          compressible text archives still pass)
+
+Only members small enough to parse (ARCHIVE_MAX_MEMBER_BYTES) and of a
+type extraction understands keep their bytes; the rest are drained for
+their hash. Archives nested inside the archive and member names that
+would escape an extraction directory (absolute, or with "..") reject the
+whole upload.
+"""
+import gzip, hashlib, io, os, posixpath, tarfile, zipfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+ARCHIVE_EXT = {".zip", ".tar", ".gz"}
+
+ARCHIVE_MAX_MEMBERS      = int(os.getenv("ARCHIVE_MAX_MEMBERS", "1000"))
+ARCHIVE_MAX_TOTAL_BYTES  = int(os.getenv("ARCHIVE_MAX_TOTAL_BYTES", str(200 * 1024 * 1024)))
+ARCHIVE_MAX_MEMBER_BYTES = int(os.getenv("ARCHIVE_MAX_MEMBER_BYTES", str(20 * 1024 * 1024)))
+ARCHIVE_MAX_RATIO        = float(os.getenv("ARCHIVE_MAX_RATIO", "100"))
+ARCHIVE_RATIO_FLOOR      = int(os.getenv("ARCHIVE_RATIO_FLOOR", str(1024 * 1024)))
+
+_CHUNK = 256 * 1024
+
+
+class ArchiveRejected(Exception):
+    """The archive is unreadable or breaks one of the size limits."""
+
+
+def is_archive(name: str) -> bool:
+    return Path(name).suffix.lower() in ARCHIVE_EXT
+
+
+class _Budget:
+    """Running totals shared by every member of one archive."""
+
+    def __init__(self, compressed_size: int, max_members: int, max_total: int, max_ratio: float):
+        self.compressed_size = max(1, compressed_size)
+        self.max_members = max_members
+        self.max_total = max_total
+        self.max_ratio = max_ratio
+        self.members = 0
+        self.total = 0
+
+    def add_member(self):
+        self.members += 1
+        if self.members > self.max_members:
+            raise ArchiveRejected(f"more than {self.max_members} files")
+
+    def check_declared(self, size: int):
+        if self.total + size > self.max_total:
+            raise ArchiveRejected(f"expands beyond {self.max_total // (1024 * 1024)}MB")
+
+    def add_bytes(self, n: int):
+        self.total += n
+        if self.total > self.max_total:
+            raise ArchiveRejected(f"expands beyond {self.max_total // (1024 * 1024)}MB")
+        if self.total > ARCHIVE_RATIO_FLOOR and self.total / self.compressed_size > self.max_ratio:
+            raise ArchiveRejected(f"compression ratio above {self.max_ratio:g}:1")
+
+
+def _check_name(name: str):
+    """Refuse member names that escape the archive root and archives inside archives."""
+    parts = name.replace("\\", "/").split("/")
+    if posixpath.isabs(name) or name.startswith("\\") or ":" in parts[0] or ".." in parts:
+        raise ArchiveRejected(f"unsafe member path: {name[:200]}")
+    if is_archive(name):
+        raise ArchiveRejected(f"nested archive: {name[:200]}")
+
+
+def _read_member(stream, name: str, budget: _Budget, keep) -> dict:
+    """Hash and count a member's bytes, keeping them only if keep(name) and small enough."""
+    sha = hashlib.sha256()
+    buf = io.BytesIO() if keep(name) else None
+    size = 0
+    while True:
+        chunk = stream.read(_CHUNK)
+        if not chunk:
+            break
+        budget.add_bytes(len(chunk))
+        sha.update(chunk)
+        size += len(chunk)
+        if buf is not None:
+            if size > ARCHIVE_MAX_MEMBER_BYTES:
+                buf = None
+            else:
+                buf.write(chunk)
+    return {"name": name, "size": size, "sha256": sha.hexdigest(),
+            "data": buf.getvalue() if buf is not None else None}
+
+
+def _zip_members(path, budget, keep):
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            budget.add_member()
+            _check_name(info.filename)
+            budget.check_declared(info.file_size)
+            with zf.open(info) as stream:
+                yield _read_member(stream, info.filename, budget, keep)
+
+
+def _tar_members(fileobj, budget, keep):
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tf:
+        for info in tf:
+            if not info.isfile():  # links, devices and directories carry no content
+                continue
+            budget.add_member()
+            _check_name(info.name)
+            budget.check_declared(info.size)
+            yield _read_member(tf.extractfile(info), info.name, budget, keep)
+
+
+def iter_members(path, keep=lambda name: True, name: str = None, max_members: int = ARCHIVE_MAX_MEMBERS,
+                 max_total: int = ARCHIVE_MAX_TOTAL_BYTES,
+                 max_ratio: float = ARCHIVE_MAX_RATIO) -> Iterator[dict]:
+    """Yield {"name", "size", "sha256", "data"} for each file in the archive.
+
+    data is None for members keep() declines or that exceed
+    ARCHIVE_MAX_MEMBER_BYTES. name is the upload's original filename,
+    used to name the content of a bare .gz. Raises ArchiveRejected
+    part-way through if a limit is broken or the archive is corrupt.
+    """
+    path = Path(path)
+    budget = _Budget(path.stat().st_size, max_members, max_total, max_ratio)
+    ext = path.suffix.lower()
+    try:
+        if ext == ".zip":
+            yield from _zip_members(path, budget, keep)
+        elif ext == ".tar":
+            with open(path, "rb") as f:
+                yield from _tar_members(f, budget, keep)
+        elif ext == ".gz":
+            # .tar.gz and friends stream as a tar; anything else is one gzipped file
+            with open(path, "rb") as f:
+                try:
+                    with tarfile.open(fileobj=f, mode="r|gz") as tar:
+                        # Zero blocks read as an empty tar; a gzipped bomb of zeros must not pass as one
+                        is_tar = tar.firstmember is not None
+                except tarfile.ReadError:
+                    is_tar = False
+                if is_tar:
+                    f.seek(0)
+                    yield from _tar_members(f, budget, keep)
+                    return
+                f.seek(0)
+                inner = _gzip_stored_name(f) or Path(name or path.name).stem
+                f.seek(0)
+                budget.add_member()
+                with gzip.GzipFile(fileobj=f) as gz:
+                    yield _read_member(gz, inner, budget, keep)
+        else:
+            raise ArchiveRejected(f"not an archive: {path.name}")
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, tarfile.TarError, gzip.BadGzipFile,
+            EOFError, NotImplementedError, RuntimeError, OSError, ValueError) as e:
+        # RuntimeError: encrypted zip members; NotImplementedError: unsupported compression
+        raise ArchiveRejected(f"unreadable archive ({type(e).__name__})") from e
+
+
+def _gzip_stored_name(f) -> Optional[str]:
+    """The original filename recorded in a gzip header (FNAME), if any."""
+    head = f.read(10)
+    if len(head) < 10 or head[:2] != b"\x1f\x8b" or not head[3] & 0x08:
+        return None
+    if head[3] & 0x04:  # FEXTRA comes first
+        xlen = int.from_bytes(f.read(2), "little")
+        f.read(xlen)
+    raw = bytearray()
+    while len(raw) < 1024:
+        c = f.read(1)
+        if not c or c == b"\0":
+            break
+        raw += c
+    return os.path.basename(raw.decode("latin-1")) or None
+
+
+def join_member_texts(members) -> str:
+    """Export text for an archive: its members' texts in archive order."""
+    return "\n".join(m["text"] for m in members if m["text"] and m["text"] != "[Image file]")
@@ -0,0 +1,239 @@
+"""Content-addressed storage for uploaded files.
+
+Every uploaded file is stored once under STORAGE/blobs, keyed by its
+SHA-256 plus the lower-cased extension (extraction dispatches on the
+extension, so identical bytes uploaded as .txt and .csv are two blobs):
+
+    storage/blobs/3f/a2/3fa2…e91.pdf
+
+The blobs table counts how many submissions reference each blob.
+Submissions keep the blob paths in file_paths and the original names in
+file_names; their status lives only in the database, so approving or
+rejecting never touches the disk.
+
+Blobs whose refcount has dropped to zero are removed by collect_garbage()
+once they have been untouched for BLOB_GC_GRACE seconds. A blob is
+touched when an upload reserves it, before its file is put in place, and
+the collector renames files away while holding the database write lock,
+so an upload racing the collector always ends with its file on disk.
+Files derived from a blob (image thumbnails) are removed along with it.
+"""
+import hashlib, json, os, shutil, time, uuid
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from .metrics import timed
+
+BLOB_GC_GRACE = float(os.getenv("BLOB_GC_GRACE", "3600"))
+BLOB_GC_BATCH = int(os.getenv("BLOB_GC_BATCH", "500"))
+
+BLOB_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS blobs (
+        key TEXT PRIMARY KEY,
+        hash TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        touched_at REAL NOT NULL
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs(refcount, touched_at)",
+    # Physical bytes on disk, next to the per-submission (logical) counters in stats.py
+    """CREATE TRIGGER IF NOT EXISTS blobs_bytes_ai AFTER INSERT ON blobs BEGIN
+        INSERT INTO stats_counters (key, value) VALUES ('bytes:blobs', new.size)
+            ON CONFLICT(key) DO UPDATE SET value = value + new.size;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS blobs_bytes_ad AFTER DELETE ON blobs BEGIN
+        INSERT INTO stats_counters (key, value) VALUES ('bytes:blobs', -old.size)
+            ON CONFLICT(key) DO UPDATE SET value = value - old.size;
+    END""",
+]
+
+
+class BlobStore:
+    def __init__(self, root, get_conn, derived=()):
+        self.root = Path(root)
+        self.get_conn = get_conn
+        self.derived = list(derived)  # callables: blob hash -> path of a file made from it
+        self.tmp_dir = self.root / ".tmp"
+        self.trash_dir = self.root / ".trash"
+
+    @staticmethod
+    def key_for(digest: str, filename: str) -> str:
+        return digest + Path(filename).suffix.lower()
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def key_of(self, path) -> str:
+        """Blob key for a stored path, or None for files outside the store (legacy layout)."""
+        p = Path(path)
+        return p.name if p.parent.parent.parent == self.root else None
+
+    def temp_path(self) -> Path:
+        """A fresh path to stream an upload into before put()."""
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        return self.tmp_dir / uuid.uuid4().hex
+
+    @timed("blob_put")
+    def put(self, tmp_path: Path, digest: str, filename: str) -> Tuple[str, Path]:
+        """Move a fully written upload into the store; returns (key, blob path).
+
+        The file becomes a real reference only when the caller's transaction
+        calls incref(); until then it is protected from GC by the grace period.
+        """
+        key = self.key_for(digest, filename)
+        size = tmp_path.stat().st_size
+        conn = self.get_conn()
+        try:
+            conn.execute("""INSERT INTO blobs (key, hash, size, refcount, touched_at) VALUES (?,?,?,0,?)
+                            ON CONFLICT(key) DO UPDATE SET touched_at=excluded.touched_at""",
+                         (key, digest, size, time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+        dest = self.path_for(key)
+        if dest.exists():
+            tmp_path.unlink()
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, dest)
+        return key, dest
+
+    def incref(self, conn, keys: Iterable[str]):
+        """Count new references, inside the caller's transaction."""
+        conn.executemany("UPDATE blobs SET refcount = refcount + 1 WHERE key=?", [(k,) for k in keys])
+
+    def decref(self, conn, keys: Iterable[str]):
+        now = time.time()
+        conn.executemany("UPDATE blobs SET refcount = refcount - 1, touched_at=? WHERE key=?",
+                         [(now, k) for k in keys])
+
+    def collect_garbage(self, grace: float = BLOB_GC_GRACE, batch: int = BLOB_GC_BATCH) -> dict:
+        """Delete unreferenced blobs older than the grace period."""
+        removed = size = 0
+        self.trash_dir.mkdir(parents=True, exist_ok=True)
+        while True:
+            conn = self.get_conn()
+            moved: List[Tuple[Path, Path]] = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                rows = conn.execute("SELECT key, hash, size FROM blobs WHERE refcount <= 0 AND touched_at < ? LIMIT ?",
+                                    (time.time() - grace, batch)).fetchall()
+                for r in rows:
+                    src = self.path_for(r["key"])
+                    if src.exists():
+                        dest = self.trash_dir / r["key"]
+                        os.replace(src, dest)
+                        moved.append((src, dest))
+                conn.executemany("DELETE FROM blobs WHERE key=?", [(r["key"],) for r in rows])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                for src, dest in moved:
+                    os.replace(dest, src)
+                raise
+            finally:
+                conn.close()
+            for _, dest in moved:
+                dest.unlink()
+            for r in rows:
+                for path_for in self.derived:
+                    path_for(r["hash"]).unlink(missing_ok=True)
+            removed += len(rows)
+            size += sum(r["size"] for r in rows)
+            if len(rows) < batch:
+                break
+        # Uploads that died before put() leave files here; anything a day old is abandoned
+        if self.tmp_dir.exists():
+            cutoff = time.time() - 86400
+            for p in self.tmp_dir.iterdir():
+                try:
+                    if p.stat().st_mtime < cutoff:
+                        p.unlink()
+                except OSError:
+                    pass
+        return {"removed": removed, "bytes": size}
+
+
+def _sha256_file(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _rewrite_job_paths(conn, submission_id: str, moved: dict):
+    """Point the submission's unfinished HF push jobs at the files' new blob paths."""
+    rows = conn.execute("SELECT j.id, j.files FROM hf_jobs j JOIN hf_job_items i ON i.job_id = j.id "
+                        "WHERE i.submission_id=? AND j.status != 'DONE'", (submission_id,)).fetchall()
+    for r in rows:
+        files = json.loads(r["files"])
+        if any(f.get("path") in moved for f in files):
+            files = [dict(f, path=moved[f["path"]]) if f.get("path") in moved else f for f in files]
+            conn.execute("UPDATE hf_jobs SET files=? WHERE id=?", (json.dumps(files), r["id"]))
+
+
+def migrate_legacy_files(store: BlobStore, storage, batch_size: int = 200) -> dict:
+    """Move files from STORAGE/<status>/<lang>/<sid>/ into the blob store.
+
+    Safe to re-run and to interrupt: a file already moved by an earlier,
+    interrupted run is found again through its hash. Queued HF push jobs
+    are rewritten in the same transaction as their submission's paths.
+    """
+    storage = Path(storage)
+    metrics = {"submissions": 0, "files": 0, "deduplicated": 0, "missing": 0}
+    after = ""
+    while True:
+        conn = store.get_conn()
+        try:
+            rows = conn.execute("SELECT id, language, file_paths, file_hashes FROM submissions WHERE id > ? "
+                                "ORDER BY id LIMIT ?", (after, batch_size)).fetchall()
+        finally:
+            conn.close()
+        for r in rows:
+            paths = json.loads(r["file_paths"] or "[]")
+            hashes = json.loads(r["file_hashes"] or "[]")
+            if all(store.key_of(p) for p in paths):
+                continue
+            new_paths, new_keys, moved = [], [], {}
+            for i, fp in enumerate(paths):
+                if store.key_of(fp):
+                    new_paths.append(fp)
+                    continue
+                digest = hashes[i] if i < len(hashes) else None
+                if os.path.exists(fp):
+                    digest = digest or _sha256_file(fp)
+                    existed = store.path_for(store.key_for(digest, fp)).exists()
+                    key, dest = store.put(Path(fp), digest, fp)
+                    metrics["deduplicated" if existed else "files"] += 1
+                elif digest and store.path_for(store.key_for(digest, fp)).exists():
+                    key, dest = store.key_for(digest, fp), store.path_for(store.key_for(digest, fp))
+                else:
+                    metrics["missing"] += 1
+                    new_paths.append(fp)
+                    continue
+                new_paths.append(str(dest))
+                new_keys.append(key)
+                moved[fp] = str(dest)
+            conn = store.get_conn()
+            try:
+                store.incref(conn, new_keys)
+                conn.execute("UPDATE submissions SET file_paths=? WHERE id=?", (json.dumps(new_paths), r["id"]))
+                _rewrite_job_paths(conn, r["id"], moved)
+                conn.commit()
+            finally:
+                conn.close()
+            metrics["submissions"] += 1
+        if len(rows) < batch_size:
+            break
+        after = rows[-1]["id"]
+    # Drop the emptied <status>/<lang>/<sid> folders
+    for status in ("pending", "approved", "rejected"):
+        base = storage / status
+        if not base.exists():
+            continue
+        for lang_dir in base.iterdir():
+            for d in list(lang_dir.iterdir()) if lang_dir.is_dir() else []:
+                if d.is_dir() and not any(d.rglob("*")):
+                    shutil.rmtree(d, ignore_errors=True)
+    return metrics
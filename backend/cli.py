@@ -0,0 +1,113 @@
+"""Maintenance commands.
+
+Run from the project root, e.g.:
+
+    python -m backend.cli rededupe --workers 4
+    python -m backend.cli reexport --language tamil
+    python -m backend.cli export --format parquet --since 2025-01-01 -o corpus.parquet
+    python -m backend.cli migrate-blobs
+    python -m backend.cli backfill-images && python -m backend.cli rededupe
+    python -m backend.cli build-static
+
+build-static runs at deploy time, before the data disk is mounted, so it
+must not import backend.main (which opens the database); the other
+commands import it when they run.
+"""
+import argparse, asyncio, json, sys
+from pathlib import Path
+
+from . import dedupe, bulk_export, images, static_assets
+from .blobstore import migrate_legacy_files
+
+
+def cmd_rededupe(args):
+    from .main import get_db, extractor
+    conn = get_db()
+    try:
+        result = dedupe.rededupe_corpus(conn, cache=extractor.cache, workers=args.workers)
+    finally:
+        conn.close()
+    print(json.dumps(result))
+
+
+def cmd_reexport(args):
+    from .main import db_read_pool, extractor, export_writer
+    written = asyncio.run(bulk_export.rebuild_exports(db_read_pool.acquire, extractor, export_writer, args.language))
+    print(json.dumps(written))
+
+
+def cmd_export(args):
+    from .main import db_read_pool, extractor
+    filters = {"language": args.language, "category": args.category, "since": args.since, "until": args.until}
+    if args.format == "parquet" and not bulk_export.PARQUET_AVAILABLE:
+        sys.exit("Parquet export requires pyarrow")
+    stream = bulk_export.stream_parquet if args.format == "parquet" else bulk_export.stream_ndjson
+
+    async def run(out):
+        async for chunk in stream(db_read_pool.acquire, extractor, **filters):
+            out.write(chunk)
+
+    if args.output == "-":
+        asyncio.run(run(sys.stdout.buffer))
+    else:
+        with open(args.output, "wb") as out:
+            asyncio.run(run(out))
+
+
+def cmd_migrate_blobs(args):
+    from .main import blob_store, STORAGE
+    print(json.dumps(migrate_legacy_files(blob_store, STORAGE)))
+
+
+def cmd_backfill_images(args):
+    from .main import get_db, image_processor
+    if image_processor is None:
+        sys.exit("Image analysis requires Pillow")
+    print(json.dumps(images.backfill_images(get_db, image_processor)))
+
+
+def cmd_build_static(args):
+    import os
+    base = Path(__file__).resolve().parent.parent
+    dest = static_assets.ensure_built(base / "frontend",
+                                      Path(os.getenv("STATIC_BUILD", str(base / "build" / "static"))))
+    manifest = json.loads((dest / "manifest.json").read_text(encoding="utf-8"))
+    print(json.dumps({"build": str(dest), "files": len(manifest["files"]), "brotli": static_assets.BROTLI_AVAILABLE}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.cli", description="Mozhii.AI maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rededupe", help="Rebuild duplicate indexes and flags for the whole corpus")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    p.set_defaults(func=cmd_rededupe)
+
+    p = sub.add_parser("reexport", help="Regenerate the JSONL export shards from the database")
+    p.add_argument("--language", default=None, help="Only this language (default: all)")
+    p.set_defaults(func=cmd_reexport)
+
+    p = sub.add_parser("export", help="Write approved records to a file as NDJSON or Parquet")
+    p.add_argument("--format", choices=["ndjson", "parquet"], default="ndjson")
+    p.add_argument("--language", default=None)
+    p.add_argument("--category", default=None)
+    p.add_argument("--since", default=None, help="Created on/after (ISO date)")
+    p.add_argument("--until", default=None, help="Created before (ISO timestamp), or on or before (ISO date)")
+    p.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("migrate-blobs", help="Move files from the per-status folders into the blob store")
+    p.set_defaults(func=cmd_migrate_blobs)
+
+    p = sub.add_parser("backfill-images", help="Thumbnails, GPS stripping and image hashes for older uploads")
+    p.set_defaults(func=cmd_backfill_images)
+
+    p = sub.add_parser("build-static", help="Fingerprint and precompress the frontend assets")
+    p.set_defaults(func=cmd_build_static)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""SQLite connection pooling.
+
+Opening a connection and re-running PRAGMAs on every call is measurable
+overhead on the request path, and a handler that raised before
+conn.close() used to leak its connection. Connections here are opened
+once, configured once, and handed out from a thread-safe pool.
+
+Pooled connections are wrapped so existing ``conn = get_db() ...
+conn.close()`` code keeps working: close() returns the connection to the
+pool (rolling back anything left uncommitted) instead of closing it.
+
+A pool given an observer reports how long each execute/executemany/commit
+took as observer(sql, seconds); for a SELECT that covers running it to
+the first row, not fetching the rest.
+"""
+import os, queue, sqlite3, threading, time
+
+DB_POOL_SIZE    = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE    = int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+DB_CACHE_KB     = int(os.getenv("DB_CACHE_KB", "16384"))
+
+
+class PooledConnection:
+    """Proxy for a pooled sqlite3.Connection; close() gives it back."""
+
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn: sqlite3.Connection, pool: "ConnectionPool"):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, *args):
+        observer = self._pool.observer
+        if observer is None:
+            return self._conn.execute(*args)
+        start = time.perf_counter()
+        try:
+            return self._conn.execute(*args)
+        finally:
+            observer(args[0], time.perf_counter() - start)
+
+    def executemany(self, *args):
+        observer = self._pool.observer
+        if observer is None:
+            return self._conn.executemany(*args)
+        start = time.perf_counter()
+        try:
+            return self._conn.executemany(*args)
+        finally:
+            observer(args[0], time.perf_counter() - start)
+
+    def commit(self):
+        observer = self._pool.observer
+        if observer is None:
+            return self._conn.commit()
+        start = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            observer("COMMIT", time.perf_counter() - start)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Safety net for code paths that forget close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, path, size: int = DB_POOL_SIZE, readonly: bool = False, observer=None):
+        self.path = str(path)
+        self.size = size
+        self.readonly = readonly
+        self.observer = observer
+        self._idle = queue.LifoQueue(maxsize=size)  # LIFO keeps hot connections hot
+        self._wal_checked = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KB}")
+        if self.readonly:
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            with self._lock:
+                if not self._wal_checked:
+                    # WAL is persistent in the database file; set it once per process
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    self._wal_checked = True
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        return PooledConnection(conn, self)
+
+    def release(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,337 @@
+"""Duplicate detection helpers.
+
+Exact duplicates are found through the content_hashes table: one row per
+(hash, kind, submission) where kind is "file" for the raw upload bytes and
+"text" for normalized text (typed text or text extracted from a file).
+
+Near duplicates (whitespace edits, reordered paragraphs, small typos) are
+found with MinHash signatures over grapheme shingles, indexed with LSH
+bands in the lsh_buckets table so a lookup is a handful of index probes.
+"""
+import hashlib, json, os, random, re, sqlite3, unicodedata
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from .archives import is_archive
+from .extraction import extract_text_from_file, extract_archive_members, pool_context
+from .images import find_similar_images, forget_images, image_hashes_of
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """NFC-normalize, casefold and collapse whitespace so trivial edits hash alike."""
+    text = unicodedata.normalize("NFC", text or "")
+    return _WS_RE.sub(" ", text.casefold()).strip()
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 of the normalized text, or "" when nothing is left to hash."""
+    norm = normalize_text(text)
+    if not norm:
+        return ""
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest()
+
+
+def collect_hashes(file_hashes: Iterable[str], texts: Iterable[str]) -> List[Tuple[str, str]]:
+    """Build the unique (hash, kind) pairs describing one submission."""
+    pairs = []
+    for h in file_hashes:
+        if h:
+            pairs.append((h, "file"))
+    for t in texts:
+        h = text_hash(t)
+        if h:
+            pairs.append((h, "text"))
+    return list(dict.fromkeys(pairs))
+
+
+def find_exact_duplicates(conn, pairs: List[Tuple[str, str]], exclude_id: str = None) -> List[str]:
+    """Return IDs of submissions sharing any (hash, kind) pair; one index probe per pair."""
+    matches = []
+    for h, kind in pairs:
+        rows = conn.execute("SELECT submission_id FROM content_hashes WHERE hash=? AND kind=?", (h, kind)).fetchall()
+        for r in rows:
+            if r["submission_id"] != exclude_id:
+                matches.append(r["submission_id"])
+    return list(dict.fromkeys(matches))
+
+
+def record_hashes(conn, submission_id: str, pairs: List[Tuple[str, str]]):
+    conn.executemany("INSERT OR IGNORE INTO content_hashes (hash, kind, submission_id) VALUES (?,?,?)",
+                     [(h, kind, submission_id) for h, kind in pairs])
+
+
+# ── Near duplicates (MinHash / LSH) ────────────────────────────────────
+NUM_PERM      = 128
+LSH_BANDS     = 32
+LSH_ROWS      = NUM_PERM // LSH_BANDS   # candidate threshold ≈ (1/32)^(1/4) ≈ 0.42
+SHINGLE_SIZE  = 5                       # graphemes per shingle
+MIN_SHINGLES  = 20                      # shorter texts are too noisy to compare
+MINHASH_MAX_CHARS  = 200_000            # bound signature cost on huge documents
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x4D5A48)  # fixed seed: signatures must be stable across processes
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_JOINERS = {"\u200c", "\u200d"}  # ZWNJ / ZWJ, used in Sinhala conjuncts
+
+
+def graphemes(text: str) -> List[str]:
+    """Split text into letter clusters, with " " marking word boundaries.
+
+    A cluster is a letter or digit plus any following combining marks, so
+    Tamil and Sinhala vowel signs and viramas stay attached to their
+    consonant. A ZWJ also pulls the next letter into the same cluster.
+    Punctuation and whitespace collapse to a single boundary.
+    """
+    clusters = []
+    glue = False
+    for ch in unicodedata.normalize("NFC", text or "").casefold():
+        cat = unicodedata.category(ch)
+        if cat[0] == "M" or ch in _JOINERS:
+            if clusters and clusters[-1] != " ":
+                clusters[-1] += ch
+                glue = ch == "\u200d"
+        elif cat[0] in "LN":
+            if glue:
+                clusters[-1] += ch
+                glue = False
+            else:
+                clusters.append(ch)
+        else:
+            glue = False
+            if clusters and clusters[-1] != " ":
+                clusters.append(" ")
+    if clusters and clusters[-1] == " ":
+        clusters.pop()
+    return clusters
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set:
+    g = graphemes(text[:MINHASH_MAX_CHARS])
+    if len(g) <= k:
+        return {"".join(g)} if g else set()
+    return {"".join(g[i:i + k]) for i in range(len(g) - k + 1)}
+
+
+def _hash64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def signature_text(texts: Iterable[str]) -> str:
+    """MinHash input for a submission: its text and file texts, without empty or image placeholder entries.
+
+    Ingest and rededupe_corpus both sign this, so a row's signature doesn't
+    depend on which of them indexed it.
+    """
+    return "\n".join(t for t in texts if t and t != "[Image file]")
+
+
+def minhash_signature(text: str) -> Optional[bytes]:
+    """MinHash signature of text as NUM_PERM packed uint64s, or None if too short.
+
+    Top-level and pure so it can run in the extraction process pool.
+    """
+    sh = shingles(text)
+    if len(sh) < MIN_SHINGLES:
+        return None
+    hashes = [_hash64(s) for s in sh]
+    sig = array("Q", (min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS))
+    return sig.tobytes()
+
+
+def jaccard_estimate(sig_a: bytes, sig_b: bytes) -> float:
+    a, b = array("Q", sig_a), array("Q", sig_b)
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def _band_keys(signature: bytes) -> List[int]:
+    step = LSH_ROWS * 8
+    keys = []
+    for band in range(LSH_BANDS):
+        digest = hashlib.blake2b(signature[band * step:(band + 1) * step], digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))  # fits SQLite INTEGER
+    return keys
+
+
+def find_near_duplicates(conn, signature: bytes, exclude_id: str = None,
+                         threshold: float = NEAR_DUP_THRESHOLD) -> List[Tuple[str, float]]:
+    """Return (submission_id, estimated Jaccard) for indexed texts at or above threshold."""
+    candidates = set()
+    for band, key in enumerate(_band_keys(signature)):
+        for r in conn.execute("SELECT submission_id FROM lsh_buckets WHERE band=? AND bucket=?", (band, key)):
+            candidates.add(r["submission_id"])
+    candidates.discard(exclude_id)
+    if not candidates:
+        return []
+    marks = ",".join("?" * len(candidates))
+    rows = conn.execute(f"SELECT submission_id, signature FROM minhash_signatures WHERE submission_id IN ({marks})",
+                        list(candidates)).fetchall()
+    scored = [(r["submission_id"], jaccard_estimate(signature, r["signature"])) for r in rows]
+    return sorted([m for m in scored if m[1] >= threshold], key=lambda m: -m[1])
+
+
+def record_signature(conn, submission_id: str, signature: bytes):
+    conn.execute("DELETE FROM lsh_buckets WHERE submission_id=?", (submission_id,))
+    conn.execute("INSERT OR REPLACE INTO minhash_signatures (submission_id, signature) VALUES (?,?)",
+                 (submission_id, signature))
+    conn.executemany("INSERT OR IGNORE INTO lsh_buckets (band, bucket, submission_id) VALUES (?,?,?)",
+                     [(band, key, submission_id) for band, key in enumerate(_band_keys(signature))])
+
+
+def forget_submission(conn, submission_id: str):
+    """Drop every dedupe index entry for a deleted submission."""
+    forget_submissions(conn, [submission_id])
+
+
+def forget_submissions(conn, submission_ids: List[str]):
+    params = [(sid,) for sid in submission_ids]
+    conn.executemany("DELETE FROM content_hashes WHERE submission_id=?", params)
+    conn.executemany("DELETE FROM minhash_signatures WHERE submission_id=?", params)
+    conn.executemany("DELETE FROM lsh_buckets WHERE submission_id=?", params)
+    forget_images(conn, submission_ids)
+
+
+def describe_matches(exact_ids: List[str], near: List[Tuple[str, float]],
+                     images: List[Tuple[str, float]] = ()) -> list:
+    """Build the duplicate_matches payload stored on a submission (images: see images.py)."""
+    matches = [{"id": sid, "kind": "exact", "score": 1.0} for sid in exact_ids]
+    seen = set(exact_ids)
+    matches += [{"id": sid, "kind": "near", "score": round(score, 3)} for sid, score in near if sid not in seen]
+    seen.update(sid for sid, _ in near)
+    matches += [{"id": sid, "kind": "image", "score": score} for sid, score in images if sid not in seen]
+    return matches
+
+
+# ── Whole-corpus rebuild ───────────────────────────────────────────────
+def _analyze_submission(job):
+    """Pool worker: extract uncached file text and compute hashes + signature.
+
+    originals are the upload hashes of images whose GPS-free copy replaced them.
+    """
+    sid, text, files, originals = job
+    texts = [text]
+    member_hashes = []
+    fresh = {}
+    for path, file_hash, cached in files:
+        if is_archive(path):
+            # Members are hashed and checked one by one, as at submit time
+            members = extract_archive_members(path) if os.path.exists(path) else []
+            member_hashes += [m["sha256"] for m in members]
+            texts += [m["text"] for m in members if m["text"] != "[Image file]"]
+            continue
+        if cached is None:
+            cached = extract_text_from_file(path) if os.path.exists(path) else ""
+            if file_hash:
+                fresh[file_hash] = cached
+        if cached != "[Image file]":
+            texts.append(cached)
+    file_hashes = [f[1] for f in files if f[1]] + originals + member_hashes
+    return sid, collect_hashes(file_hashes, texts), minhash_signature(signature_text(texts)), fresh
+
+
+REDEDUPE_BATCH = int(os.getenv("REDEDUPE_BATCH", "500"))  # submissions per write transaction
+
+# The rebuilt index is matched against in a private in-memory database, so
+# the live tables are only touched by the short per-batch swaps
+_SCRATCH_SCHEMA = [
+    "CREATE TABLE content_hashes (hash TEXT, kind TEXT, submission_id TEXT, PRIMARY KEY (hash, kind, submission_id))",
+    "CREATE TABLE minhash_signatures (submission_id TEXT PRIMARY KEY, signature BLOB)",
+    "CREATE TABLE lsh_buckets (band INTEGER, bucket INTEGER, submission_id TEXT, PRIMARY KEY (band, bucket, submission_id))",
+]
+
+
+def _scratch_index():
+    scratch = sqlite3.connect(":memory:")
+    scratch.row_factory = sqlite3.Row
+    for stmt in _SCRATCH_SCHEMA:
+        scratch.execute(stmt)
+    return scratch
+
+
+def _swap_in(conn, scratch, results):
+    """Replace the live index rows and flags of one batch of submissions, in one short transaction."""
+    sids = [sid for sid, _, _ in results]
+    marks = ",".join("?" * len(sids))
+    rows = {
+        table: scratch.execute(f"SELECT {cols} FROM {table} WHERE submission_id IN ({marks})", sids).fetchall()
+        for table, cols in (("content_hashes", "hash, kind, submission_id"),
+                            ("minhash_signatures", "submission_id, signature"),
+                            ("lsh_buckets", "band, bucket, submission_id"))
+    }
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Submissions deleted since the rebuild read them must not get index rows back
+        live = {r["id"] for r in conn.execute(f"SELECT id FROM submissions WHERE id IN ({marks})", sids)}
+        params = [(sid,) for sid in live]
+        for table in rows:
+            conn.executemany(f"DELETE FROM {table} WHERE submission_id=?", params)
+        conn.executemany("INSERT OR IGNORE INTO content_hashes (hash, kind, submission_id) VALUES (?,?,?)",
+                         [tuple(r) for r in rows["content_hashes"] if r["submission_id"] in live])
+        conn.executemany("INSERT OR REPLACE INTO minhash_signatures (submission_id, signature) VALUES (?,?)",
+                         [tuple(r) for r in rows["minhash_signatures"] if r["submission_id"] in live])
+        conn.executemany("INSERT OR IGNORE INTO lsh_buckets (band, bucket, submission_id) VALUES (?,?,?)",
+                         [tuple(r) for r in rows["lsh_buckets"] if r["submission_id"] in live])
+        conn.executemany("UPDATE submissions SET duplicate_flag=?, duplicate_matches=? WHERE id=?",
+                         [(flag, matches, sid) for sid, flag, matches in results if sid in live])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def rededupe_corpus(conn, cache=None, workers: int = None, batch_size: int = REDEDUPE_BATCH) -> dict:
+    """Rebuild every dedupe index and duplicate flag from scratch.
+
+    Text extraction and signatures are computed on all cores; matching runs
+    in created_at order so each submission is only compared with earlier ones.
+    Image hashes depend on nothing else, so they are kept and only re-matched.
+
+    Nothing holds the write lock while files are parsed or matched: the new
+    index is built in memory, then swapped into the live tables batch_size
+    submissions per transaction. Submissions created meanwhile keep the
+    index rows ingest gave them.
+    """
+    rows = conn.execute("SELECT id, text_content, file_paths, file_hashes, metadata FROM submissions "
+                        "ORDER BY created_at").fetchall()
+    jobs = []
+    for r in rows:
+        paths = json.loads(r["file_paths"] or "[]")
+        hashes = json.loads(r["file_hashes"] or "[]")
+        files = []
+        for i, path in enumerate(paths):
+            h = hashes[i] if i < len(hashes) else None
+            files.append((path, h, cache.get(h) if (cache and h) else None))
+        image_meta = json.loads(r["metadata"] or "{}").get("images", [])
+        originals = [img["original_sha256"] for img in image_meta if img.get("original_sha256")]
+        jobs.append((r["id"], r["text_content"] or "", files, originals))
+
+    scratch = _scratch_index()
+    flagged = 0
+    done = set()
+    extracted = {}
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=pool_context()) as pool:
+        for sid, pairs, signature, fresh in pool.map(_analyze_submission, jobs, chunksize=16):
+            exact = find_exact_duplicates(scratch, pairs, exclude_id=sid)
+            near = find_near_duplicates(scratch, signature, exclude_id=sid) if signature else []
+            similar = [m for m in find_similar_images(conn, image_hashes_of(conn, sid), exclude_id=sid) if m[0] in done]
+            matches = describe_matches(exact, near, similar)
+            done.add(sid)
+            record_hashes(scratch, sid, pairs)
+            if signature:
+                record_signature(scratch, sid, signature)
+            results.append((sid, 1 if matches else 0, json.dumps(matches)))
+            flagged += bool(matches)
+            extracted.update(fresh)
+            if cache and len(extracted) >= batch_size:
+                cache.put_many(extracted)
+                extracted = {}
+    if cache and extracted:
+        cache.put_many(extracted)
+    for i in range(0, len(results), batch_size):
+        _swap_in(conn, scratch, results[i:i + batch_size])
+    scratch.close()
+    return {"submissions": len(jobs), "flagged": flagged}
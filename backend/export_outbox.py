@@ -0,0 +1,92 @@
+"""Durable outbox between approvals and the JSONL export shards.
+
+An approval inserts its export line into export_outbox in the same
+transaction as the status change and the HF job, so a crash can no longer
+approve a submission without exporting it. flush() copies pending rows into
+the shards through ExportWriter.append_from, which moves the manifest's
+outbox_id watermark with the write; rows at or below the watermark are then
+deleted. The request flushes right after its commit, and a background thread
+picks up whatever a crashed or failed flush left behind.
+"""
+import json, os, threading, time
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+from . import metrics
+
+EXPORT_OUTBOX_INTERVAL = float(os.getenv("EXPORT_OUTBOX_INTERVAL", "30"))   # seconds between background flushes
+EXPORT_OUTBOX_BATCH    = int(os.getenv("EXPORT_OUTBOX_BATCH", "1000"))      # rows appended per shard write
+
+EXPORT_OUTBOX_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS export_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        language TEXT NOT NULL,
+        entry TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_export_outbox_language ON export_outbox(language, id)",
+]
+
+
+class ExportOutbox:
+    def __init__(self, get_conn, writer, interval: float = EXPORT_OUTBOX_INTERVAL,
+                 batch: int = EXPORT_OUTBOX_BATCH):
+        self.get_conn = get_conn
+        self.writer = writer
+        self.interval = interval
+        self.batch = batch
+        self._thread = None
+
+    # ── Producer side ──
+    def add(self, conn, lang: str, entries: Iterable[dict]) -> int:
+        """Record export lines using the caller's connection/transaction; returns the row count."""
+        now = datetime.utcnow().isoformat()
+        rows = [(lang, json.dumps(e, ensure_ascii=False), now) for e in entries]
+        conn.executemany("INSERT INTO export_outbox (language, entry, created_at) VALUES (?,?,?)", rows)
+        return len(rows)
+
+    # ── Consumer side ──
+    def _pending(self, conn, lang: str, after: int) -> List[Tuple[int, str]]:
+        rows = conn.execute("SELECT id, entry FROM export_outbox WHERE language=? AND id>? ORDER BY id LIMIT ?",
+                            (lang, after, self.batch)).fetchall()
+        return [(r["id"], r["entry"]) for r in rows]
+
+    def flush(self, lang: str = None) -> int:
+        """Append pending rows to the shards (every language if lang is None); returns rows written."""
+        conn = self.get_conn()
+        try:
+            if lang is None:
+                langs = [r["language"] for r in conn.execute("SELECT DISTINCT language FROM export_outbox")]
+            else:
+                langs = [lang]
+            written = 0
+            for lang in langs:
+                while True:
+                    fetched = []
+                    def fetch(after, lang=lang):
+                        fetched[:] = self._pending(conn, lang, after)
+                        return fetched
+                    watermark = self.writer.append_from(lang, fetch)
+                    written += len(fetched)
+                    # Rows the shards already hold (this flush or an earlier one that died before deleting)
+                    conn.execute("DELETE FROM export_outbox WHERE language=? AND id<=?", (lang, watermark))
+                    conn.commit()
+                    if len(fetched) < self.batch:
+                        break
+            if written:
+                metrics.inc("export_outbox_flushed_total", written)
+            return written
+        finally:
+            conn.close()
+
+    def _loop(self):
+        while True:
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[EXPORT] Outbox flush error: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="export-outbox", daemon=True)
+        self._thread.start()
@@ -0,0 +1,262 @@
+"""Sharded JSONL export of approved submissions.
+
+Each language directory under EXPORTS holds numbered shards plus a
+manifest::
+
+    exports/tamil/tamil_approved-00001.jsonl.gz   sealed
+    exports/tamil/tamil_approved-00002.jsonl      active
+    exports/tamil/manifest.json
+
+Appends go to the active, uncompressed shard under an exclusive fcntl
+lock on exports/.locks/<lang>.lock, so lines from different gunicorn workers
+never interleave. Once the active shard passes EXPORT_SHARD_BYTES it is
+sealed: optionally compressed (gzip, or zstd if zstandard is installed),
+checksummed, and recorded in the manifest with its line count. Sealed
+shards never change, so downstream jobs can read them in parallel and
+resume from the manifest.
+
+A pre-existing <lang>_approved.jsonl is adopted as shard 00000.
+
+Approvals reach the shards through the export outbox (export_outbox.py):
+append_from() appends outbox rows past the manifest's outbox_id and moves
+that watermark in the same manifest write, so a row is written once even
+if several workers flush it.
+"""
+import gzip, hashlib, json, os, shutil, threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, List, Tuple
+
+from .metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines: in-process locking only
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXPORT_SHARD_BYTES  = int(os.getenv("EXPORT_SHARD_BYTES", str(64 * 1024 * 1024)))
+EXPORT_COMPRESSION  = os.getenv("EXPORT_COMPRESSION", "gzip").lower()   # "", "gzip" or "zstd"
+MANIFEST_NAME = "manifest.json"
+
+_SUFFIX = {"": "", "none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+class RebuildInProgress(Exception):
+    """Raised when another process is already rebuilding a language's exports."""
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ExportWriter:
+    def __init__(self, root, max_shard_bytes: int = EXPORT_SHARD_BYTES, compression: str = EXPORT_COMPRESSION):
+        self.root = Path(root)
+        self.max_shard_bytes = max_shard_bytes
+        if compression == "zstd" and zstandard is None:
+            print("[EXPORT] zstandard not installed – sealing shards with gzip")
+            compression = "gzip"
+        if compression not in _SUFFIX:
+            raise ValueError(f"Unknown export compression: {compression}")
+        self.compression = "" if compression == "none" else compression
+        self._thread_lock = threading.Lock()  # flock alone does not order threads of one process
+
+    # ── Locking / manifest ──
+    # The lock lives outside the language directory so a rebuild can swap that directory
+    @contextmanager
+    def _locked(self, lang_dir: Path):
+        lang_dir.mkdir(parents=True, exist_ok=True)
+        lock_dir = self.root / ".locks"
+        lock_dir.mkdir(exist_ok=True)
+        with self._thread_lock, open(lock_dir / f"{lang_dir.name}.lock", "a") as fh:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _load_manifest(self, lang: str, lang_dir: Path) -> dict:
+        path = lang_dir / MANIFEST_NAME
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+        manifest = {"language": lang, "shards": []}
+        legacy = lang_dir / f"{lang}_approved.jsonl"
+        if legacy.exists():
+            adopted = lang_dir / self._shard_name(lang, 0)
+            os.replace(legacy, adopted)
+            with open(adopted, "rb") as f:
+                lines = sum(1 for _ in f)
+            manifest["shards"].append({"index": 0, "name": adopted.name, "lines": lines,
+                                       "bytes": adopted.stat().st_size, "sealed": False})
+        return manifest
+
+    def _save_manifest(self, lang_dir: Path, manifest: dict):
+        manifest["updated_at"] = datetime.utcnow().isoformat()
+        tmp = lang_dir / f".{MANIFEST_NAME}.tmp"
+        tmp.write_text(json.dumps(manifest, indent=1, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, lang_dir / MANIFEST_NAME)
+
+    @staticmethod
+    def _shard_name(lang: str, index: int) -> str:
+        return f"{lang}_approved-{index:05d}.jsonl"
+
+    # ── Sealing ──
+    def _seal(self, lang_dir: Path, shard: dict):
+        src = lang_dir / shard["name"]
+        with open(src, "rb") as f:
+            shard["lines"] = sum(1 for _ in f)  # recount: the manifest may lag a crashed append
+        if self.compression:
+            dest = src.with_name(src.name + _SUFFIX[self.compression])
+            tmp = dest.with_name(dest.name + ".tmp")
+            with open(src, "rb") as fin, open(tmp, "wb") as fout:
+                if self.compression == "gzip":
+                    with gzip.GzipFile(fileobj=fout, mode="wb", mtime=0) as gz:
+                        shutil.copyfileobj(fin, gz, 1024 * 1024)
+                else:
+                    zstandard.ZstdCompressor(level=10).copy_stream(fin, fout)
+                fout.flush()
+                os.fsync(fout.fileno())
+            os.replace(tmp, dest)
+            src.unlink()
+            shard["name"] = dest.name
+            shard["compression"] = self.compression
+        shard["bytes"] = (lang_dir / shard["name"]).stat().st_size
+        shard["sha256"] = _sha256_file(lang_dir / shard["name"])
+        shard["sealed"] = True
+        shard["sealed_at"] = datetime.utcnow().isoformat()
+
+    # ── Writing ──
+    def _write_lines(self, lang: str, lang_dir: Path, manifest: dict, lines: List[str]) -> List[str]:
+        """Append lines to the active shard, sealing as shards fill; caller holds the lock and saves the manifest."""
+        shards = manifest["shards"]
+        written = []
+        pending = lines
+        while pending:
+            if not shards or shards[-1]["sealed"]:
+                index = shards[-1]["index"] + 1 if shards else 1
+                shards.append({"index": index, "name": self._shard_name(lang, index),
+                               "lines": 0, "bytes": 0, "sealed": False})
+            active = shards[-1]
+            path = lang_dir / active["name"]
+            # Fill the shard up to the bound, but always write at least one line
+            room = self.max_shard_bytes - active["bytes"]
+            batch, size = [], 0
+            for line in pending:
+                n = len(line.encode("utf-8"))
+                if batch and size + n > room:
+                    break
+                batch.append(line)
+                size += n
+            pending = pending[len(batch):]
+            with open(path, "a", encoding="utf-8") as f:
+                f.writelines(batch)
+                f.flush()
+                os.fsync(f.fileno())
+            active["lines"] += len(batch)
+            active["bytes"] = path.stat().st_size
+            written.append(active["name"])
+            if active["bytes"] >= self.max_shard_bytes:
+                self._seal(lang_dir, active)
+        return written
+
+    # ── Public API ──
+    @timed("export_append")
+    def append(self, lang: str, entries: Iterable[dict]) -> List[str]:
+        """Append entries to the language's active shard; returns shard names written to."""
+        lines = [json.dumps(e, ensure_ascii=False) + "\n" for e in entries]
+        if not lines:
+            return []
+        lang_dir = self.root / lang
+        with self._locked(lang_dir):
+            manifest = self._load_manifest(lang, lang_dir)
+            written = self._write_lines(lang, lang_dir, manifest, lines)
+            self._save_manifest(lang_dir, manifest)
+        return written
+
+    @timed("export_append")
+    def append_from(self, lang: str, fetch: Callable[[int], List[Tuple[int, str]]]) -> int:
+        """Append outbox rows newer than the manifest's outbox_id; returns the new outbox_id.
+
+        fetch(after_id) runs under the append lock and returns (id, JSON
+        line) pairs in id order.
+        """
+        lang_dir = self.root / lang
+        with self._locked(lang_dir):
+            manifest = self._load_manifest(lang, lang_dir)
+            rows = fetch(manifest.get("outbox_id", 0))
+            if rows:
+                self._write_lines(lang, lang_dir, manifest, [line + "\n" for _, line in rows])
+                manifest["outbox_id"] = rows[-1][0]
+                self._save_manifest(lang_dir, manifest)
+            return manifest.get("outbox_id", 0)
+
+    def seal(self, lang: str) -> bool:
+        """Seal the active shard now (e.g. before handing exports to a training job)."""
+        lang_dir = self.root / lang
+        with self._locked(lang_dir):
+            manifest = self._load_manifest(lang, lang_dir)
+            if not manifest["shards"] or manifest["shards"][-1]["sealed"] or not manifest["shards"][-1]["lines"]:
+                return False
+            self._seal(lang_dir, manifest["shards"][-1])
+            self._save_manifest(lang_dir, manifest)
+        return True
+
+    @contextmanager
+    def rebuilding(self, lang: str):
+        """Hold the per-language rebuild lock; raises RebuildInProgress if another process has it."""
+        lock_dir = self.root / ".locks"
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        with open(lock_dir / f"{lang}.rebuild", "a") as fh:
+            if fcntl:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise RebuildInProgress(lang)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def swap_in(self, lang: str, staged: "ExportWriter", catch_up: Callable[[], List[dict]] = None):
+        """Replace the language's shards with those written by a staging writer.
+
+        catch_up runs under the append lock and returns entries that were
+        approved while the staged copy was being built; they are appended to
+        the staged copy before the swap, so nothing approved in the meantime
+        is lost (a record may appear twice; consumers should key on id).
+        """
+        lang_dir = self.root / lang
+        with self._locked(lang_dir):
+            if catch_up is not None:
+                staged.append(lang, catch_up())
+            staged_dir = staged.root / lang
+            staged_dir.mkdir(parents=True, exist_ok=True)
+            # The outbox watermark carries over, or flushed approvals would be written again
+            staged_manifest = staged._load_manifest(lang, staged_dir)
+            staged_manifest["outbox_id"] = self._load_manifest(lang, lang_dir).get("outbox_id", 0)
+            staged._save_manifest(staged_dir, staged_manifest)
+            retired = staged.root / f".{lang}.retired"
+            if retired.exists():
+                shutil.rmtree(retired)
+            os.replace(lang_dir, retired)
+            os.replace(staged_dir, lang_dir)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def manifest(self, lang: str) -> dict:
+        path = self.root / lang / MANIFEST_NAME
+        if not path.exists():
+            return {"language": lang, "shards": []}
+        return json.loads(path.read_text(encoding="utf-8"))
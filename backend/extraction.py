@@ -0,0 +1,496 @@
+"""Text extraction for uploaded files.
+
+Parsing PDFs and DOCX files is CPU-bound, so it runs in a small process pool
+instead of on the uvicorn event loop. This module is kept free of
+import-time side effects so pool workers and scripts can import it cheaply.
+
+PDFs are read in full, several pages per pool job (see pdf_text.py); other
+formats keep their first 5000 characters.
+"""
+import asyncio, io, multiprocessing, os, threading, time, weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List
+
+from . import metrics
+from .archives import ArchiveRejected, is_archive, iter_members, join_member_texts
+from .pdf_text import PDF_PAGES_PER_TASK, extract_pages, is_image_only, is_scanned, join_pages, plan_runs
+
+IMAGE_EXT = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+TEXT_EXT  = {".txt", ".csv"}
+PARSED_EXT = {".pdf", ".docx"}   # need a parser, so they go to the pool
+
+EXTRACT_WORKERS   = int(os.getenv("EXTRACT_WORKERS", "2"))
+EXTRACT_TIMEOUT   = float(os.getenv("EXTRACT_TIMEOUT", "30"))   # seconds per file
+EXTRACT_MAX_QUEUE = int(os.getenv("EXTRACT_MAX_QUEUE", "16"))   # queued + running jobs per worker
+EXTRACT_CACHE_MAX_BYTES = int(os.getenv("EXTRACT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EXTRACT_CACHE_TOUCH_BATCH = int(os.getenv("EXTRACT_CACHE_TOUCH_BATCH", "256"))  # hits held before last_used is written
+
+# Bump when extract_text_from_file changes output so stale cache entries are ignored
+EXTRACTOR_VERSION = 3
+
+
+def _extract(ext: str, source) -> str:
+    # source is a path or a binary file object; PyPDF2 and python-docx take either
+    try:
+        if ext in TEXT_EXT:
+            if isinstance(source, io.BytesIO):
+                return source.getvalue()[:20000].decode("utf-8", errors="ignore")[:5000]
+            return Path(source).read_text(errors="ignore")[:5000]
+        elif ext == ".pdf":
+            return join_pages(extract_pages(source)[1])
+        elif ext == ".docx":
+            from docx import Document
+            doc = Document(source)
+            return "\n".join([p.text for p in doc.paragraphs])[:5000]
+        elif ext in IMAGE_EXT:
+            return "[Image file]"
+    except:
+        pass
+    return ""
+
+
+def extract_text_from_file(filepath: str) -> str:
+    return _extract(Path(filepath).suffix.lower(), filepath)
+
+
+def extract_text_from_bytes(name: str, data: bytes) -> str:
+    """Same as extract_text_from_file, for an archive member held in memory."""
+    return _extract(Path(name).suffix.lower(), io.BytesIO(data))
+
+
+def _member_wanted(name: str) -> bool:
+    ext = Path(name).suffix.lower()
+    return ext in TEXT_EXT or ext in PARSED_EXT
+
+
+def extract_archive_members(filepath: str, name: str = None) -> List[dict]:
+    """Sequential ExtractionExecutor.extract_archive, for code already in a pool worker.
+
+    A rejected archive yields no members.
+    """
+    members = []
+    try:
+        for m in iter_members(filepath, keep=_member_wanted, name=name):
+            data = m.pop("data")
+            ext = Path(m["name"]).suffix.lower()
+            m["text"] = "[Image file]" if ext in IMAGE_EXT else (
+                extract_text_from_bytes(m["name"], data) if data is not None else "")
+            members.append(m)
+    except ArchiveRejected:
+        return []
+    return members
+
+
+class ExtractionQueueFull(Exception):
+    """Raised when more than EXTRACT_MAX_QUEUE extractions are already waiting."""
+
+
+# Bytes of text held in extraction_cache, kept like the counters in stats.py
+EXTRACTION_CACHE_SCHEMA = [
+    """CREATE TRIGGER IF NOT EXISTS extraction_cache_bytes_ai AFTER INSERT ON extraction_cache BEGIN
+        INSERT INTO stats_counters (key, value) VALUES ('extraction_cache:bytes', new.size)
+            ON CONFLICT(key) DO UPDATE SET value = value + new.size;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS extraction_cache_bytes_au AFTER UPDATE OF size ON extraction_cache
+    WHEN old.size != new.size BEGIN
+        UPDATE stats_counters SET value = value - old.size + new.size WHERE key = 'extraction_cache:bytes';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS extraction_cache_bytes_ad AFTER DELETE ON extraction_cache BEGIN
+        UPDATE stats_counters SET value = value - old.size WHERE key = 'extraction_cache:bytes';
+    END""",
+]
+
+
+class ExtractionCache:
+    """Persistent extracted-text cache keyed by the file's SHA-256.
+
+    Lives in the extraction_cache table. When the stored text exceeds
+    max_bytes the least recently used entries are evicted, down to
+    evict_to of the limit so the next few writes don't evict again.
+
+    Reads don't write: hits are noted in memory and their last_used is
+    written with the next put_many (or once touch_batch hits pile up).
+    """
+
+    def __init__(self, get_conn, max_bytes: int = EXTRACT_CACHE_MAX_BYTES,
+                 touch_batch: int = EXTRACT_CACHE_TOUCH_BATCH, evict_to: float = 0.9):
+        self.get_conn = get_conn
+        self.max_bytes = max_bytes
+        self.touch_batch = max(1, touch_batch)
+        self.evict_to = evict_to
+        self._touched = {}  # key -> time of its last hit, not yet written
+        self._touch_lock = threading.Lock()
+
+    def _touch(self, keys):
+        now = time.time()
+        with self._touch_lock:
+            self._touched.update(dict.fromkeys(keys, now))
+            due = len(self._touched) >= self.touch_batch
+        if due:
+            conn = self.get_conn()
+            try:
+                self._write_touches(conn)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _write_touches(self, conn):
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            conn.executemany("UPDATE extraction_cache SET last_used=? WHERE hash=?",
+                             [(at, key) for key, at in touched.items()])
+
+    def get(self, file_hash: str):
+        conn = self.get_conn()
+        try:
+            row = conn.execute("SELECT text FROM extraction_cache WHERE hash=? AND version=?",
+                               (file_hash, EXTRACTOR_VERSION)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        self._touch([file_hash])
+        return row["text"]
+
+    def get_many(self, keys: List[str]) -> dict:
+        """{key: text} for the keys that are cached (PDF pages are keyed "<hash>:<page>")."""
+        found = {}
+        conn = self.get_conn()
+        try:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                found.update((r["hash"], r["text"]) for r in conn.execute(
+                    f"SELECT hash, text FROM extraction_cache WHERE version=? AND hash IN ({','.join('?' * len(chunk))})",
+                    (EXTRACTOR_VERSION, *chunk)))
+        finally:
+            conn.close()
+        if found:
+            self._touch(found)
+        return found
+
+    def put(self, file_hash: str, text: str):
+        self.put_many({file_hash: text})
+
+    def put_many(self, entries: dict):
+        rows = []
+        now = time.time()
+        for key, text in entries.items():
+            size = len(text.encode("utf-8"))
+            if size <= self.max_bytes:
+                rows.append((key, EXTRACTOR_VERSION, text, size, now))
+        if not rows:
+            return
+        conn = self.get_conn()
+        try:
+            # An upsert, not INSERT OR REPLACE: REPLACE's implicit delete doesn't fire the size triggers
+            conn.executemany("""INSERT INTO extraction_cache (hash, version, text, size, last_used) VALUES (?,?,?,?,?)
+                ON CONFLICT(hash) DO UPDATE SET version=excluded.version, text=excluded.text,
+                    size=excluded.size, last_used=excluded.last_used""", rows)
+            self._write_touches(conn)
+            row = conn.execute("SELECT value FROM stats_counters WHERE key='extraction_cache:bytes'").fetchone()
+            total = row["value"] if row else 0
+            if total > self.max_bytes:
+                self._evict(conn, total - int(self.max_bytes * self.evict_to))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _evict(self, conn, excess: int):
+        # Walks idx_extraction_cache_last_used from the oldest entry and stops once enough is freed
+        freed = 0
+        doomed = []
+        for row in conn.execute("SELECT hash, size FROM extraction_cache ORDER BY last_used"):
+            if freed >= excess:
+                break
+            doomed.append((row["hash"],))
+            freed += row["size"]
+        conn.executemany("DELETE FROM extraction_cache WHERE hash=?", doomed)
+        metrics.inc("extract_cache_evictions_total", len(doomed))
+
+
+def pool_context():
+    """multiprocessing context for extraction pools.
+
+    Pool workers are never forked from the app process: by the time the
+    pool starts it runs the ingest, HF and retention threads, and a fork
+    would copy whatever locks those hold. forkserver starts them from a
+    clean server process that has only this module imported.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class ExtractionExecutor:
+    """Bounded process pool for extract_text_from_file.
+
+    The pool is created lazily so that each gunicorn worker gets its own
+    after forking.
+
+    A job that runs past its timeout is not just abandoned: its pool is
+    retired and the worker processes killed, so a hostile file can't keep
+    a worker busy after its caller (and the queue-depth count) have moved
+    on. Jobs from other callers that were running in the same pool are
+    run again on a fresh pool within their own deadline.
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, timeout: float = EXTRACT_TIMEOUT,
+                 max_queue: int = EXTRACT_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_queue = max(1, max_queue)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._killed = weakref.WeakSet()  # pools retired by _kill_pool
+        self.cache = None  # optional ExtractionCache
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+            return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor = None):
+        """Stop handing out pool (default: the current one); the next job starts a fresh pool."""
+        with self._lock:
+            if pool is None or self._pool is pool:
+                pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _kill_pool(self, pool: ProcessPoolExecutor):
+        """Retire pool and kill its workers, including one stuck in a parser."""
+        self._killed.add(pool)
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        kill = getattr(pool, "kill_workers", None)  # Python 3.14+
+        if kill is not None:
+            kill()
+            return
+        # Before shutdown(), which forgets the process handles
+        for proc in list((getattr(pool, "_processes", None) or {}).values()):
+            try:
+                proc.kill()
+            except (OSError, ValueError):
+                pass
+        # Queued jobs fail with BrokenProcessPool, which run() retries; cancelling would not be
+        pool.shutdown(wait=False)
+
+    async def run(self, func, *args, timeout: float = None):
+        """Run func(*args) in the pool, giving up after timeout seconds.
+
+        Raises ExtractionQueueFull when the queue is at capacity and
+        asyncio.TimeoutError when the job takes too long.
+        """
+        with self._lock:
+            if self._depth >= self.max_queue:
+                metrics.inc("extract_queue_full_total")
+                raise ExtractionQueueFull()
+            self._depth += 1
+        try:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + (timeout or self.timeout)
+            # Includes time queued behind other jobs, which is what callers wait for
+            with metrics.stage(f"pool:{func.__name__}"):
+                while True:
+                    pool = self._get_pool()
+                    try:
+                        return await asyncio.wait_for(loop.run_in_executor(pool, func, *args),
+                                                      max(0.1, deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        # wait_for only stops waiting; the worker would carry on parsing
+                        metrics.inc("extract_timeouts_total")
+                        self._kill_pool(pool)
+                        raise
+                    except BrokenProcessPool:
+                        if pool in self._killed and loop.time() < deadline:
+                            continue  # killed for another job's timeout, not for this one
+                        # A worker died (OOM, segfault in a parser); start a fresh pool next time
+                        self._reset_pool(pool)
+                        raise
+        finally:
+            with self._lock:
+                self._depth -= 1
+
+    async def extract_text(self, filepath: str, file_hash: str = None) -> str:
+        """Extract text off the event loop; a timeout or crash yields "".
+
+        When file_hash is given and a cache is attached, a hit skips parsing
+        entirely. Timeouts and crashes are not cached. An archive yields
+        its members' text, or "" if it breaks the archive limits.
+        """
+        if file_hash and self.cache is not None:
+            hit = self.cache.get(file_hash)
+            if hit is not None:
+                return hit
+        if is_archive(filepath):
+            try:
+                return join_member_texts(await self.extract_archive(filepath, file_hash))
+            except ArchiveRejected as e:
+                print(f"[EXTRACT] Archive rejected ({e}): {filepath}")
+                return ""
+        ext = Path(filepath).suffix.lower()
+        if ext in IMAGE_EXT:
+            return "[Image file]"
+        if ext == ".pdf":
+            return (await self.extract_pdf(filepath, file_hash))["text"]
+        try:
+            text = await self.run(extract_text_from_file, filepath)
+        except asyncio.TimeoutError:
+            print(f"[EXTRACT] Timed out after {self.timeout}s: {filepath}")
+            return ""
+        except BrokenProcessPool:
+            print(f"[EXTRACT] Worker crashed on {filepath}")
+            return ""
+        if file_hash and self.cache is not None:
+            self.cache.put(file_hash, text)
+        return text
+
+    async def _pdf_run(self, filepath: str, start: int, stop: int):
+        try:
+            return await self.run(extract_pages, filepath, start, stop)
+        except asyncio.TimeoutError:
+            print(f"[EXTRACT] Timed out after {self.timeout}s: {filepath} pages {start + 1}-{stop}")
+        except BrokenProcessPool:
+            print(f"[EXTRACT] Worker crashed on {filepath} pages {start + 1}-{stop}")
+        return None
+
+    async def extract_pdf(self, filepath: str, file_hash: str = None) -> dict:
+        """Text of every page, split into runs parsed by `workers` pool jobs at a time.
+
+        Returns {"text", "pages", "image_only_pages", "scanned"}. With
+        file_hash, pages are cached one by one ("<hash>:<page>", plus the
+        page count under "<hash>:pages"), and the whole text under file_hash
+        once no page is missing. Raises ExtractionQueueFull.
+        """
+        page_cache = self.cache if file_hash and self.cache is not None else None
+        count, pages, fresh = None, {}, {}
+        if page_cache:
+            meta = page_cache.get(f"{file_hash}:pages")
+            if meta is not None:
+                count = int(meta)
+                cached = page_cache.get_many([f"{file_hash}:{i}" for i in range(count)])
+                pages = {int(k.rsplit(":", 1)[1]): t for k, t in cached.items()}
+        if count is None:
+            # The first run also tells us how many pages there are
+            got = await self._pdf_run(filepath, 0, PDF_PAGES_PER_TASK)
+            if got is None:
+                return {"text": "", "pages": 0, "image_only_pages": 0, "scanned": False}
+            count = got[0]
+            pages.update(enumerate(got[1]))
+            fresh.update(enumerate(got[1]))
+
+        runs = plan_runs([i for i in range(count) if i not in pages], self.workers)
+        slots = asyncio.Semaphore(self.workers)
+
+        async def parse(start, stop):
+            async with slots:
+                return start, await self._pdf_run(filepath, start, stop)
+
+        tasks = [asyncio.ensure_future(parse(start, stop)) for start, stop in runs]
+        complete = True
+        try:
+            for start, got in await asyncio.gather(*tasks):
+                if got is None:
+                    complete = False
+                    continue
+                for k, text in enumerate(got[1]):
+                    pages[start + k] = fresh[start + k] = text
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+
+        texts = [pages.get(i, "") for i in range(count)]
+        text = join_pages(texts)
+        if page_cache:
+            entries = {f"{file_hash}:{i}": t for i, t in fresh.items()}
+            entries[f"{file_hash}:pages"] = str(count)
+            if complete:
+                entries[file_hash] = text
+            page_cache.put_many(entries)
+        return {"text": text, "pages": count, "image_only_pages": sum(map(is_image_only, texts)),
+                "scanned": is_scanned(texts)}
+
+    async def _extract_member(self, member: dict) -> str:
+        ext = Path(member["name"]).suffix.lower()
+        if ext in IMAGE_EXT:
+            return "[Image file]"
+        if member["data"] is None:
+            return ""
+        if ext in TEXT_EXT:  # cheap enough to decode here
+            return extract_text_from_bytes(member["name"], member["data"])
+        if self.cache is not None:
+            hit = self.cache.get(member["sha256"])
+            if hit is not None:
+                return hit
+        try:
+            text = await self.run(extract_text_from_bytes, member["name"], member["data"])
+        except asyncio.TimeoutError:
+            print(f"[EXTRACT] Timed out after {self.timeout}s: archive member {member['name']}")
+            return ""
+        except BrokenProcessPool:
+            print(f"[EXTRACT] Worker crashed on archive member {member['name']}")
+            return ""
+        if self.cache is not None:
+            self.cache.put(member["sha256"], text)
+        return text
+
+    async def extract_archive(self, filepath: str, file_hash: str = None, name: str = None) -> List[dict]:
+        """Stream an archive's members through extraction, `workers` at a time.
+
+        Returns {"name", "size", "sha256", "text"} per member, in archive
+        order. Members are read in a thread while earlier ones are being
+        parsed, so at most `workers` member bodies are held in memory.
+        Raises ArchiveRejected (see archives.py) and ExtractionQueueFull.
+        With file_hash, the joined text is cached under the archive's hash.
+        """
+        members = iter_members(filepath, keep=_member_wanted, name=name)
+        slots = asyncio.Semaphore(self.workers)
+        tasks = []
+
+        async def extract(member):
+            try:
+                member["text"] = await self._extract_member(member)
+            finally:
+                member.pop("data", None)
+                slots.release()
+            return member
+
+        try:
+            while True:
+                await slots.acquire()
+                member = await asyncio.to_thread(next, members, None)
+                if member is None:
+                    break
+                tasks.append(asyncio.ensure_future(extract(member)))
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            raise
+        finally:
+            try:
+                members.close()
+            except ValueError:  # still running in its thread after a cancellation
+                pass
+        if file_hash and self.cache is not None:
+            self.cache.put(file_hash, join_member_texts(results))
+        return list(results)
+
+    def shutdown(self):
+        self._reset_pool()
+
+
+extractor = ExtractionExecutor()
@@ -0,0 +1,276 @@
+"""Durable Hugging Face push queue.
+
+Approvals enqueue a row in hf_jobs inside their own transaction, so a
+push is never lost to a restart. A job can cover many submissions (bulk
+approvals); hf_job_items lists them, one row per submission. Worker threads claim due jobs with
+BEGIN IMMEDIATE (safe across gunicorn workers), group every job for the
+same category that is waiting, and upload them as a single create_commit.
+Failures are retried with exponential backoff; a job whose worker died
+mid-push is picked up again once its lease expires.
+
+The HfApi class is injected, so the queue can be driven by a local fake
+(anything with create_repo / create_commit) and run synchronously with
+run_once().
+"""
+import json, os, random, threading, time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from . import metrics
+
+HF_BATCH_WINDOW  = float(os.getenv("HF_BATCH_WINDOW", "30"))   # seconds to let approvals pile up
+HF_MAX_BATCH     = int(os.getenv("HF_MAX_BATCH", "200"))       # jobs per commit
+HF_MAX_ATTEMPTS  = int(os.getenv("HF_MAX_ATTEMPTS", "8"))
+HF_BACKOFF_BASE  = float(os.getenv("HF_BACKOFF_BASE", "30"))   # seconds, doubled per attempt
+HF_BACKOFF_MAX   = float(os.getenv("HF_BACKOFF_MAX", "3600"))
+HF_LEASE_SECONDS = float(os.getenv("HF_LEASE_SECONDS", "900"))
+HF_POLL_INTERVAL = float(os.getenv("HF_POLL_INTERVAL", "5"))
+HF_WORKERS       = int(os.getenv("HF_WORKERS", "1"))
+
+HF_JOBS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS hf_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT NOT NULL,
+        submission_id TEXT NOT NULL,
+        language TEXT NOT NULL,
+        files TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'QUEUED',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        lease_until REAL,
+        repo_id TEXT,
+        last_error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_hf_jobs_status_due ON hf_jobs(status, next_attempt_at)",
+]
+
+HF_JOB_ITEMS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS hf_job_items (
+        job_id INTEGER NOT NULL,
+        submission_id TEXT NOT NULL,
+        PRIMARY KEY (job_id, submission_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_hf_job_items_submission ON hf_job_items(submission_id)",
+]
+
+
+def _default_operation(path_in_repo: str, source):
+    from huggingface_hub import CommitOperationAdd
+    return CommitOperationAdd(path_in_repo=path_in_repo, path_or_fileobj=source)
+
+
+class HFPushQueue:
+    def __init__(self, get_conn, get_settings: Callable[[], dict], api_factory=None,
+                 operation_factory=_default_operation, workers: int = HF_WORKERS,
+                 batch_window: float = HF_BATCH_WINDOW):
+        self.get_conn = get_conn
+        self.get_settings = get_settings
+        self.api_factory = api_factory
+        self.operation_factory = operation_factory
+        self.workers = workers
+        self.batch_window = batch_window
+        self._apis = {}          # token -> api client, reused across pushes
+        self._repos_ready = set()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # ── Producer side ──
+    def enqueue(self, conn, category: str, files: List[dict], submission_id: str, language: str) -> int:
+        """Add a push job using the caller's connection/transaction; returns the job id.
+
+        Each file is {"name": ..., "path": ...}, or {"name": ..., "content": ...}
+        for text generated at approval time.
+        """
+        return self.enqueue_batch(conn, category, [(submission_id, language, files)])
+
+    def enqueue_batch(self, conn, category: str, items: List[Tuple[str, str, List[dict]]]) -> int:
+        """One job covering several (submission_id, language, files) items, e.g. a bulk approval."""
+        files = [dict(f, path_in_repo=f"{lang}/{sid}/{f['name']}", submission_id=sid)
+                 for sid, lang, sid_files in items for f in sid_files]
+        sids = list(dict.fromkeys(sid for sid, _, _ in items))
+        languages = ",".join(sorted({lang for _, lang, _ in items}))
+        now = time.time()
+        # submission_id names the submission of a single-item job; hf_job_items has them all
+        cur = conn.execute(
+            """INSERT INTO hf_jobs (category, submission_id, language, files, status, next_attempt_at, created_at)
+               VALUES (?,?,?,?, 'QUEUED', ?, ?)""",
+            (category, sids[0] if len(sids) == 1 else "", languages, json.dumps(files), now,
+             datetime.utcnow().isoformat()))
+        conn.executemany("INSERT INTO hf_job_items (job_id, submission_id) VALUES (?,?)",
+                         [(cur.lastrowid, sid) for sid in sids])
+        self._wake.set()
+        return cur.lastrowid
+
+    # ── Consumer side ──
+    def _claim(self, now: float, ignore_window: bool = False) -> Optional[List[dict]]:
+        conn = self.get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Jobs whose worker died keep RUNNING with an expired lease; treat them as due
+            due = ("(status='QUEUED' AND next_attempt_at <= ?) OR (status='RUNNING' AND lease_until < ?)")
+            head = conn.execute(f"SELECT category, next_attempt_at FROM hf_jobs WHERE {due} ORDER BY id LIMIT 1",
+                                (now, now)).fetchone()
+            if head is None or (not ignore_window and head["next_attempt_at"] > now - self.batch_window):
+                conn.rollback()
+                return None
+            rows = conn.execute(f"SELECT * FROM hf_jobs WHERE ({due}) AND category=? ORDER BY id LIMIT ?",
+                                (now, now, head["category"], HF_MAX_BATCH)).fetchall()
+            ids = [r["id"] for r in rows]
+            conn.executemany("""UPDATE hf_jobs SET status='RUNNING', attempts=attempts+1, lease_until=?, updated_at=?
+                                WHERE id=?""",
+                             [(now + HF_LEASE_SECONDS, datetime.utcnow().isoformat(), i) for i in ids])
+            conn.commit()
+            return [dict(r, attempts=r["attempts"] + 1) for r in rows]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, jobs: List[dict], status: str, error: str = None, repo_id: str = None, retry: bool = False):
+        now = time.time()
+        conn = self.get_conn()
+        try:
+            for job in jobs:
+                final = status
+                next_at = now
+                if retry:
+                    if job["attempts"] >= HF_MAX_ATTEMPTS:
+                        final = "FAILED"
+                    else:
+                        final = "QUEUED"
+                        delay = min(HF_BACKOFF_BASE * 2 ** (job["attempts"] - 1), HF_BACKOFF_MAX)
+                        next_at = now + delay * random.uniform(0.8, 1.2)
+                conn.execute("""UPDATE hf_jobs SET status=?, next_attempt_at=?, lease_until=NULL, last_error=?,
+                                repo_id=COALESCE(?, repo_id), updated_at=? WHERE id=?""",
+                             (final, next_at, error, repo_id, datetime.utcnow().isoformat(), job["id"]))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _api(self, token: str):
+        api = self._apis.get(token)
+        if api is None:
+            if self.api_factory is None:
+                raise RuntimeError("huggingface_hub not installed")
+            api = self._apis[token] = self.api_factory(token=token)
+        return api
+
+    def _push(self, jobs: List[dict]):
+        category = jobs[0]["category"]
+        settings = self.get_settings()
+        token = settings.get("hf_token", "")
+        repo_id = settings.get(f"repo_{category}", "")
+        if not token or not repo_id:
+            print(f"[HF] Skipping {len(jobs)} job(s) — token or repo not configured for {category}")
+            metrics.inc("hf_pushes_total", outcome="skipped")
+            self._finish(jobs, "SKIPPED", error="token or repo not configured")
+            return
+        try:
+            with metrics.stage("hf_push"):
+                api = self._api(token)
+                if repo_id not in self._repos_ready:
+                    api.create_repo(repo_id, repo_type="dataset", exist_ok=True, private=False)
+                    self._repos_ready.add(repo_id)
+                operations, sids, missing, empty = [], set(), {}, set()
+                for job in jobs:
+                    added = 0
+                    for f in json.loads(job["files"]):
+                        if "content" in f:
+                            source = f["content"].encode("utf-8")
+                        elif os.path.exists(f["path"]):
+                            source = f["path"]
+                        else:
+                            missing.setdefault(job["id"], []).append(f["path"])
+                            continue
+                        operations.append(self.operation_factory(f["path_in_repo"], source))
+                        sids.add(f.get("submission_id") or job["submission_id"])
+                        added += 1
+                    if not added and job["id"] in missing:
+                        empty.add(job["id"])
+                if operations:
+                    sids = sorted(sids)
+                    api.create_commit(
+                        repo_id=repo_id,
+                        repo_type="dataset",
+                        operations=operations,
+                        commit_message=f"Add {len(sids)} approved submission(s): {', '.join(sids[:10])}"
+                                       + (" …" if len(sids) > 10 else ""),
+                    )
+            print(f"[HF] Pushed {len(operations)} file(s) from {len(jobs) - len(empty)} job(s) → {repo_id}")
+            metrics.inc("hf_pushes_total", outcome="done")
+            self._finish([j for j in jobs if j["id"] not in missing], "DONE", repo_id=repo_id)
+            # A job with nothing left to upload failed; one missing only some files says which
+            for job in jobs:
+                if job["id"] in missing:
+                    paths = missing[job["id"]]
+                    self._finish([job], "FAILED" if job["id"] in empty else "DONE", repo_id=repo_id,
+                                 error=f"{len(paths)} file(s) missing: {', '.join(paths)}"[:2000])
+            if empty:
+                print(f"[HF] {len(empty)} job(s) failed — none of their files exist")
+        except Exception as e:
+            print(f"[HF] Push to {repo_id} failed: {e}")
+            metrics.inc("hf_pushes_total", outcome="failed")
+            self._repos_ready.discard(repo_id)
+            self._finish(jobs, "QUEUED", error=str(e)[:2000], repo_id=repo_id, retry=True)
+
+    def run_once(self, now: float = None, ignore_window: bool = False) -> int:
+        """Claim and push one batch; returns the number of jobs handled."""
+        jobs = self._claim(now or time.time(), ignore_window=ignore_window)
+        if not jobs:
+            return 0
+        self._push(jobs)
+        return len(jobs)
+
+    def _loop(self):
+        while True:
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"[HF] Queue worker error: {e}")
+            self._wake.wait(HF_POLL_INTERVAL)
+            self._wake.clear()
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"hf-queue-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    # ── Admin ──
+    def summary(self, conn, status: str = None, limit: int = 50) -> dict:
+        counts = {r["status"]: r["c"] for r in conn.execute("SELECT status, COUNT(*) as c FROM hf_jobs GROUP BY status")}
+        if status:
+            rows = conn.execute("SELECT * FROM hf_jobs WHERE status=? ORDER BY id DESC LIMIT ?", (status, limit)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM hf_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        items: dict = {}
+        if rows:
+            ids = [r["id"] for r in rows]
+            for r in conn.execute(f"SELECT job_id, submission_id FROM hf_job_items WHERE job_id IN ({','.join('?' * len(ids))})",
+                                  ids):
+                items.setdefault(r["job_id"], []).append(r["submission_id"])
+        jobs = []
+        for r in rows:
+            job = dict(r)
+            job["files"] = json.loads(job["files"])
+            job["submission_ids"] = items.get(job["id"], [])
+            jobs.append(job)
+        return {"counts": counts, "depth": counts.get("QUEUED", 0) + counts.get("RUNNING", 0), "jobs": jobs}
+
+    def jobs_for(self, conn, submission_id: str) -> List[dict]:
+        """Push jobs covering a submission, newest first."""
+        rows = conn.execute("""SELECT j.id, j.category, j.status, j.attempts, j.repo_id, j.last_error, j.updated_at
+                               FROM hf_job_items i JOIN hf_jobs j ON j.id = i.job_id
+                               WHERE i.submission_id=? ORDER BY j.id DESC""", (submission_id,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def retry(self, conn, job_id: int) -> bool:
+        cur = conn.execute("""UPDATE hf_jobs SET status='QUEUED', attempts=0, next_attempt_at=?, last_error=NULL,
+                              updated_at=? WHERE id=? AND status IN ('FAILED', 'SKIPPED')""",
+                           (time.time() - self.batch_window, datetime.utcnow().isoformat(), job_id))
+        self._wake.set()
+        return cur.rowcount > 0
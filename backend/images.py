@@ -0,0 +1,493 @@
+"""Image uploads: metadata, GPS stripping, thumbnails and near-duplicate hashes.
+
+process_image() decodes an upload once, in the extraction process pool,
+and returns its dimensions, a few EXIF fields, a pHash and a dHash, after
+writing a WebP thumbnail. JPEGs are decoded at reduced scale (draft mode),
+so a 12-megapixel photo costs a fraction of a full decode.
+
+GPS: if the EXIF (or an XMP packet) carries a location, the file is
+rewritten without it, segment by segment, so the pixels are untouched
+(JPEG APP1, PNG eXIf/iTXt, WebP EXIF/XMP chunks). The ingest pipeline
+stores the cleaned copy as a new blob and swaps it into the submission,
+so the original, with the location, is garbage-collected like any other
+unreferenced blob. Its hash stays in content_hashes, and in the image's
+metadata entry (original_sha256) so a re-dedupe can restore it, so
+uploading the same original again is still an exact duplicate.
+
+Near duplicates (re-encodes, resizes, small edits) are found by Hamming
+distance between 64-bit pHashes. The image_hash_bands table indexes
+every hash by its 8 bytes; two hashes within IMAGE_DUP_DISTANCE (< 8)
+bits differ in at most 7 bytes, so they share at least one band, and a
+lookup is 8 index probes plus a popcount per candidate. The dHash must
+agree as well (within IMAGE_DHASH_DISTANCE), which weeds out
+unrelated images that happen to share low frequencies.
+
+Pillow is optional: without it images keep "[Image file]" as their only
+analysis, as before.
+"""
+import asyncio, hashlib, io, json, math, os, warnings, zlib
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+from .extraction import IMAGE_EXT
+
+THUMB_SIZE           = int(os.getenv("THUMB_SIZE", "320"))          # longest side, px
+THUMB_QUALITY        = int(os.getenv("THUMB_QUALITY", "75"))
+IMAGE_MAX_PIXELS     = int(os.getenv("IMAGE_MAX_PIXELS", str(60_000_000)))  # decompression-bomb guard
+IMAGE_DUP_DISTANCE   = min(7, int(os.getenv("IMAGE_DUP_DISTANCE", "6")))    # pHash bits; 8 bands cover < 8
+IMAGE_DHASH_DISTANCE = int(os.getenv("IMAGE_DHASH_DISTANCE", "12"))
+
+HASH_BANDS = 8
+EXIF_GPS_IFD = 0x8825
+EXIF_SUB_IFD = 0x8769
+EXIF_FIELDS = {0x010F: "make", 0x0110: "model", 0x0131: "software", 0x0132: "datetime", 0x0112: "orientation"}
+EXIF_SUB_FIELDS = {0x9003: "datetime_original"}
+_EXIF_HEADER = b"Exif\x00\x00"
+_XMP_GPS = b"GPSL"   # exif:GPSLatitude / exif:GPSLongitude in an XMP packet
+
+IMAGE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS image_hashes (
+        submission_id TEXT NOT NULL,
+        file_index INTEGER NOT NULL,
+        phash INTEGER NOT NULL,
+        dhash INTEGER NOT NULL,
+        PRIMARY KEY (submission_id, file_index)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS image_hash_bands (
+        band INTEGER NOT NULL,
+        value INTEGER NOT NULL,
+        submission_id TEXT NOT NULL,
+        PRIMARY KEY (band, value, submission_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_image_hash_bands_submission ON image_hash_bands(submission_id)",
+]
+
+
+# ── Perceptual hashes ──────────────────────────────────────────────────
+_DCT = [[math.cos((2 * x + 1) * u * math.pi / 64) for x in range(32)] for u in range(8)]
+
+
+def phash(img) -> int:
+    """64-bit DCT hash: the 8x8 lowest frequencies of a 32x32 grayscale copy, above/below their median."""
+    px = img.convert("L").resize((32, 32), Image.Resampling.LANCZOS).tobytes()
+    rows = [px[y * 32:(y + 1) * 32] for y in range(32)]
+    # Separable 2-D DCT, keeping only the 8 lowest frequencies in each direction
+    partial = [[sum(c * p for c, p in zip(cu, row)) for cu in _DCT] for row in rows]
+    coeffs = [sum(cv[y] * partial[y][u] for y in range(32)) for cv in _DCT for u in range(8)]
+    median = sorted(coeffs)[32]
+    return sum(1 << i for i, c in enumerate(coeffs) if c > median)
+
+
+def dhash(img) -> int:
+    """64-bit gradient hash: is each pixel of a 9x8 grayscale copy brighter than its right neighbour."""
+    px = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+    bits = [px[y * 9 + x] > px[y * 9 + x + 1] for y in range(8) for x in range(8)]
+    return sum(1 << i for i, b in enumerate(bits) if b)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+
+def _signed(h: int) -> int:
+    """A uint64 as the signed value SQLite INTEGER can hold."""
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def _bands(h: int) -> List[int]:
+    return [(h >> (8 * band)) & 0xFF for band in range(HASH_BANDS)]
+
+
+# ── GPS stripping (lossless) ───────────────────────────────────────────
+def _exif_without_gps(raw: bytes) -> Tuple[bool, Optional[bytes]]:
+    """(had GPS, EXIF rebuilt without it, None meaning drop the block). raw may carry the Exif header."""
+    exif = Image.Exif()
+    try:
+        exif.load(raw)
+    except Exception:
+        return True, None  # unreadable; it may still hold a location, so drop it
+    if EXIF_GPS_IFD not in exif:
+        return False, raw
+    del exif[EXIF_GPS_IFD]
+    try:
+        rebuilt = exif.tobytes()
+    except Exception:
+        return True, None
+    if not rebuilt.startswith(_EXIF_HEADER):
+        rebuilt = _EXIF_HEADER + rebuilt
+    return True, rebuilt if raw.startswith(_EXIF_HEADER) else rebuilt[len(_EXIF_HEADER):]
+
+
+def _strip_jpeg(data: bytes) -> Optional[bytes]:
+    out, i, found = [data[:2]], 2, False
+    while i + 4 <= len(data) and data[i] == 0xFF:
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            out.append(data[i:i + 1])
+            i += 1
+            continue
+        if marker in (0xDA, 0xD9):  # start of scan: the rest is image data
+            break
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            out.append(data[i:i + 2])
+            i += 2
+            continue
+        end = i + 2 + int.from_bytes(data[i + 2:i + 4], "big")
+        segment, payload = data[i:end], data[i + 4:end]
+        if marker == 0xE1 and payload.startswith(_EXIF_HEADER):
+            had, rebuilt = _exif_without_gps(payload)
+            if had:
+                found = True
+                if rebuilt is not None and len(rebuilt) + 2 <= 0xFFFF:
+                    out.append(b"\xFF\xE1" + (len(rebuilt) + 2).to_bytes(2, "big") + rebuilt)
+                i = end
+                continue
+        elif marker == 0xE1 and b"ns.adobe.com/xap" in payload[:64] and _XMP_GPS in payload:
+            found = True
+            i = end
+            continue
+        out.append(segment)
+        i = end
+    return b"".join(out) + data[i:] if found else None
+
+
+def _strip_png(data: bytes) -> Optional[bytes]:
+    out, i, found = [data[:8]], 8, False
+    while i + 12 <= len(data):
+        length = int.from_bytes(data[i:i + 4], "big")
+        kind, body = data[i + 4:i + 8], data[i + 8:i + 8 + length]
+        chunk = data[i:i + 12 + length]
+        i += 12 + length
+        if kind == b"eXIf":
+            had, rebuilt = _exif_without_gps(body)
+            if had:
+                found = True
+                if rebuilt is not None:
+                    out.append(len(rebuilt).to_bytes(4, "big") + kind + rebuilt
+                               + zlib.crc32(kind + rebuilt).to_bytes(4, "big"))
+                continue
+        elif kind == b"iTXt" and body.startswith(b"XML:com.adobe.xmp\x00") and _XMP_GPS in body:
+            found = True
+            continue
+        out.append(chunk)
+        if kind == b"IEND":
+            break
+    return b"".join(out) if found else None
+
+
+def _strip_webp(data: bytes) -> Optional[bytes]:
+    chunks, i, found = [], 12, False
+    while i + 8 <= len(data):
+        kind = data[i:i + 4]
+        length = int.from_bytes(data[i + 4:i + 8], "little")
+        body = data[i + 8:i + 8 + length]
+        i += 8 + length + (length & 1)
+        if kind == b"EXIF":
+            had, rebuilt = _exif_without_gps(body)
+            if had:
+                found = True
+                if rebuilt is not None:
+                    chunks.append([kind, rebuilt])
+                continue
+        elif kind == b"XMP " and _XMP_GPS in body:
+            found = True
+            continue
+        chunks.append([kind, body])
+    if not found:
+        return None
+    kinds = {k for k, _ in chunks}
+    for chunk in chunks:
+        if chunk[0] == b"VP8X":  # feature flags must match the chunks present
+            flags = chunk[1][0] & ~(0x08 if b"EXIF" not in kinds else 0) & ~(0x04 if b"XMP " not in kinds else 0)
+            chunk[1] = bytes([flags]) + chunk[1][1:]
+    body = b"WEBP" + b"".join(k + len(b).to_bytes(4, "little") + b + (b"\x00" if len(b) & 1 else b"")
+                              for k, b in chunks)
+    return b"RIFF" + len(body).to_bytes(4, "little") + body
+
+
+def strip_gps(data: bytes) -> Optional[bytes]:
+    """data without its GPS location (EXIF GPS IFD, XMP packets naming one), or None if it has none."""
+    if data.startswith(b"\xFF\xD8"):
+        return _strip_jpeg(data)
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _strip_png(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _strip_webp(data)
+    return None
+
+
+# ── Pool worker ────────────────────────────────────────────────────────
+def _exif_fields(exif) -> Dict[str, str]:
+    fields = {name: exif[tag] for tag, name in EXIF_FIELDS.items() if tag in exif}
+    sub = exif.get_ifd(EXIF_SUB_IFD)
+    fields.update({name: sub[tag] for tag, name in EXIF_SUB_FIELDS.items() if tag in sub})
+    return {k: str(v).strip("\x00 ")[:100] for k, v in fields.items()}
+
+
+def _decode(data: bytes):
+    """Open and load data at (at least) thumbnail scale; returns (image, full size, format, frames)."""
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        img = Image.open(io.BytesIO(data))
+        size, fmt, frames = img.size, img.format, getattr(img, "n_frames", 1)
+        img.draft("RGB", (THUMB_SIZE, THUMB_SIZE))  # JPEG: decode at 1/2, 1/4 or 1/8 scale
+        img.load()
+    return img, size, fmt, frames
+
+
+def make_thumbnail(src: str, dest: str):
+    """Write a WebP thumbnail of src (no metadata) to dest. Top-level so it can run in the pool."""
+    img = _decode(Path(src).read_bytes())[0]
+    _save_thumbnail(ImageOps.exif_transpose(img), dest)
+
+
+def _save_thumbnail(img, dest: str):
+    img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+    img.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    img.save(dest, "WEBP", quality=THUMB_QUALITY, method=4)
+
+
+def process_image(src: str, thumb_to: str, strip_to: str) -> dict:
+    """Analyse one image file; pure apart from the two output paths, so it can run in the pool.
+
+    Writes the thumbnail to thumb_to and, when the file carries a location,
+    a copy without it to strip_to. Returns {"width", "height", "format",
+    "frames", "exif", "phash", "dhash", "gps_removed"} (hashes as signed
+    ints, None for blank images), or {"error"} if the file can't be decoded.
+    """
+    data = Path(src).read_bytes()
+    try:
+        img, (width, height), fmt, frames = _decode(data)
+        exif = img.getexif()
+        fields = _exif_fields(exif)
+        img = ImageOps.exif_transpose(img)
+        p, d = phash(img), dhash(img)
+        _save_thumbnail(img, thumb_to)
+    except Exception as e:  # truncated or hostile files, bombs, formats Pillow can't read
+        return {"error": f"{type(e).__name__}: {e}"[:200]}
+    info = {"width": width, "height": height, "format": fmt, "frames": frames, "exif": fields,
+            # A flat image hashes to all-0 or all-1 bits and would "match" every other flat image
+            "phash": _signed(p) if p not in (0, (1 << 64) - 1) else None, "dhash": _signed(d),
+            "gps_removed": False}
+    stripped = strip_gps(data)
+    if stripped is not None:
+        Path(strip_to).write_bytes(stripped)
+        info["gps_removed"] = True
+    return info
+
+
+# ── Near-duplicate index ───────────────────────────────────────────────
+def find_similar_images(conn, hashes: Iterable[Tuple[int, int]], exclude_id: str = None,
+                        max_distance: int = IMAGE_DUP_DISTANCE) -> List[Tuple[str, float]]:
+    """Return (submission_id, 1 - distance/64) for indexed images near any of hashes, best first."""
+    best: Dict[str, int] = {}
+    for p, d in hashes:
+        candidates = set()
+        for band, value in enumerate(_bands(p)):
+            for r in conn.execute("SELECT submission_id FROM image_hash_bands WHERE band=? AND value=?",
+                                  (band, value)):
+                candidates.add(r["submission_id"])
+        candidates.discard(exclude_id)
+        if not candidates:
+            continue
+        marks = ",".join("?" * len(candidates))
+        for r in conn.execute(f"SELECT submission_id, phash, dhash FROM image_hashes WHERE submission_id IN ({marks})",
+                              list(candidates)):
+            dist = hamming(p, r["phash"])
+            if dist <= max_distance and hamming(d, r["dhash"]) <= IMAGE_DHASH_DISTANCE:
+                best[r["submission_id"]] = min(dist, best.get(r["submission_id"], 64))
+    return sorted(((sid, round(1 - dist / 64, 3)) for sid, dist in best.items()), key=lambda m: -m[1])
+
+
+def record_image_hashes(conn, submission_id: str, hashes: Dict[int, Tuple[int, int]]):
+    """Index a submission's images ({file_index: (phash, dhash)})."""
+    forget_images(conn, [submission_id])
+    conn.executemany("INSERT INTO image_hashes (submission_id, file_index, phash, dhash) VALUES (?,?,?,?)",
+                     [(submission_id, i, p, d) for i, (p, d) in hashes.items()])
+    conn.executemany("INSERT OR IGNORE INTO image_hash_bands (band, value, submission_id) VALUES (?,?,?)",
+                     [(band, value, submission_id) for p, _ in hashes.values() for band, value in enumerate(_bands(p))])
+
+
+def image_hashes_of(conn, submission_id: str) -> List[Tuple[int, int]]:
+    return [(r["phash"], r["dhash"]) for r in
+            conn.execute("SELECT phash, dhash FROM image_hashes WHERE submission_id=?", (submission_id,))]
+
+
+def forget_images(conn, submission_ids: List[str]):
+    params = [(sid,) for sid in submission_ids]
+    conn.executemany("DELETE FROM image_hashes WHERE submission_id=?", params)
+    conn.executemany("DELETE FROM image_hash_bands WHERE submission_id=?", params)
+
+
+# ── Ingest-side glue ───────────────────────────────────────────────────
+def is_image(name: str) -> bool:
+    return Path(name).suffix.lower() in IMAGE_EXT
+
+
+class ThumbnailStore:
+    """WebP thumbnails under root, named after the source file's SHA-256 (so shared by identical uploads)."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.webp"
+
+    def tmp_path(self, name: str) -> Path:
+        (self.root / ".tmp").mkdir(parents=True, exist_ok=True)
+        return self.root / ".tmp" / name
+
+    def put(self, tmp: Path, digest: str):
+        dest = self.path_for(digest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, dest)
+
+
+class ImageProcessor:
+    """Runs process_image() in the extraction pool and files its outputs in the blob and thumbnail stores."""
+
+    def __init__(self, extractor, blob_store, thumbnails: ThumbnailStore):
+        self.extractor = extractor
+        self.blobs = blob_store
+        self.thumbnails = thumbnails
+
+    async def analyze(self, path: str, digest: str, name: str) -> dict:
+        """process_image() for a stored upload; with "blob" {"key", "path", "sha256", "size"} when a
+        GPS-free copy was stored. Raises ExtractionQueueFull."""
+        strip_to = self.blobs.temp_path()
+        thumb_to = self.thumbnails.tmp_path(strip_to.name)
+        try:
+            info = await self.extractor.run(process_image, path, str(thumb_to), str(strip_to))
+        except asyncio.TimeoutError:
+            info = {"error": f"Timed out after {self.extractor.timeout}s"}
+        except BrokenProcessPool:
+            info = {"error": "Worker crashed"}
+        if "error" in info:
+            print(f"[IMAGES] Could not analyse {name}: {info['error']}")
+            thumb_to.unlink(missing_ok=True)
+            strip_to.unlink(missing_ok=True)
+            return info
+        if info["gps_removed"]:
+            clean = await asyncio.to_thread(_sha256_and_size, strip_to)
+            key, dest = await asyncio.to_thread(self.blobs.put, strip_to, clean[0], name)
+            info["blob"] = {"key": key, "path": str(dest), "sha256": clean[0], "size": clean[1]}
+            digest = clean[0]
+        self.thumbnails.put(thumb_to, digest)
+        return info
+
+    def swap_files(self, conn, sub: dict, replaced: Dict[int, dict]) -> Tuple[list, list]:
+        """Point sub at the GPS-free blobs, inside the caller's transaction; returns (paths, hashes).
+
+        The original blobs lose their reference and go the way of any unreferenced blob.
+        """
+        paths = json.loads(sub.get("file_paths") or "[]")
+        hashes = json.loads(sub.get("file_hashes") or "[]")
+        old_keys, new_keys, delta = [], [], 0
+        for i, blob in replaced.items():
+            old = self.blobs.key_of(paths[i])
+            if old:
+                old_keys.append(old)
+            delta += blob["size"] - (os.path.getsize(paths[i]) if os.path.exists(paths[i]) else 0)
+            paths[i], hashes[i] = blob["path"], blob["sha256"]
+            new_keys.append(blob["key"])
+        conn.execute("UPDATE submissions SET file_paths=?, file_hashes=?, storage_bytes=storage_bytes+? WHERE id=?",
+                     (json.dumps(paths), json.dumps(hashes), delta, sub["id"]))
+        self.blobs.incref(conn, new_keys)
+        self.blobs.decref(conn, old_keys)
+        return paths, hashes
+
+    async def thumbnail(self, path: str, digest: str) -> Optional[Path]:
+        """The cached thumbnail for a stored image, made in the pool if missing; None if it can't be.
+
+        Raises ExtractionQueueFull.
+        """
+        cached = self.thumbnails.path_for(digest)
+        if cached.exists():
+            return cached
+        if not os.path.exists(path):
+            return None
+        tmp = self.thumbnails.tmp_path(f"{digest}.{os.getpid()}.webp")
+        try:
+            await self.extractor.run(make_thumbnail, path, str(tmp))
+        except (asyncio.TimeoutError, BrokenProcessPool):
+            return None
+        except Exception as e:
+            print(f"[IMAGES] No thumbnail for {path}: {e}")
+            tmp.unlink(missing_ok=True)
+            return None
+        self.thumbnails.put(tmp, digest)
+        return cached
+
+
+def _sha256_and_size(path: Path) -> Tuple[str, int]:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest(), path.stat().st_size
+
+
+def backfill_images(get_conn, processor: ImageProcessor, batch_size: int = 200) -> dict:
+    """Analyse images uploaded before this module existed, as ingest does for new ones.
+
+    Fills metadata["images"], thumbnails and the hash index, and swaps in
+    GPS-free copies. Submissions that already have metadata["images"] (or
+    are still RECEIVED, which ingest will handle) are skipped, so it is safe
+    to re-run. Duplicate flags are not touched; run rededupe afterwards.
+    """
+    counts = {"submissions": 0, "images": 0, "gps_removed": 0, "errors": 0}
+    after = ""
+    while True:
+        conn = get_conn()
+        try:
+            rows = [dict(r) for r in conn.execute(
+                "SELECT id, status, file_paths, file_names, file_hashes, metadata FROM submissions "
+                "WHERE id > ? ORDER BY id LIMIT ?", (after, batch_size))]
+        finally:
+            conn.close()
+        for sub in rows:
+            metadata = json.loads(sub["metadata"] or "{}")
+            names = json.loads(sub["file_names"] or "[]")
+            if sub["status"] == "RECEIVED" or "images" in metadata or not any(map(is_image, names)):
+                continue
+            paths, digests = json.loads(sub["file_paths"] or "[]"), json.loads(sub["file_hashes"] or "[]")
+            info_list, hashes, replaced = [], {}, {}
+            for i, (path, name, digest) in enumerate(zip(paths, names, digests)):
+                if not is_image(name) or not os.path.exists(path):
+                    continue
+                info = asyncio.run(processor.analyze(path, digest, name))
+                info_list.append({"file": name, **{k: v for k, v in info.items() if k not in ("phash", "dhash", "blob")}})
+                counts["errors" if "error" in info else "images"] += 1
+                if info.get("phash") is not None:
+                    hashes[i] = (info["phash"], info["dhash"])
+                if "blob" in info:
+                    replaced[i] = info["blob"]
+                    info_list[-1]["original_sha256"] = digest
+            metadata["images"] = info_list
+            conn = get_conn()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("UPDATE submissions SET metadata=? WHERE id=?", (json.dumps(metadata), sub["id"]))
+                if replaced:
+                    processor.swap_files(conn, sub, replaced)
+                record_image_hashes(conn, sub["id"], hashes)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            counts["submissions"] += 1
+            counts["gps_removed"] += len(replaced)
+        if len(rows) < batch_size:
+            break
+        after = rows[-1]["id"]
+    return counts
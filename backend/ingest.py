@@ -0,0 +1,396 @@
+"""Background analysis of new submissions.
+
+/api/submit only stores the files and inserts the row as RECEIVED, with
+an ingest_jobs row in the same transaction, and answers 202. Worker
+threads then claim due jobs with BEGIN IMMEDIATE (safe across gunicorn
+workers), run extraction, PII, profanity and duplicate detection, and
+move the submission to PENDING with its flags filled in:
+
+    RECEIVED ──analysis──▶ PENDING ──review──▶ APPROVED / REJECTED
+        └── archive over the limits ──▶ REJECTED (audit: AUTO_REJECTED)
+
+A job whose worker died is picked up again once its lease expires;
+errors are retried with exponential backoff, and after INGEST_MAX_ATTEMPTS
+the job is left FAILED (the submission stays RECEIVED) for an admin to
+retry. A busy extraction pool only postpones a job, it does not use up
+an attempt.
+
+Images are decoded once each (see images.py): their dimensions and EXIF
+go into metadata["images"], a thumbnail is cached, a copy without the GPS
+location replaces the upload, and their pHashes join the near-duplicate
+checks.
+
+Each worker thread runs one analysis at a time on its own event loop, so
+the CPU-bound scans never stall the request loop. INGEST_MAX_BACKLOG caps
+how many RECEIVED submissions may wait; past it, /api/submit answers 503.
+"""
+import asyncio, json, os, random, threading, time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from . import dedupe, images, metrics
+from .archives import ArchiveRejected, is_archive, join_member_texts
+from .extraction import ExtractionQueueFull
+from .pii import scan_pii, summarize as summarize_pii, flag_types as pii_flag_types
+
+INGEST_WORKERS       = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_MAX_BACKLOG   = int(os.getenv("INGEST_MAX_BACKLOG", "200"))    # RECEIVED rows before submit says 503
+INGEST_MAX_ATTEMPTS  = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+INGEST_BACKOFF_BASE  = float(os.getenv("INGEST_BACKOFF_BASE", "10"))  # seconds, doubled per attempt
+INGEST_BACKOFF_MAX   = float(os.getenv("INGEST_BACKOFF_MAX", "600"))
+INGEST_BUSY_DELAY    = float(os.getenv("INGEST_BUSY_DELAY", "5"))     # retry delay when the extractor is full
+INGEST_LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "900"))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "2"))
+
+MAX_STORED_FLAG_MATCHES = 500    # cap on profanity matches kept per submission
+IMAGE_EXT = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+
+INGEST_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS ingest_jobs (
+        submission_id TEXT PRIMARY KEY,
+        status TEXT NOT NULL DEFAULT 'QUEUED',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        lease_until REAL,
+        last_error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status_due ON ingest_jobs(status, next_attempt_at)",
+]
+
+
+def detect_category(file_names: List[str], pdf_scanned: List[bool] = ()) -> str:
+    """Data category from the upload types; PDFs are scan_pdf when every one is a scan."""
+    exts = [Path(n).suffix.lower() for n in file_names]
+    if any(e in IMAGE_EXT for e in exts):
+        return "images"
+    if ".pdf" in exts:
+        # Scans have (almost) no text layer on most pages; see pdf_text.py
+        return "scan_pdf" if pdf_scanned and all(pdf_scanned) else "pdf"
+    if any(is_archive(n) for n in file_names):
+        return "zip"
+    return "raw_text"
+
+
+class IngestPipeline:
+    def __init__(self, get_conn, extractor, profanity, workers: int = INGEST_WORKERS, image_processor=None):
+        self.get_conn = get_conn
+        self.extractor = extractor
+        self.profanity = profanity
+        self.image_processor = image_processor  # None without Pillow
+        self.workers = workers
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # ── Producer side ──
+    def enqueue(self, conn, submission_id: str):
+        """Queue analysis of a RECEIVED submission, inside the caller's transaction."""
+        conn.execute("INSERT INTO ingest_jobs (submission_id, status, next_attempt_at, created_at) "
+                     "VALUES (?, 'QUEUED', ?, ?)", (submission_id, time.time(), datetime.utcnow().isoformat()))
+
+    def wake(self):
+        self._wake.set()
+
+    def backlog(self, conn) -> int:
+        row = conn.execute("SELECT value FROM stats_counters WHERE key='status:RECEIVED'").fetchone()
+        return row["value"] if row else 0
+
+    # ── Consumer side ──
+    def _claim(self, now: float) -> Optional[dict]:
+        conn = self.get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Jobs whose worker died keep RUNNING with an expired lease; treat them as due
+            job = conn.execute("""SELECT * FROM ingest_jobs
+                                  WHERE (status='QUEUED' AND next_attempt_at <= ?) OR (status='RUNNING' AND lease_until < ?)
+                                  ORDER BY next_attempt_at LIMIT 1""", (now, now)).fetchone()
+            if job is None:
+                conn.rollback()
+                return None
+            conn.execute("""UPDATE ingest_jobs SET status='RUNNING', attempts=attempts+1, lease_until=?, updated_at=?
+                            WHERE submission_id=?""",
+                         (now + INGEST_LEASE_SECONDS, datetime.utcnow().isoformat(), job["submission_id"]))
+            sub = conn.execute("SELECT * FROM submissions WHERE id=?", (job["submission_id"],)).fetchone()
+            if sub is None or sub["status"] != "RECEIVED":
+                # Deleted, or already analysed by a worker whose lease had lapsed
+                conn.execute("DELETE FROM ingest_jobs WHERE submission_id=?", (job["submission_id"],))
+                conn.commit()
+                return {}
+            conn.commit()
+            return {"job": dict(job, attempts=job["attempts"] + 1), "submission": dict(sub)}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _retry(self, job: dict, error: str, delay: float = None, count: bool = True):
+        """Put a job back in the queue, or leave it FAILED once it is out of attempts."""
+        attempts = job["attempts"] if count else job["attempts"] - 1
+        if count and attempts >= INGEST_MAX_ATTEMPTS:
+            status, next_at = "FAILED", time.time()
+        else:
+            status = "QUEUED"
+            if delay is None:
+                delay = min(INGEST_BACKOFF_BASE * 2 ** (attempts - 1), INGEST_BACKOFF_MAX) * random.uniform(0.8, 1.2)
+            next_at = time.time() + delay
+        conn = self.get_conn()
+        try:
+            conn.execute("""UPDATE ingest_jobs SET status=?, attempts=?, next_attempt_at=?, lease_until=NULL,
+                            last_error=?, updated_at=? WHERE submission_id=?""",
+                         (status, attempts, next_at, error, datetime.utcnow().isoformat(), job["submission_id"]))
+            conn.commit()
+        finally:
+            conn.close()
+        return status
+
+    async def analyze(self, sub: dict) -> dict:
+        """Extract and scan a submission's text and files; the columns to store plus dedupe inputs.
+
+        Raises ArchiveRejected and ExtractionQueueFull.
+        """
+        text_content = sub.get("text_content") or ""
+        file_paths = json.loads(sub.get("file_paths") or "[]")
+        file_names = json.loads(sub.get("file_names") or "[]")
+        file_hashes = json.loads(sub.get("file_hashes") or "[]")
+
+        extracted_texts = []
+        pii_matches = scan_pii(text_content, source="text")
+        prof_matches = self.profanity.scan(text_content, source="text")
+        all_text = text_content
+        member_hashes = []
+        archive_members = 0
+        pdf_pages = pdf_image_only_pages = 0
+        pdf_scanned = []
+        image_info, image_hashes, replaced = [], {}, {}
+        for index, (fpath, name, digest) in enumerate(zip(file_paths, file_names, file_hashes)):
+            with metrics.stage("extract"):
+                if is_archive(name):
+                    try:
+                        members = await self.extractor.extract_archive(fpath, digest, name=name)
+                    except ArchiveRejected as e:
+                        raise ArchiveRejected(f"Archive {name} rejected: {e}") from e
+                elif images.is_image(name):
+                    # Nothing to parse; the image processor below reads the file itself
+                    extracted = "[Image file]"
+                elif Path(name).suffix.lower() == ".pdf":
+                    pdf = await self.extractor.extract_pdf(fpath, digest)
+                    extracted = pdf["text"]
+                    pdf_pages += pdf["pages"]
+                    pdf_image_only_pages += pdf["image_only_pages"]
+                    pdf_scanned.append(pdf["scanned"])
+                else:
+                    extracted = await self.extractor.extract_text(fpath, digest)
+            if is_archive(name):
+                # Each member is checked on its own, and its bytes join the exact-duplicate index
+                for m in members:
+                    member_hashes.append(m["sha256"])
+                    if m["text"] and m["text"] != "[Image file]":
+                        extracted_texts.append(m["text"])
+                        pii_matches += scan_pii(m["text"], source=f"{name}/{m['name']}")
+                        prof_matches += self.profanity.scan(m["text"], source=f"{name}/{m['name']}")
+                archive_members += len(members)
+                extracted = join_member_texts(members)
+            elif extracted != "[Image file]":
+                extracted_texts.append(extracted)
+                pii_matches += scan_pii(extracted, source=name)
+                prof_matches += self.profanity.scan(extracted, source=name)
+            all_text += "\n" + extracted
+            if self.image_processor is not None and images.is_image(name):
+                with metrics.stage("image"):
+                    info = await self.image_processor.analyze(fpath, digest, name)
+                image_info.append({"file": name, **{k: v for k, v in info.items() if k not in ("phash", "dhash", "blob")}})
+                if info.get("phash") is not None:
+                    image_hashes[index] = (info["phash"], info["dhash"])
+                if "blob" in info:
+                    replaced[index] = info["blob"]
+                    # file_hashes will name the clean copy; re-dedupe reads the upload's hash from here
+                    image_info[-1]["original_sha256"] = digest
+
+        # MinHash is CPU-bound too; if the pool is saturated the submission is
+        # simply left out of the near-duplicate index until the next re-dedupe.
+        try:
+            signature = await self.extractor.run(dedupe.minhash_signature,
+                                                 dedupe.signature_text([text_content, *extracted_texts]))
+        except (ExtractionQueueFull, asyncio.TimeoutError):
+            signature = None
+            print(f"[DEDUPE] Skipped near-duplicate signature for {sub['id']}")
+
+        metadata = json.loads(sub.get("metadata") or "{}")
+        metadata["text_length"] = len(all_text)
+        if archive_members:
+            metadata["archive_members"] = archive_members
+        if pdf_scanned:
+            metadata.update(pdf_pages=pdf_pages, pdf_image_only_pages=pdf_image_only_pages)
+        if image_info:
+            metadata["images"] = image_info
+        # The GPS-free copies are indexed too, so either version uploaded again is an exact duplicate
+        clean_hashes = [blob["sha256"] for blob in replaced.values()]
+        return {
+            "extracted_text": "\n".join(extracted_texts),
+            "metadata": metadata,
+            "pii_matches": pii_matches,
+            "prof_matches": prof_matches,
+            "category": detect_category(file_names, pdf_scanned),
+            "hash_pairs": dedupe.collect_hashes(file_hashes + clean_hashes + member_hashes,
+                                                [text_content] + extracted_texts),
+            "signature": signature,
+            "image_hashes": image_hashes,
+            "replaced": replaced,
+        }
+
+    def _store(self, sub: dict, result: dict) -> bool:
+        """Record the analysis and move the row to PENDING; False if it is no longer RECEIVED."""
+        sid = sub["id"]
+        pii_summary = summarize_pii(result["pii_matches"])
+        conn = self.get_conn()
+        try:
+            # Writers are serialized from here, so two copies analysed at once still see each other
+            conn.execute("BEGIN IMMEDIATE")
+            with metrics.stage("dedupe"):
+                exact = dedupe.find_exact_duplicates(conn, result["hash_pairs"], exclude_id=sid)
+                near = (dedupe.find_near_duplicates(conn, result["signature"], exclude_id=sid)
+                        if result["signature"] else [])
+                similar = (images.find_similar_images(conn, result["image_hashes"].values(), exclude_id=sid)
+                           if result["image_hashes"] else [])
+                dup_matches = dedupe.describe_matches(exact, near, similar)
+            with metrics.stage("db_update"):
+                cur = conn.execute("""UPDATE submissions SET status='PENDING', extracted_text=?, metadata=?,
+                                      pii_flags=?, pii_matches=?, profanity_flags=?, duplicate_flag=?,
+                                      duplicate_matches=?, data_category=?, updated_at=?
+                                      WHERE id=? AND status='RECEIVED'""",
+                                   (result["extracted_text"], json.dumps(result["metadata"]),
+                                    json.dumps(pii_flag_types(result["pii_matches"])), json.dumps(pii_summary),
+                                    json.dumps(result["prof_matches"][:MAX_STORED_FLAG_MATCHES]),
+                                    1 if dup_matches else 0, json.dumps(dup_matches), result["category"],
+                                    datetime.utcnow().isoformat(), sid))
+                if cur.rowcount:
+                    dedupe.record_hashes(conn, sid, result["hash_pairs"])
+                    if result["signature"]:
+                        dedupe.record_signature(conn, sid, result["signature"])
+                    if result["image_hashes"]:
+                        images.record_image_hashes(conn, sid, result["image_hashes"])
+                    if result["replaced"]:
+                        self.image_processor.swap_files(conn, sub, result["replaced"])
+                conn.execute("DELETE FROM ingest_jobs WHERE submission_id=?", (sid,))
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        if not cur.rowcount:
+            return False
+
+        metrics.inc("submissions_total", language=sub["language"], category=result["category"])
+        if dup_matches:
+            metrics.inc("duplicate_submissions_total", kind=dup_matches[0]["kind"])
+        for pii_type, n in pii_summary["counts"].items():
+            metrics.inc("pii_hits_total", n, type=pii_type)
+        if result["prof_matches"]:
+            metrics.inc("profanity_hits_total", len(result["prof_matches"]))
+        if result["replaced"]:
+            metrics.inc("image_gps_removed_total", len(result["replaced"]))
+        return True
+
+    def _reject(self, sub: dict, reason: str):
+        """Refuse a submission analysis cannot accept (an archive over the limits)."""
+        now = datetime.utcnow().isoformat()
+        conn = self.get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute("UPDATE submissions SET status='REJECTED', updated_at=? WHERE id=? AND status='RECEIVED'",
+                               (now, sub["id"]))
+            if cur.rowcount:
+                conn.execute("INSERT INTO audit_log (submission_id, action, admin_user, reason, notes, timestamp) "
+                             "VALUES (?, 'AUTO_REJECTED', 'system', ?, '', ?)", (sub["id"], reason, now))
+            conn.execute("DELETE FROM ingest_jobs WHERE submission_id=?", (sub["id"],))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def run_once(self, now: float = None) -> bool:
+        """Claim and analyse one submission; False when nothing was due."""
+        claimed = self._claim(now or time.time())
+        if claimed is None:
+            return False
+        if not claimed:
+            return True
+        job, sub = claimed["job"], claimed["submission"]
+        sid = sub["id"]
+        try:
+            with metrics.stage("ingest"):
+                result = asyncio.run(self.analyze(sub))
+                self._store(sub, result)
+            metrics.inc("ingest_total", outcome="analyzed")
+        except ArchiveRejected as e:
+            print(f"[INGEST] {sid}: {e}")
+            self._reject(sub, str(e))
+            metrics.inc("ingest_total", outcome="rejected")
+        except ExtractionQueueFull:
+            self._retry(job, "extractor busy", delay=INGEST_BUSY_DELAY * random.uniform(0.8, 1.2), count=False)
+            metrics.inc("ingest_total", outcome="busy")
+        except Exception as e:
+            status = self._retry(job, f"{type(e).__name__}: {e}"[:2000])
+            print(f"[INGEST] Analysis of {sid} failed ({status}): {e}")
+            metrics.inc("ingest_total", outcome="failed" if status == "FAILED" else "retry")
+        return True
+
+    def _loop(self):
+        while True:
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"[INGEST] Worker error: {e}")
+            self._wake.wait(INGEST_POLL_INTERVAL)
+            self._wake.clear()
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"ingest-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    # ── Status / admin ──
+    def status(self, conn, submission_id: str) -> Optional[dict]:
+        """What a contributor polling their submission sees; None if there is no such submission."""
+        row = conn.execute("""SELECT s.status, j.status AS job_status, j.attempts FROM submissions s
+                              LEFT JOIN ingest_jobs j ON j.submission_id = s.id WHERE s.id=?""",
+                           (submission_id,)).fetchone()
+        if row is None:
+            return None
+        result = {"submission_id": submission_id, "status": row["status"].lower()}
+        if row["status"] == "RECEIVED":
+            result["analysis"] = {"QUEUED": "queued", "RUNNING": "running", "FAILED": "failed"}.get(
+                row["job_status"], "queued")
+            result["attempts"] = row["attempts"] or 0
+        else:
+            result["analysis"] = "done"
+        if row["status"] == "REJECTED":
+            last = conn.execute("SELECT reason FROM audit_log WHERE submission_id=? ORDER BY timestamp DESC LIMIT 1",
+                                (submission_id,)).fetchone()
+            result["reason"] = last["reason"] if last else ""
+        return result
+
+    def summary(self, conn, status: str = None, limit: int = 50) -> dict:
+        counts = {r["status"]: r["c"] for r in conn.execute("SELECT status, COUNT(*) as c FROM ingest_jobs GROUP BY status")}
+        if status:
+            rows = conn.execute("SELECT * FROM ingest_jobs WHERE status=? ORDER BY created_at DESC LIMIT ?",
+                                (status, limit)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM ingest_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return {"counts": counts, "depth": counts.get("QUEUED", 0) + counts.get("RUNNING", 0),
+                "jobs": [dict(r) for r in rows]}
+
+    def retry(self, conn, submission_id: str) -> bool:
+        cur = conn.execute("""UPDATE ingest_jobs SET status='QUEUED', attempts=0, next_attempt_at=?, last_error=NULL,
+                              updated_at=? WHERE submission_id=? AND status='FAILED'""",
+                           (time.time(), datetime.utcnow().isoformat(), submission_id))
+        self._wake.set()
+        return cur.rowcount > 0
@@ -0,0 +1,32 @@
+"""Cross-process leader election for background jobs.
+
+Every gunicorn worker starts the same background threads; a job that
+must run once per deployment calls LeaderLock.held() on each tick. The
+first process to take the exclusive fcntl lock keeps it for its lifetime,
+and when it exits the OS releases the lock so another worker takes over.
+"""
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines run a single process
+    fcntl = None
+
+
+class LeaderLock:
+    def __init__(self, path):
+        self.path = Path(path)
+        self._fh = None
+
+    def held(self) -> bool:
+        """Take the lock if it is free; True while this process holds it."""
+        if self._fh is not None or fcntl is None:
+            return True
+        fh = open(self.path, "a")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fh.close()
+            return False
+        self._fh = fh
+        return True
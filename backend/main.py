@@ -1,14 +1,34 @@
-import os, uuid, hashlib, json, sqlite3, re, shutil, threading, time
+import os, uuid, hashlib, json, sqlite3, re, shutil, threading, time, asyncio, base64
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, List
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse, Response
 from jose import jwt, JWTError
 from passlib.hash import pbkdf2_sha256
+import aiofiles
+
+from .extraction import extractor, ExtractionCache, ExtractionQueueFull, EXTRACTION_CACHE_SCHEMA
+from . import dedupe
+from .db import ConnectionPool
+from . import search as fts
+from . import stats as counters
+from .profanity import ProfanityFilter, bump_version as bump_profanity_version, default_wordlist
+from . import hf_queue
+from .export_writer import ExportWriter, RebuildInProgress
+from .export_outbox import ExportOutbox, EXPORT_OUTBOX_SCHEMA
+from . import bulk_export
+from .retention import RetentionEngine, read_metrics as read_retention_metrics
+from .storage_usage import StorageReconciler, read_usage as read_storage_usage
+from .blobstore import BlobStore, BLOB_SCHEMA
+from .images import ImageProcessor, ThumbnailStore, IMAGE_SCHEMA, PILLOW_AVAILABLE, is_image
+from .ingest import IngestPipeline, INGEST_SCHEMA, INGEST_MAX_BACKLOG, detect_category
+from .admission import (AdmissionControl, RateLimiter, UploadSlots, RATE_LIMIT_SCHEMA, RATE_SUBMIT_IP,
+                        RATE_SUBMIT_EMAIL, RATE_FEEDBACK_IP, RATE_FEEDBACK_EMAIL)
+from . import metrics
+from . import static_assets
 
 try:
     from huggingface_hub import HfApi, login as hf_login
@@ -17,19 +37,29 @@ except ImportError:
     HF_AVAILABLE = False
     print("[HF] huggingface_hub not installed – HF push disabled")
 
+if not PILLOW_AVAILABLE:
+    print("[IMAGES] Pillow not installed – image metadata, thumbnails and GPS stripping disabled")
+
 # ── Config ──────────────────────────────────────────────────────────────
 BASE_DIR  = Path(__file__).resolve().parent.parent
 DATA_DIR  = Path(os.getenv("DATA_DIR", str(BASE_DIR)))  # /data on Render, project root locally
 STORAGE   = DATA_DIR / "storage"
 EXPORTS   = DATA_DIR / "exports"
+FRONTEND  = BASE_DIR / "frontend"
+STATIC_BUILD = Path(os.getenv("STATIC_BUILD", str(BASE_DIR / "build" / "static")))
 DB_PATH   = DATA_DIR / "mozhii.db"
 SECRET    = os.getenv("JWT_SECRET", "mozhii-secret-key-2025-vdry")
 ALGO      = "HS256"
 TOKEN_EXP = 24  # hours
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20 MB
 MAX_FILES     = 5
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB — read/hash/write uploads in pieces of this size
 ALLOWED_EXT   = {".txt", ".pdf", ".docx", ".csv", ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".zip", ".tar", ".gz"}
 TEMP_RETENTION_DAYS = 7   # auto-delete unreviewed uploads after 7 days
+SUBMIT_MAX_BODY   = MAX_FILES * MAX_FILE_SIZE + 1024 * 1024  # files plus the form fields
+FEEDBACK_MAX_BODY = 16 * 1024
+FEEDBACK_MAX_MESSAGE = 5000  # characters
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # if set, /metrics wants "Authorization: Bearer <token>"
 
 # Data categories for HF repos
 DATA_CATEGORIES = ["raw_text", "images", "pdf", "scan_pdf", "zip"]
@@ -47,18 +77,47 @@ ADMIN_USERS = {
 # ── App ─────────────────────────────────────────────────────────────────
 app = FastAPI(title="Mozhii AI Data Collection")
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
-app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_credentials=True,
-                   allow_methods=["*"], allow_headers=["*"])
 
-# Serve frontend
-app.mount("/static", StaticFiles(directory=str(BASE_DIR / "frontend")), name="static")
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    # Labelled by route template, so /api/admin/submission/{sid} is one series
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - start, method=request.method,
+                        route=getattr(route, "path", "unmatched"), status=f"{status // 100}xx")
+
+# Serve frontend: fingerprinted, precompressed copies built from frontend/ (see static_assets.py)
+assets = static_assets.AssetStore(static_assets.ensure_built(FRONTEND, STATIC_BUILD))
 
 # ── Database ────────────────────────────────────────────────────────────
+db_pool = ConnectionPool(DB_PATH, observer=metrics.observe_query)
+db_read_pool = ConnectionPool(DB_PATH, readonly=True, observer=metrics.observe_query)
+
 def get_db():
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    """Pooled read-write connection; conn.close() returns it to the pool."""
+    return db_pool.acquire()
+
+async def db_conn():
+    """Route dependency: a read-write connection that is always given back."""
+    conn = db_pool.acquire()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+async def db_read():
+    """Route dependency: a read-only connection for GET endpoints."""
+    conn = db_read_pool.acquire()
+    try:
+        yield conn
+    finally:
+        conn.close()
 
 def init_db():
     conn = get_db()
@@ -80,6 +139,10 @@ def init_db():
         created_at TEXT NOT NULL,
         updated_at TEXT
     );
+    CREATE INDEX IF NOT EXISTS idx_submissions_status_lang_created ON submissions(status, language, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_submissions_status_created ON submissions(status, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_submissions_lang_created ON submissions(language, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_submissions_created ON submissions(created_at, id);
     CREATE TABLE IF NOT EXISTS audit_log (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         submission_id TEXT NOT NULL,
@@ -89,6 +152,8 @@ def init_db():
         notes TEXT,
         timestamp TEXT NOT NULL
     );
+    CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log(timestamp);
+    CREATE INDEX IF NOT EXISTS idx_audit_log_submission ON audit_log(submission_id, timestamp);
     CREATE TABLE IF NOT EXISTS feedbacks (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT,
@@ -104,6 +169,43 @@ def init_db():
         key TEXT PRIMARY KEY,
         value TEXT
     );
+    CREATE TABLE IF NOT EXISTS extraction_cache (
+        hash TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used ON extraction_cache(last_used);
+    CREATE TABLE IF NOT EXISTS content_hashes (
+        hash TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        submission_id TEXT NOT NULL,
+        PRIMARY KEY (hash, kind, submission_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_content_hashes_submission ON content_hashes(submission_id);
+    CREATE TABLE IF NOT EXISTS minhash_signatures (
+        submission_id TEXT PRIMARY KEY,
+        signature BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS lsh_buckets (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        submission_id TEXT NOT NULL,
+        PRIMARY KEY (band, bucket, submission_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_lsh_buckets_submission ON lsh_buckets(submission_id);
+    CREATE TABLE IF NOT EXISTS profanity_words (
+        language TEXT NOT NULL,
+        word TEXT NOT NULL,
+        added_by TEXT,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY (language, word)
+    );
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
     """)
     # Insert default HF settings if not present
     hf_cur = conn.execute("SELECT COUNT(*) as c FROM hf_settings")
@@ -124,14 +226,179 @@ def init_db():
         conn.execute("INSERT INTO stats_override VALUES ('contributors_display', '40+')")
         conn.execute("INSERT INTO stats_override VALUES ('datasets_display', '8+')")
     conn.commit()
+    run_migrations(conn)
     conn.close()
 
+# ── Migrations ─────────────────────────────────────────────────────────
+# Data migrations run once per database, tracked with PRAGMA user_version.
+# Append new steps to MIGRATIONS; never reorder or remove existing ones.
+def _migrate_backfill_content_hashes(conn):
+    """Fill content_hashes for submissions created before the table existed."""
+    rows = conn.execute("SELECT id, text_content, file_hashes FROM submissions").fetchall()
+    for r in rows:
+        file_hashes = json.loads(r["file_hashes"] or "[]")
+        texts = [r["text_content"] or ""]
+        # Reuse already-extracted file text where cached; never parse files here
+        for h in file_hashes:
+            hit = conn.execute("SELECT text FROM extraction_cache WHERE hash=?", (h,)).fetchone()
+            if hit and hit["text"] != "[Image file]":
+                texts.append(hit["text"])
+        dedupe.record_hashes(conn, r["id"], dedupe.collect_hashes(file_hashes, texts))
+
+def _migrate_add_duplicate_matches(conn):
+    """JSON list of {id, kind, score} explaining duplicate_flag."""
+    conn.execute("ALTER TABLE submissions ADD COLUMN duplicate_matches TEXT")
+
+def _migrate_add_pii_matches(conn):
+    """JSON {counts, total, matches[{type, start, end, source}]} from the PII scanner."""
+    conn.execute("ALTER TABLE submissions ADD COLUMN pii_matches TEXT")
+
+def _migrate_seed_profanity_words(conn):
+    """Seed the English list from better_profanity; Tamil/Sinhala lists are added by admins."""
+    now = datetime.utcnow().isoformat()
+    conn.executemany("INSERT OR IGNORE INTO profanity_words (language, word, added_by, created_at) VALUES ('english', ?, 'system', ?)",
+                     [(w, now) for w in default_wordlist()])
+    bump_profanity_version(conn)
+
+def _migrate_add_fulltext_search(conn):
+    """extracted_text column plus the FTS5 index over name, text and extracted text."""
+    conn.execute("ALTER TABLE submissions ADD COLUMN extracted_text TEXT")
+    for r in conn.execute("SELECT id, file_hashes FROM submissions").fetchall():
+        texts = []
+        for h in json.loads(r["file_hashes"] or "[]"):
+            hit = conn.execute("SELECT text FROM extraction_cache WHERE hash=?", (h,)).fetchone()
+            if hit and hit["text"] != "[Image file]":
+                texts.append(hit["text"])
+        if texts:
+            conn.execute("UPDATE submissions SET extracted_text=? WHERE id=?", ("\n".join(texts), r["id"]))
+    for stmt in fts.FTS_SCHEMA:
+        conn.execute(stmt)
+    conn.execute("INSERT INTO submissions_fts(submissions_fts) VALUES ('rebuild')")
+
+def _migrate_add_stats_counters(conn):
+    """Trigger-maintained dashboard counters, seeded from the current tables."""
+    for stmt in counters.STATS_SCHEMA:
+        conn.execute(stmt)
+    counters.rebuild_counters(conn)
+
+def _migrate_add_hf_jobs(conn):
+    """Durable queue of pending Hugging Face pushes."""
+    for stmt in hf_queue.HF_JOBS_SCHEMA:
+        conn.execute(stmt)
+
+def _migrate_add_storage_usage(conn):
+    """Per-submission byte sizes plus trigger-maintained totals.
+
+    Existing rows start at 0; the storage reconciler fills them in on its
+    first run rather than walking the disk while holding the migration lock.
+    """
+    conn.execute("ALTER TABLE submissions ADD COLUMN storage_bytes INTEGER NOT NULL DEFAULT 0")
+    for stmt in counters.STORAGE_SCHEMA:
+        conn.execute(stmt)
+    counters.rebuild_storage_counters(conn)
+
+def _migrate_add_blob_store(conn):
+    """Blob refcount table and original file names.
+
+    Files themselves are moved into the store by `python -m backend.cli
+    migrate-blobs`; until then the old paths keep working.
+    """
+    for stmt in BLOB_SCHEMA:
+        conn.execute(stmt)
+    conn.execute("ALTER TABLE submissions ADD COLUMN file_names TEXT")
+    rows = conn.execute("SELECT id, file_paths FROM submissions WHERE file_paths IS NOT NULL AND file_paths != '[]'").fetchall()
+    conn.executemany("UPDATE submissions SET file_names=? WHERE id=?",
+                     [(json.dumps([os.path.basename(p) for p in json.loads(r["file_paths"])]), r["id"]) for r in rows])
+
+def _migrate_add_ingest_jobs(conn):
+    """Queue for background analysis of RECEIVED submissions (see ingest.py)."""
+    for stmt in INGEST_SCHEMA:
+        conn.execute(stmt)
+
+def _migrate_add_rate_buckets(conn):
+    """Token buckets shared by every worker (see admission.py)."""
+    for stmt in RATE_LIMIT_SCHEMA:
+        conn.execute(stmt)
+
+def _migrate_add_image_hashes(conn):
+    """Perceptual-hash index for images (see images.py).
+
+    Images uploaded before it exist are indexed by `python -m backend.cli
+    backfill-images`.
+    """
+    for stmt in IMAGE_SCHEMA:
+        conn.execute(stmt)
+
+def _migrate_add_extraction_cache_bytes(conn):
+    """Trigger-maintained byte total for extraction_cache, so writes don't SUM the table."""
+    for stmt in EXTRACTION_CACHE_SCHEMA:
+        conn.execute(stmt)
+    conn.execute("""INSERT OR REPLACE INTO stats_counters (key, value)
+                    SELECT 'extraction_cache:bytes', COALESCE(SUM(size), 0) FROM extraction_cache""")
+
+def _migrate_add_hf_job_items(conn):
+    """One hf_job_items row per submission in a push job (bulk jobs used to comma-join them)."""
+    for stmt in hf_queue.HF_JOB_ITEMS_SCHEMA:
+        conn.execute(stmt)
+    rows = conn.execute("SELECT id, submission_id FROM hf_jobs").fetchall()
+    conn.executemany("INSERT OR IGNORE INTO hf_job_items (job_id, submission_id) VALUES (?,?)",
+                     [(r["id"], sid) for r in rows for sid in r["submission_id"].split(",") if sid])
+    conn.execute("UPDATE hf_jobs SET submission_id='' WHERE submission_id LIKE '%,%'")
+    conn.execute("DROP INDEX IF EXISTS idx_hf_jobs_submission")
+
+def _migrate_add_export_outbox(conn):
+    """Approved export lines waiting to be appended to the shards (see export_outbox.py)."""
+    for stmt in EXPORT_OUTBOX_SCHEMA:
+        conn.execute(stmt)
+
+MIGRATIONS = [
+    _migrate_backfill_content_hashes,
+    _migrate_add_duplicate_matches,
+    _migrate_add_pii_matches,
+    _migrate_seed_profanity_words,
+    _migrate_add_fulltext_search,
+    _migrate_add_stats_counters,
+    _migrate_add_hf_jobs,
+    _migrate_add_storage_usage,
+    _migrate_add_blob_store,
+    _migrate_add_ingest_jobs,
+    _migrate_add_rate_buckets,
+    _migrate_add_image_hashes,
+    _migrate_add_extraction_cache_bytes,
+    _migrate_add_hf_job_items,
+    _migrate_add_export_outbox,
+]
+
+def run_migrations(conn):
+    # BEGIN IMMEDIATE serializes gunicorn workers starting at the same time
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step(conn)
+            conn.execute(f"PRAGMA user_version={i}")
+            print(f"[DB] Applied migration {i}: {step.__name__}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
 init_db()
+extractor.cache = ExtractionCache(get_db)
+profanity_filter = ProfanityFilter(get_db)
+profanity_filter.refresh()
 
 # Ensure storage directories exist (important for Render persistent disk)
-for _d in [STORAGE / "pending", STORAGE / "approved", STORAGE / "rejected", EXPORTS]:
+for _d in [STORAGE / "blobs", EXPORTS]:
     _d.mkdir(parents=True, exist_ok=True)
 
+export_writer = ExportWriter(EXPORTS)
+export_outbox = ExportOutbox(get_db, export_writer)
+thumbnail_store = ThumbnailStore(STORAGE / "thumbnails")
+blob_store = BlobStore(STORAGE / "blobs", get_db, derived=[thumbnail_store.path_for])
+image_processor = ImageProcessor(extractor, blob_store, thumbnail_store) if PILLOW_AVAILABLE else None
+metrics.REGISTRY.configure(DATA_DIR / ".metrics")
+
 # ── HF helpers ──────────────────────────────────────────────────────────
 def get_hf_settings() -> dict:
     """Return HF settings as a dict."""
@@ -141,73 +408,47 @@ def get_hf_settings() -> dict:
     return {r["key"]: r["value"] for r in rows}
 
 
-def push_to_hf(category: str, file_paths: list, submission_id: str, language: str):
-    """Push files to the appropriate HF dataset repo based on category."""
-    try:
-        settings = get_hf_settings()
-        token = settings.get("hf_token", "")
-        repo_key = f"repo_{category}"
-        repo_id = settings.get(repo_key, "")
-        if not token or not repo_id:
-            print(f"[HF] Skipping push — token or repo not configured for {category}")
-            return
-        api = HfApi(token=token)
-        # Create repo if it doesn't exist
-        try:
-            api.create_repo(repo_id, repo_type="dataset", exist_ok=True, private=False)
-        except Exception as e:
-            print(f"[HF] Repo creation note: {e}")
-        # Upload each file
-        for fp in file_paths:
-            p = Path(fp)
-            if p.exists():
-                path_in_repo = f"{language}/{submission_id}/{p.name}"
-                api.upload_file(
-                    path_or_fileobj=str(p),
-                    path_in_repo=path_in_repo,
-                    repo_id=repo_id,
-                    repo_type="dataset",
-                )
-                print(f"[HF] Uploaded {p.name} → {repo_id}/{path_in_repo}")
-        print(f"[HF] Push complete for submission {submission_id} → {repo_id}")
-    except Exception as e:
-        print(f"[HF] Push failed: {e}")
+hf_jobs = hf_queue.HFPushQueue(get_db, get_hf_settings, api_factory=HfApi if HF_AVAILABLE else None)
+
+ingest_pipeline = IngestPipeline(get_db, extractor, profanity_filter, image_processor=image_processor)
+
+# ── Admission control (body size, upload slots, per-IP rate limits) ────
+rate_limiter = RateLimiter(get_db)
+app.add_middleware(AdmissionControl, limiter=rate_limiter, slots=UploadSlots(DATA_DIR / ".upload-slots"), routes={
+    "POST /api/submit":   {"max_body": SUBMIT_MAX_BODY, "rate": RATE_SUBMIT_IP, "slot": True},
+    "POST /api/feedback": {"max_body": FEEDBACK_MAX_BODY, "rate": RATE_FEEDBACK_IP},
+})
+# Added last so it is outermost: admission refusals (411/413/429/503) get CORS headers too
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_credentials=True,
+                   allow_methods=["*"], allow_headers=["*"])
+
+async def rate_limited(key: str, limit) -> None:
+    """429 with Retry-After once key's bucket is empty."""
+    wait = await asyncio.to_thread(rate_limiter.take, key, limit)
+    if wait:
+        metrics.inc("admission_rejected_total", route=key.split(":", 1)[0], reason="rate_email")
+        raise HTTPException(429, "Too many requests for this email address, please try again later",
+                            headers={"Retry-After": str(int(wait + 0.999))})
 
 
 # ── Temporary storage cleanup (7-day auto-delete) ──────────────────────
-def cleanup_old_pending():
-    """Background thread: delete PENDING submissions older than TEMP_RETENTION_DAYS."""
-    while True:
-        try:
-            cutoff = (datetime.utcnow() - timedelta(days=TEMP_RETENTION_DAYS)).isoformat()
-            conn = get_db()
-            old = conn.execute(
-                "SELECT id FROM submissions WHERE status='PENDING' AND created_at < ?",
-                (cutoff,)
-            ).fetchall()
-            for row in old:
-                sid = row["id"]
-                # Remove files
-                sub_dir = STORAGE / "pending"
-                if sub_dir.exists():
-                    for lang_dir in sub_dir.iterdir():
-                        target = lang_dir / sid
-                        if target.exists():
-                            shutil.rmtree(target)
-                conn.execute("DELETE FROM submissions WHERE id=?", (sid,))
-                conn.execute(
-                    "INSERT INTO audit_log (submission_id, action, admin_user, reason, notes, timestamp) VALUES (?, 'AUTO_DELETED', 'system', '7-day retention expired', '', ?)",
-                    (sid, datetime.utcnow().isoformat())
-                )
-                print(f"[CLEANUP] Deleted expired submission {sid}")
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"[CLEANUP] Error: {e}")
-        time.sleep(6 * 3600)  # Run every 6 hours
+retention_engine = RetentionEngine(get_db, STORAGE, blob_store, DATA_DIR / ".retention.lock", TEMP_RETENTION_DAYS)
+
+storage_reconciler = StorageReconciler(get_db, STORAGE, blob_store, DATA_DIR / ".storage-reconcile.lock")
 
-_cleanup_thread = threading.Thread(target=cleanup_old_pending, daemon=True)
-_cleanup_thread.start()
+# Background workers start with the server, not on import, so the CLI and
+# scripts that only need the database and extractor don't run them
+@app.on_event("startup")
+def _start_workers():
+    export_outbox.start()
+    hf_jobs.start()
+    ingest_pipeline.start()
+    retention_engine.start()
+    storage_reconciler.start()
+
+@app.on_event("shutdown")
+def _shutdown_extractor():
+    extractor.shutdown()
 
 
 # ── Auth helpers ────────────────────────────────────────────────────────
@@ -227,64 +468,60 @@ def verify_token(request: Request):
     except JWTError:
         raise HTTPException(401, "Invalid token")
 
-# ── PII / Profanity detection (lightweight) ─────────────────────────────
-PII_PATTERNS = [
-    r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',           # phone
-    r'\b\d{9,12}\b',                               # long numbers (ID-like)
-    r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',  # email
-    r'\b\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\b',   # IP
-    r'\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b', # credit card
-]
-
-def check_pii(text: str) -> List[str]:
-    flags = []
-    for pat in PII_PATTERNS:
-        if re.search(pat, text or ""):
-            flags.append(pat)
-    return flags
+# ── Upload streaming ───────────────────────────────────────────────────
+class UploadTooLarge(Exception):
+    pass
 
-def check_profanity(text: str) -> bool:
-    try:
-        from better_profanity import profanity
-        return profanity.contains_profanity(text or "")
-    except:
-        return False
+@metrics.timed("upload")
+async def stream_upload_to_disk(upload: UploadFile, dest: Path, max_bytes: int = MAX_FILE_SIZE):
+    """Copy an upload to dest in UPLOAD_CHUNK_SIZE pieces, hashing as we go.
 
-def extract_text_from_file(filepath: str) -> str:
-    ext = Path(filepath).suffix.lower()
+    Returns (sha256_hex, size). Raises UploadTooLarge as soon as max_bytes is
+    passed; the partially written file is removed.
+    """
+    sha = hashlib.sha256()
+    size = 0
     try:
-        if ext == ".txt":
-            return Path(filepath).read_text(errors="ignore")[:5000]
-        elif ext == ".csv":
-            return Path(filepath).read_text(errors="ignore")[:5000]
-        elif ext == ".pdf":
-            from PyPDF2 import PdfReader
-            reader = PdfReader(filepath)
-            text = ""
-            for page in reader.pages[:5]:
-                text += page.extract_text() or ""
-            return text[:5000]
-        elif ext == ".docx":
-            from docx import Document
-            doc = Document(filepath)
-            return "\n".join([p.text for p in doc.paragraphs])[:5000]
-        elif ext in {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}:
-            return "[Image file]"
-    except:
-        pass
-    return ""
+        async with aiofiles.open(dest, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(upload.filename)
+                sha.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        dest.unlink(missing_ok=True)
+        raise
+    finally:
+        await upload.close()
+    return sha.hexdigest(), size
 
 # ── Routes: Pages ──────────────────────────────────────────────────────
-@app.get("/", response_class=HTMLResponse)
-async def home():
-    return FileResponse(str(BASE_DIR / "frontend" / "index.html"))
+def serve_asset(request: Request, path: str) -> Response:
+    asset = assets.get(path)
+    if asset is None:
+        raise HTTPException(404, "Not found")
+    status, headers, body = assets.respond(asset, request.headers.get("accept-encoding", ""),
+                                           request.headers.get("if-none-match", ""))
+    return Response(body, status_code=status, headers=headers)
+
+@app.api_route("/", methods=["GET", "HEAD"], response_class=HTMLResponse)
+async def home(request: Request):
+    return serve_asset(request, "index.html")
+
+@app.api_route("/admin", methods=["GET", "HEAD"], response_class=HTMLResponse)
+async def admin_page(request: Request):
+    return serve_asset(request, "admin.html")
 
-@app.get("/admin", response_class=HTMLResponse)
-async def admin_page():
-    return FileResponse(str(BASE_DIR / "frontend" / "admin.html"))
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def static_file(path: str, request: Request):
+    return serve_asset(request, path)
 
 # ── Routes: Public ─────────────────────────────────────────────────────
-@app.post("/api/submit")
+@app.post("/api/submit", status_code=202)
 async def submit_contribution(
     language: str = Form(...),
     contributor_name: str = Form(...),
@@ -293,6 +530,7 @@ async def submit_contribution(
     consent: str = Form(...),
     files: List[UploadFile] = File(default=[])
 ):
+    """Store the upload and queue it for analysis (see ingest.py); poll /api/submit/{sid}/status."""
     if consent != "true":
         raise HTTPException(400, "Consent is required")
     if language not in ("tamil", "sinhala", "english"):
@@ -302,94 +540,110 @@ async def submit_contribution(
     if len(files) > MAX_FILES:
         raise HTTPException(400, f"Max {MAX_FILES} files allowed")
 
+    # Validate every file type before anything touches the disk
+    for f in files:
+        ext = Path(f.filename).suffix.lower()
+        if ext not in ALLOWED_EXT:
+            raise HTTPException(400, f"File type {ext} not allowed")
+    await rate_limited(f"/api/submit:email:{contributor_email.strip().lower()}", RATE_SUBMIT_EMAIL)
+
+    conn = get_db()
+    try:
+        backlog = ingest_pipeline.backlog(conn)
+    finally:
+        conn.close()
+    if backlog >= INGEST_MAX_BACKLOG:
+        raise HTTPException(503, "Server is busy processing uploads, please retry shortly",
+                            headers={"Retry-After": "30"})
+
     sid = f"MZH-{uuid.uuid4().hex[:8].upper()}"
-    folder = STORAGE / "pending" / language / sid
-    folder.mkdir(parents=True, exist_ok=True)
 
     saved_files = []
+    file_names = []
     file_hashes = []
-    all_text = text_content or ""
+    blob_keys = []
+    storage_bytes = 0
 
+    # Blobs stored here but never referenced (the request fails below) are
+    # reclaimed by the blob garbage collector after its grace period
     for f in files:
-        ext = Path(f.filename).suffix.lower()
-        if ext not in ALLOWED_EXT:
-            raise HTTPException(400, f"File type {ext} not allowed")
-        data = await f.read()
-        if len(data) > MAX_FILE_SIZE:
-            raise HTTPException(400, f"File {f.filename} exceeds 20MB")
-        fpath = folder / f.filename
-        fpath.write_bytes(data)
+        tmp = blob_store.temp_path()
+        try:
+            digest, size = await stream_upload_to_disk(f, tmp)
+        except UploadTooLarge:
+            raise HTTPException(413, f"File {f.filename} exceeds {MAX_FILE_SIZE // (1024 * 1024)}MB")
+        key, fpath = await asyncio.to_thread(blob_store.put, tmp, digest, f.filename)
         saved_files.append(str(fpath))
-        file_hashes.append(hashlib.sha256(data).hexdigest())
-        extracted = extract_text_from_file(str(fpath))
-        all_text += "\n" + extracted
-
-    pii = check_pii(all_text)
-    prof = check_profanity(all_text)
+        file_names.append(os.path.basename(f.filename))
+        file_hashes.append(digest)
+        blob_keys.append(key)
+        storage_bytes += size
 
-    # Duplicate check
+    # Flags, extracted text and duplicate matches are filled in by the ingest pipeline
     conn = get_db()
-    dup = 0
-    if all_text.strip():
-        text_hash = hashlib.sha256(all_text.strip().encode()).hexdigest()
-        cur = conn.execute("SELECT COUNT(*) as c FROM submissions WHERE file_hashes LIKE ?", (f"%{text_hash}%",))
-        if cur.fetchone()["c"] > 0:
-            dup = 1
-
-    # Auto-detect data category
-    detected_category = "raw_text"
-    if files:
-        exts = [Path(f.filename).suffix.lower() for f in files]
-        if any(e in (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp") for e in exts):
-            detected_category = "images"
-        elif any(e == ".pdf" for e in exts):
-            detected_category = "pdf"
-        elif any(e in (".zip", ".tar", ".gz") for e in exts):
-            detected_category = "zip"
-
-    conn.execute("""INSERT INTO submissions
-        (id, language, status, contributor_name, contributor_email, text_content,
-         file_paths, file_hashes, metadata, pii_flags, profanity_flags, duplicate_flag, created_at, data_category)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-        (sid, language, "PENDING", contributor_name, contributor_email,
-         text_content, json.dumps(saved_files), json.dumps(file_hashes),
-         json.dumps({"file_count": len(files), "text_length": len(all_text)}),
-         json.dumps(pii), json.dumps(prof), dup, datetime.utcnow().isoformat(), detected_category))
-    conn.commit()
-    conn.close()
+    try:
+        with metrics.stage("db_insert"):
+            conn.execute("""INSERT INTO submissions
+                (id, language, status, contributor_name, contributor_email, text_content,
+                 file_paths, file_names, file_hashes, metadata, created_at, data_category, storage_bytes)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+                (sid, language, "RECEIVED", contributor_name, contributor_email, text_content,
+                 json.dumps(saved_files), json.dumps(file_names), json.dumps(file_hashes),
+                 json.dumps({"file_count": len(files)}), datetime.utcnow().isoformat(),
+                 detect_category(file_names), storage_bytes))
+            blob_store.incref(conn, blob_keys)
+            ingest_pipeline.enqueue(conn, sid)
+            conn.commit()
+    finally:
+        conn.close()
+    ingest_pipeline.wake()
+
+    return {"status": "received", "submission_id": sid, "status_url": f"/api/submit/{sid}/status",
+            "message": "Thank you for your contribution!"}
 
-    return {"status": "success", "submission_id": sid, "message": "Thank you for your contribution!"}
+@app.get("/api/submit/{sid}/status")
+async def submission_status(sid: str, conn=Depends(db_read)):
+    """Where a submission is: received (analysis queued/running/failed), pending review, approved, rejected."""
+    if not SUBMISSION_ID_RE.match(sid):
+        raise HTTPException(404, "Not found")
+    result = ingest_pipeline.status(conn, sid.upper())
+    if result is None:
+        raise HTTPException(404, "Not found")
+    return result
 
 @app.get("/api/public-stats")
-async def public_stats():
-    conn = get_db()
-    total = conn.execute("SELECT COUNT(*) as c FROM submissions WHERE status='APPROVED'").fetchone()["c"]
-    contributors = conn.execute("SELECT COUNT(DISTINCT contributor_email) as c FROM submissions").fetchone()["c"]
+async def public_stats(conn=Depends(db_read)):
+    # Also Render's health check: reads a few counter rows, never scans submissions
+    stats = counters.read_counters(conn)
+    total = stats.get("status:APPROVED", 0)
+    contributors = stats.get("contributors", 0)
     # Get display overrides
-    c_display = conn.execute("SELECT value FROM stats_override WHERE key='contributors_display'").fetchone()
-    d_display = conn.execute("SELECT value FROM stats_override WHERE key='datasets_display'").fetchone()
-    conn.close()
+    overrides = {r["key"]: r["value"] for r in conn.execute("SELECT key, value FROM stats_override")}
     return {
-        "contributors_display": c_display["value"] if c_display else f"{contributors}+",
-        "datasets_display": d_display["value"] if d_display else f"{total}+",
+        "contributors_display": overrides.get("contributors_display", f"{contributors}+"),
+        "datasets_display": overrides.get("datasets_display", f"{total}+"),
         "total_approved": total,
         "total_contributors": contributors
     }
 
 # ── Routes: Feedback ───────────────────────────────────────────────────
 @app.post("/api/feedback")
-async def submit_feedback(request: Request):
+async def submit_feedback(request: Request, conn=Depends(db_conn)):
     data = await request.json()
-    name = data.get("name", "")
-    email = data.get("email", "")
-    message = data["message"]
+    name = str(data.get("name", ""))[:200]
+    email = str(data.get("email", ""))[:320]
+    message = data.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise HTTPException(400, "Message is required")
+    if len(message) > FEEDBACK_MAX_MESSAGE:
+        raise HTTPException(413, f"Message is longer than {FEEDBACK_MAX_MESSAGE} characters")
+    if email:
+        await rate_limited(f"/api/feedback:email:{email.strip().lower()}", RATE_FEEDBACK_EMAIL)
 
     # Save to database
-    conn = get_db()
     conn.execute("INSERT INTO feedbacks (name, email, message, created_at) VALUES (?,?,?,?)",
                  (name, email, message, datetime.utcnow().isoformat()))
     conn.commit()
-    conn.close()
 
     # Email now handled via EmailJS on frontend
 
@@ -409,22 +663,90 @@ async def admin_login(request: Request):
 
 # ── Routes: Admin Dashboard ────────────────────────────────────────────
 @app.get("/api/admin/stats")
-async def admin_stats(user: str = Depends(verify_token)):
-    conn = get_db()
+async def admin_stats(user: str = Depends(verify_token), conn=Depends(db_read)):
+    counts = counters.read_counters(conn)
     stats = {}
     for status in ["PENDING", "APPROVED", "REJECTED"]:
-        row = conn.execute("SELECT COUNT(*) as c FROM submissions WHERE status=?", (status,)).fetchone()
-        stats[status.lower()] = row["c"]
+        stats[status.lower()] = counts.get(f"status:{status}", 0)
+    stats["analyzing"] = counts.get("status:RECEIVED", 0)
     for lang in ["tamil", "sinhala", "english"]:
-        row = conn.execute("SELECT COUNT(*) as c FROM submissions WHERE language=?", (lang,)).fetchone()
-        stats[f"lang_{lang}"] = row["c"]
+        stats[f"lang_{lang}"] = counts.get(f"lang:{lang}", 0)
     stats["total"] = stats["pending"] + stats["approved"] + stats["rejected"]
-    # Feedbacks count
-    row = conn.execute("SELECT COUNT(*) as c FROM feedbacks").fetchone()
-    stats["feedbacks"] = row["c"]
-    conn.close()
+    stats["feedbacks"] = counts.get("feedbacks", 0)
     return stats
 
+# Columns the queue listing needs; large ones (text_content, match JSON) are
+# left to the detail endpoint.
+SUBMISSION_LIST_COLUMNS = ("id, language, status, contributor_name, contributor_email, data_category, "
+                           "duplicate_flag, pii_flags, created_at, updated_at")
+
+SUBMISSION_ID_RE = re.compile(r"^MZH-[0-9A-F]{8}$", re.IGNORECASE)
+
+def encode_cursor(created_at: str, sid: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{sid}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, sid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return created_at, sid
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Invalid cursor")
+
+def submission_list_sql(status=None, language=None, search=None, date_from=None, date_to=None,
+                        page: int = 1, limit: int = 20, cursor: Optional[str] = None):
+    """SQL for admin_submissions: (count_sql, count_params, query, params).
+
+    count_sql is None when the total can be read from the status counters
+    (no filter other than status), so paging doesn't count the table.
+    """
+    # RECEIVED rows are still being analysed and have no flags yet
+    where = " WHERE s.status != 'RECEIVED'"
+    params = []
+    if status:
+        where += " AND s.status=?"
+        params.append(status)
+    if language:
+        where += " AND s.language=?"
+        params.append(language)
+    if date_from:
+        where += " AND s.created_at >= ?"
+        params.append(date_from)
+    if date_to:
+        where += " AND s.created_at <= ?"
+        params.append(date_to + "T23:59:59")
+
+    columns = ", ".join(f"s.{c.strip()}" for c in SUBMISSION_LIST_COLUMNS.split(","))
+    source = " FROM submissions s"
+    order = " ORDER BY s.created_at DESC, s.id DESC"
+    if search:
+        term = search.strip()
+        if SUBMISSION_ID_RE.match(term):
+            where += " AND s.id=?"
+            params.append(term.upper())
+        else:
+            source = " FROM submissions_fts JOIN submissions s ON s.rowid = submissions_fts.rowid"
+            where += " AND submissions_fts MATCH ?"
+            params.append(fts.build_fts_query(term) or '""')
+            columns += f", {fts.snippet_sql()} AS snippet"
+            if cursor is None:
+                order = " ORDER BY bm25(submissions_fts), s.created_at DESC"
+
+    counted = language or date_from or date_to or search
+    count_sql = "SELECT COUNT(*) as c" + source + where if counted else None
+    count_params = list(params)
+
+    query = f"SELECT {columns}" + source + where
+    if cursor is not None:
+        if cursor:
+            query += " AND (s.created_at, s.id) < (?, ?)"
+            params.extend(decode_cursor(cursor))
+        query += order + " LIMIT ?"
+        params.append(limit)
+    else:
+        query += order + " LIMIT ? OFFSET ?"
+        params.extend([limit, (max(page, 1) - 1) * limit])
+    return count_sql, count_params, query, params
+
 @app.get("/api/admin/submissions")
 async def admin_submissions(
     user: str = Depends(verify_token),
@@ -434,66 +756,119 @@ async def admin_submissions(
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
     page: int = Query(1),
-    limit: int = Query(20)
+    limit: int = Query(20),
+    cursor: Optional[str] = Query(None),
+    conn=Depends(db_read)
 ):
-    conn = get_db()
-    query = "SELECT * FROM submissions WHERE 1=1"
-    params = []
-    if status:
-        query += " AND status=?"
-        params.append(status)
-    if language:
-        query += " AND language=?"
-        params.append(language)
-    if search:
-        query += " AND (contributor_name LIKE ? OR text_content LIKE ? OR id LIKE ?)"
-        s = f"%{search}%"
-        params.extend([s, s, s])
-    if date_from:
-        query += " AND created_at >= ?"
-        params.append(date_from)
-    if date_to:
-        query += " AND created_at <= ?"
-        params.append(date_to + "T23:59:59")
-    
-    # Count
-    count_q = query.replace("SELECT *", "SELECT COUNT(*) as c")
-    total = conn.execute(count_q, params).fetchone()["c"]
-    
-    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, (page - 1) * limit])
+    """List submissions, newest first, or best match first when searching.
+
+    Page mode (page/limit) is kept for the admin UI. Passing cursor (or
+    cursor="" to start) switches to keyset pagination: each response carries
+    next_cursor, and deep pages cost the same as the first one.
+
+    search matches a submission ID exactly, or runs against the FTS5 index
+    (name, typed text, extracted file text); FTS results carry a highlighted
+    snippet and, in page mode, are ranked by bm25.
+    """
+    limit = max(1, min(limit, 200))
+    count_sql, count_params, query, params = submission_list_sql(
+        status=status, language=language, search=search, date_from=date_from, date_to=date_to,
+        page=page, limit=limit, cursor=cursor)
+    if count_sql is None:
+        counts = counters.read_counters(conn)
+        total = sum(v for k, v in counts.items()
+                    if k.startswith("status:") and k != "status:RECEIVED" and (not status or k == "status:" + status))
+    else:
+        total = conn.execute(count_sql, count_params).fetchone()["c"]
     rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return {"total": total, "page": page, "submissions": [dict(r) for r in rows]}
+
+    result = {"total": total, "page": page, "submissions": [dict(r) for r in rows]}
+    if cursor is not None:
+        last = rows[-1] if len(rows) == limit else None
+        result["next_cursor"] = encode_cursor(last["created_at"], last["id"]) if last else None
+    return result
 
 @app.get("/api/admin/submission/{sid}")
-async def admin_submission_detail(sid: str, user: str = Depends(verify_token)):
-    conn = get_db()
+async def admin_submission_detail(sid: str, user: str = Depends(verify_token), conn=Depends(db_read)):
     row = conn.execute("SELECT * FROM submissions WHERE id=?", (sid,)).fetchone()
     if not row:
         raise HTTPException(404, "Not found")
     # Get audit log
     logs = conn.execute("SELECT * FROM audit_log WHERE submission_id=? ORDER BY timestamp DESC", (sid,)).fetchall()
-    conn.close()
     result = dict(row)
     result["audit_log"] = [dict(l) for l in logs]
+    result["hf_jobs"] = hf_jobs.jobs_for(conn, sid)
     
-    # Extract text preview from files
+    # Extract text preview from files; images get a thumbnail instead
     file_paths = json.loads(result.get("file_paths") or "[]")
+    file_hashes = json.loads(result.get("file_hashes") or "[]")
+    file_names = file_names_of(result)
+    image_info = {m["file"]: m for m in json.loads(result.get("metadata") or "{}").get("images", [])}
     previews = []
-    for fp in file_paths:
+    for i, fp in enumerate(file_paths):
         if os.path.exists(fp):
-            previews.append({"file": os.path.basename(fp), "preview": extract_text_from_file(fp)[:1000]})
+            digest = file_hashes[i] if i < len(file_hashes) else None
+            if is_image(file_names[i]):
+                previews.append({"file": file_names[i], "image": image_info.get(file_names[i], {}),
+                                 "thumbnail": f"/api/admin/submission/{sid}/files/{i}/thumbnail"
+                                              if image_processor else None})
+                continue
+            try:
+                preview = (await extractor.extract_text(fp, digest))[:1000]
+            except ExtractionQueueFull:
+                preview = "[Preview unavailable — extractor busy, reload shortly]"
+            previews.append({"file": file_names[i], "preview": preview})
     result["file_previews"] = previews
     return result
 
+@app.get("/api/admin/submission/{sid}/files/{index}/thumbnail")
+async def admin_file_thumbnail(sid: str, index: int, request: Request, user: str = Depends(verify_token),
+                               conn=Depends(db_read)):
+    """WebP thumbnail of an uploaded image, cached by content hash (so private, but never stale)."""
+    row = conn.execute("SELECT file_paths, file_names, file_hashes FROM submissions WHERE id=?", (sid,)).fetchone()
+    if not row or image_processor is None:
+        raise HTTPException(404, "Not found")
+    paths, hashes = json.loads(row["file_paths"] or "[]"), json.loads(row["file_hashes"] or "[]")
+    if not 0 <= index < min(len(paths), len(hashes)) or not is_image(file_names_of(dict(row))[index]):
+        raise HTTPException(404, "Not found")
+    etag = f'"{hashes[index][:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    try:
+        thumb = await image_processor.thumbnail(paths[index], hashes[index])
+    except ExtractionQueueFull:
+        raise HTTPException(503, "Image worker busy, reload shortly", headers={"Retry-After": "5"})
+    if thumb is None:
+        raise HTTPException(404, "No thumbnail for this file")
+    return Response(await asyncio.to_thread(thumb.read_bytes), media_type="image/webp", headers=headers)
+
+def file_names_of(sub: dict) -> list:
+    """Original upload names, in file_paths order (blob paths don't carry them)."""
+    paths = json.loads(sub.get("file_paths") or "[]")
+    names = json.loads(sub.get("file_names") or "[]")
+    return [names[i] if i < len(names) else os.path.basename(fp) for i, fp in enumerate(paths)]
+
+def hf_push_files(sub: dict, category: str) -> list:
+    """Files to push for an approved submission; text-only raw_text goes up as <sid>.txt."""
+    files, seen = [], set()
+    for i, (fp, name) in enumerate(zip(json.loads(sub.get("file_paths") or "[]"), file_names_of(sub))):
+        if name in seen:
+            name = f"{i}_{name}"  # two uploads with the same name must not overwrite each other
+        seen.add(name)
+        files.append({"name": name, "path": fp})
+    if not files and category == "raw_text" and sub.get("text_content"):
+        files = [{"name": f"{sub['id']}.txt", "content": sub["text_content"]}]
+    return files
+
 @app.post("/api/admin/submission/{sid}/approve")
-async def approve_submission(sid: str, request: Request, user: str = Depends(verify_token)):
+async def approve_submission(sid: str, request: Request, user: str = Depends(verify_token), conn=Depends(db_conn)):
     data = await request.json() if request.headers.get("content-type") == "application/json" else {}
-    conn = get_db()
     row = conn.execute("SELECT * FROM submissions WHERE id=?", (sid,)).fetchone()
     if not row:
         raise HTTPException(404, "Not found")
+    if row["status"] == "RECEIVED":
+        raise HTTPException(409, "Submission is still being analysed")
     
     sub = dict(row)
     lang = sub["language"]
@@ -501,133 +876,203 @@ async def approve_submission(sid: str, request: Request, user: str = Depends(ver
     # Admin can override the data category
     category = data.get("data_category") or sub.get("data_category") or "raw_text"
     
-    # Move files to approved
     file_paths = json.loads(sub.get("file_paths") or "[]")
-    new_paths = []
-    approved_dir = STORAGE / "approved" / lang / sid
-    approved_dir.mkdir(parents=True, exist_ok=True)
-    for fp in file_paths:
-        if os.path.exists(fp):
-            dest = approved_dir / os.path.basename(fp)
-            shutil.move(fp, str(dest))
-            new_paths.append(str(dest))
-    
-    # Clean up pending folder
-    pending_dir = STORAGE / "pending" / lang / sid
-    if pending_dir.exists():
-        shutil.rmtree(str(pending_dir), ignore_errors=True)
-    
-    # Update DB
-    conn.execute("UPDATE submissions SET status='APPROVED', data_category=?, file_paths=?, updated_at=? WHERE id=?",
-                 (category, json.dumps(new_paths), datetime.utcnow().isoformat(), sid))
+    file_hashes = json.loads(sub.get("file_hashes") or "[]")
+
+    # Extract export text up front so a busy extractor fails before anything changes
+    export_text = sub.get("text_content") or ""
+    for i, fp in enumerate(file_paths):
+        if not os.path.exists(fp):
+            continue
+        digest = file_hashes[i] if i < len(file_hashes) else None
+        try:
+            with metrics.stage("extract"):
+                txt = await extractor.extract_text(fp, digest)
+        except ExtractionQueueFull:
+            raise HTTPException(503, "Extractor busy, please retry shortly", headers={"Retry-After": "10"})
+        if txt and txt != "[Image file]":
+            export_text += "\n" + txt
+
+    # Update DB (files stay where they are in the blob store; status is metadata only)
+    conn.execute("UPDATE submissions SET status='APPROVED', data_category=?, updated_at=? WHERE id=?",
+                 (category, datetime.utcnow().isoformat(), sid))
     
     # Audit
     conn.execute("INSERT INTO audit_log (submission_id, action, admin_user, reason, notes, timestamp) VALUES (?,?,?,?,?,?)",
                  (sid, "APPROVED", user, data.get("reason", ""), data.get("notes", ""), datetime.utcnow().isoformat()))
-    conn.commit()
-    
-    # Export to JSONL
-    export_file = EXPORTS / lang / f"{lang}_approved.jsonl"
-    export_file.parent.mkdir(parents=True, exist_ok=True)
-    entry = {
-        "id": sid,
-        "language": lang,
-        "text": sub.get("text_content") or "",
-        "source": "public_contribution",
-        "category": category,
-        "created_at": sub["created_at"]
-    }
-    # Also extract text from files
-    for fp in new_paths:
-        txt = extract_text_from_file(fp)
-        if txt and txt != "[Image file]":
-            entry["text"] += "\n" + txt
-    
-    with open(str(export_file), "a") as f:
-        f.write(json.dumps(entry) + "\n")
-    
-    # Push to Hugging Face in background
-    hf_pushed = False
-    all_push_files = new_paths[:]
-    # If category is raw_text and there's text but no files, create a text file
-    if category == "raw_text" and sub.get("text_content") and not new_paths:
-        txt_file = approved_dir / f"{sid}.txt"
-        txt_file.write_text(sub["text_content"])
-        all_push_files = [str(txt_file)]
-    
+
+    # The export line and the Hugging Face push commit with the approval, so a crash can't drop either
+    export_outbox.add(conn, lang, [bulk_export.export_entry(sub, export_text, category)])
+    hf_job_id = None
+    all_push_files = hf_push_files(sub, category)
     if all_push_files:
-        def _push():
-            push_to_hf(category, all_push_files, sid, lang)
-        t = threading.Thread(target=_push, daemon=True)
-        t.start()
-        hf_pushed = True
-    
-    conn.close()
-    return {"status": "approved", "submission_id": sid, "hf_push_initiated": hf_pushed}
+        hf_job_id = hf_jobs.enqueue(conn, category, all_push_files, sid, lang)
+    conn.commit()
+    metrics.inc("reviews_total", action="approve")
+
+    # Write the shard now; if this fails the outbox thread retries it
+    try:
+        await asyncio.to_thread(export_outbox.flush, lang)
+    except Exception as e:
+        print(f"[EXPORT] Outbox flush after approval failed: {e}")
+
+    return {"status": "approved", "submission_id": sid, "hf_push_initiated": hf_job_id is not None, "hf_job_id": hf_job_id}
 
 @app.post("/api/admin/submission/{sid}/reject")
-async def reject_submission(sid: str, request: Request, user: str = Depends(verify_token)):
+async def reject_submission(sid: str, request: Request, user: str = Depends(verify_token), conn=Depends(db_conn)):
     data = await request.json() if request.headers.get("content-type") == "application/json" else {}
     reason = data.get("reason", "Your submission did not meet our guidelines.")
     
-    conn = get_db()
     row = conn.execute("SELECT * FROM submissions WHERE id=?", (sid,)).fetchone()
     if not row:
         raise HTTPException(404, "Not found")
+    if row["status"] == "RECEIVED":
+        raise HTTPException(409, "Submission is still being analysed")
     
-    sub = dict(row)
-    lang = sub["language"]
-    
-    # Move files to rejected
-    file_paths = json.loads(sub.get("file_paths") or "[]")
-    new_paths = []
-    rejected_dir = STORAGE / "rejected" / lang / sid
-    rejected_dir.mkdir(parents=True, exist_ok=True)
-    for fp in file_paths:
-        if os.path.exists(fp):
-            dest = rejected_dir / os.path.basename(fp)
-            shutil.move(fp, str(dest))
-            new_paths.append(str(dest))
-    
-    # Clean up pending
-    pending_dir = STORAGE / "pending" / lang / sid
-    if pending_dir.exists():
-        shutil.rmtree(str(pending_dir), ignore_errors=True)
-    
-    conn.execute("UPDATE submissions SET status='REJECTED', file_paths=?, updated_at=? WHERE id=?",
-                 (json.dumps(new_paths), datetime.utcnow().isoformat(), sid))
+    conn.execute("UPDATE submissions SET status='REJECTED', updated_at=? WHERE id=?",
+                 (datetime.utcnow().isoformat(), sid))
     conn.execute("INSERT INTO audit_log (submission_id, action, admin_user, reason, notes, timestamp) VALUES (?,?,?,?,?,?)",
                  (sid, "REJECTED", user, reason, data.get("notes", ""), datetime.utcnow().isoformat()))
     conn.commit()
-    conn.close()
+    metrics.inc("reviews_total", action="reject")
     return {"status": "rejected", "submission_id": sid, "reason": reason}
 
+# ── Routes: Bulk review ─────────────────────────────────────────────────
+BULK_MAX_ITEMS = 200
+
+@app.post("/api/admin/submissions/bulk")
+async def bulk_review(request: Request, user: str = Depends(verify_token), conn=Depends(db_conn)):
+    """Approve or reject many submissions at once; returns a result per id."""
+    data = await request.json()
+    action = data.get("action")
+    if action not in ("approve", "reject"):
+        raise HTTPException(400, "action must be approve or reject")
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+        raise HTTPException(400, "ids must be a non-empty list of submission IDs")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > BULK_MAX_ITEMS:
+        raise HTTPException(400, f"At most {BULK_MAX_ITEMS} submissions per request")
+    status = "APPROVED" if action == "approve" else "REJECTED"
+    reason = data.get("reason", "" if action == "approve" else "Your submission did not meet our guidelines.")
+    notes = data.get("notes", "")
+
+    rows = {r["id"]: dict(r) for r in conn.execute(
+        f"SELECT * FROM submissions WHERE id IN ({','.join('?' * len(ids))})", ids)}
+    results = {}
+    subs = []
+    for sid in ids:
+        sub = rows.get(sid)
+        if sub is None:
+            results[sid] = {"id": sid, "status": "error", "error": "Not found"}
+        elif sub["status"] == "RECEIVED":
+            results[sid] = {"id": sid, "status": "error", "error": "Still being analysed"}
+        elif sub["status"] == status:
+            results[sid] = {"id": sid, "status": "skipped", "error": f"Already {status.lower()}"}
+        else:
+            subs.append(sub)
+    categories = {s["id"]: data.get("data_category") or s.get("data_category") or "raw_text" for s in subs}
+
+    # Export text first, so a busy extractor delays the batch before anything changes
+    texts = await bulk_export.export_texts(subs, extractor) if action == "approve" else [None] * len(subs)
+
+    now = datetime.utcnow().isoformat()
+    updates, audits, entries, pushes = [], [], {}, {}
+    for sub, text in zip(subs, texts):
+        sid = sub["id"]
+        category = categories[sid]
+        updates.append((status, category if action == "approve" else sub["data_category"], now, sid))
+        audits.append((sid, status, user, reason, notes, now))
+        if action == "approve":
+            entries.setdefault(sub["language"], []).append(bulk_export.export_entry(sub, text, category))
+            push_files = hf_push_files(sub, category)
+            if push_files:
+                pushes.setdefault(category, []).append((sid, sub["language"], push_files))
+        results[sid] = {"id": sid, "status": status.lower()}
+
+    # One transaction for every row, audit entry, export line and HF job; files never move
+    conn.executemany("UPDATE submissions SET status=?, data_category=?, updated_at=? WHERE id=?", updates)
+    conn.executemany("INSERT INTO audit_log (submission_id, action, admin_user, reason, notes, timestamp) VALUES (?,?,?,?,?,?)",
+                     audits)
+    for lang, lang_entries in entries.items():
+        export_outbox.add(conn, lang, lang_entries)
+    hf_job_ids = {category: hf_jobs.enqueue_batch(conn, category, items) for category, items in pushes.items()}
+    for category, items in pushes.items():
+        for sid, _, _ in items:
+            results[sid]["hf_job_id"] = hf_job_ids[category]
+    conn.commit()
+    if updates:
+        metrics.inc("reviews_total", len(updates), action=action)
+
+    for lang in entries:
+        try:
+            await asyncio.to_thread(export_outbox.flush, lang)
+        except Exception as e:
+            print(f"[EXPORT] Outbox flush after bulk approval failed: {e}")
+
+    ordered = [results[sid] for sid in ids]
+    return {
+        "action": action,
+        "processed": sum(1 for r in ordered if r["status"] == status.lower()),
+        "results": ordered,
+        "hf_job_ids": hf_job_ids,
+    }
+
 @app.get("/api/admin/audit-log")
-async def admin_audit_log(user: str = Depends(verify_token), page: int = Query(1), limit: int = Query(50)):
-    conn = get_db()
+async def admin_audit_log(user: str = Depends(verify_token), page: int = Query(1), limit: int = Query(50), conn=Depends(db_read)):
     total = conn.execute("SELECT COUNT(*) as c FROM audit_log").fetchone()["c"]
     rows = conn.execute("SELECT * FROM audit_log ORDER BY timestamp DESC LIMIT ? OFFSET ?",
                         (limit, (page - 1) * limit)).fetchall()
-    conn.close()
     return {"total": total, "logs": [dict(r) for r in rows]}
 
 @app.get("/api/admin/feedbacks")
-async def admin_feedbacks(user: str = Depends(verify_token)):
-    conn = get_db()
+async def admin_feedbacks(user: str = Depends(verify_token), conn=Depends(db_read)):
     rows = conn.execute("SELECT * FROM feedbacks ORDER BY created_at DESC").fetchall()
-    conn.close()
     return {"feedbacks": [dict(r) for r in rows]}
 
 @app.put("/api/admin/stats-override")
-async def update_stats_override(request: Request, user: str = Depends(verify_token)):
+async def update_stats_override(request: Request, user: str = Depends(verify_token), conn=Depends(db_conn)):
     data = await request.json()
-    conn = get_db()
     for key, val in data.items():
         conn.execute("INSERT OR REPLACE INTO stats_override (key, value) VALUES (?,?)", (key, str(val)))
     conn.commit()
-    conn.close()
     return {"status": "updated"}
 
+# ── Routes: Profanity wordlists ────────────────────────────────────────
+@app.get("/api/admin/profanity-words")
+async def list_profanity_words(user: str = Depends(verify_token), language: Optional[str] = Query(None), conn=Depends(db_read)):
+    if language:
+        rows = conn.execute("SELECT * FROM profanity_words WHERE language=? ORDER BY word", (language,)).fetchall()
+    else:
+        rows = conn.execute("SELECT * FROM profanity_words ORDER BY language, word").fetchall()
+    return {"words": [dict(r) for r in rows]}
+
+@app.post("/api/admin/profanity-words")
+async def add_profanity_words(request: Request, user: str = Depends(verify_token), conn=Depends(db_conn)):
+    data = await request.json()
+    language = data.get("language", "")
+    if language not in ("tamil", "sinhala", "english"):
+        raise HTTPException(400, "Invalid language")
+    words = [w.strip() for w in data.get("words", []) if w and w.strip()]
+    now = datetime.utcnow().isoformat()
+    conn.executemany("INSERT OR IGNORE INTO profanity_words (language, word, added_by, created_at) VALUES (?,?,?,?)",
+                     [(language, w, user, now) for w in words])
+    bump_profanity_version(conn)
+    conn.commit()
+    profanity_filter.refresh()
+    return {"status": "updated", "added": len(words)}
+
+@app.delete("/api/admin/profanity-words")
+async def remove_profanity_words(request: Request, user: str = Depends(verify_token), conn=Depends(db_conn)):
+    data = await request.json()
+    words = [w.strip() for w in data.get("words", []) if w and w.strip()]
+    conn.executemany("DELETE FROM profanity_words WHERE language=? AND word=?",
+                     [(data.get("language", ""), w) for w in words])
+    bump_profanity_version(conn)
+    conn.commit()
+    profanity_filter.refresh()
+    return {"status": "updated", "removed": len(words)}
+
 # ── Routes: HF Settings ────────────────────────────────────────────────
 @app.get("/api/admin/hf-settings")
 async def get_hf_settings_api(user: str = Depends(verify_token)):
@@ -640,17 +1085,39 @@ async def get_hf_settings_api(user: str = Depends(verify_token)):
     return settings
 
 @app.put("/api/admin/hf-settings")
-async def update_hf_settings_api(request: Request, user: str = Depends(verify_token)):
+async def update_hf_settings_api(request: Request, user: str = Depends(verify_token), conn=Depends(db_conn)):
     data = await request.json()
-    conn = get_db()
     allowed_keys = {"hf_token", "repo_raw_text", "repo_images", "repo_pdf", "repo_scan_pdf", "repo_zip"}
     for key, val in data.items():
         if key in allowed_keys:
             conn.execute("INSERT OR REPLACE INTO hf_settings (key, value) VALUES (?,?)", (key, str(val)))
     conn.commit()
-    conn.close()
     return {"status": "updated"}
 
+@app.get("/api/admin/hf-jobs")
+async def hf_jobs_status(status: str = "", limit: int = 50, user: str = Depends(verify_token), conn=Depends(db_read)):
+    """Queue depth per status plus the most recent push jobs."""
+    return hf_jobs.summary(conn, status=status or None, limit=max(1, min(limit, 200)))
+
+@app.post("/api/admin/hf-jobs/{job_id}/retry")
+async def retry_hf_job(job_id: int, user: str = Depends(verify_token), conn=Depends(db_conn)):
+    if not hf_jobs.retry(conn, job_id):
+        raise HTTPException(404, "No failed or skipped job with that id")
+    conn.commit()
+    return {"status": "queued", "job_id": job_id}
+
+@app.get("/api/admin/ingest-jobs")
+async def ingest_jobs_status(status: str = "", limit: int = 50, user: str = Depends(verify_token), conn=Depends(db_read)):
+    """Submissions waiting for (or failed in) background analysis."""
+    return ingest_pipeline.summary(conn, status=status or None, limit=max(1, min(limit, 200)))
+
+@app.post("/api/admin/ingest-jobs/{sid}/retry")
+async def retry_ingest_job(sid: str, user: str = Depends(verify_token), conn=Depends(db_conn)):
+    if not ingest_pipeline.retry(conn, sid):
+        raise HTTPException(404, "No failed analysis for that submission")
+    conn.commit()
+    return {"status": "queued", "submission_id": sid}
+
 @app.post("/api/admin/hf-test")
 async def test_hf_connection(user: str = Depends(verify_token)):
     """Test HF token validity."""
@@ -667,26 +1134,112 @@ async def test_hf_connection(user: str = Depends(verify_token)):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+# ── Routes: Exports ─────────────────────────────────────────────────────
+_export_rebuild_task = None
+
+def _iso_or_400(value: str, name: str) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(400, f"{name} must be an ISO date, e.g. 2025-01-31")
+    return value
+
+@app.get("/api/admin/export")
+async def download_export(format: str = "ndjson", language: str = "", category: str = "",
+                          since: str = "", until: str = "", user: str = Depends(verify_token)):
+    """Stream approved records regenerated from the database (NDJSON or Parquet)."""
+    filters = {"language": language or None, "category": category or None,
+               "since": _iso_or_400(since, "since"), "until": _iso_or_400(until, "until")}
+    name = "mozhii_" + "_".join(v for v in (language, category) if v) if (language or category) else "mozhii_export"
+    if format == "parquet":
+        if not bulk_export.PARQUET_AVAILABLE:
+            raise HTTPException(400, "Parquet export requires pyarrow")
+        return StreamingResponse(bulk_export.stream_parquet(db_read_pool.acquire, extractor, **filters),
+                                 media_type="application/vnd.apache.parquet",
+                                 headers={"Content-Disposition": f'attachment; filename="{name}.parquet"'})
+    if format != "ndjson":
+        raise HTTPException(400, "format must be ndjson or parquet")
+    return StreamingResponse(bulk_export.stream_ndjson(db_read_pool.acquire, extractor, **filters),
+                             media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="{name}.jsonl"'})
+
+def _set_rebuild_status(status: dict):
+    conn = get_db()
+    try:
+        conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('export_rebuild', ?)", (json.dumps(status),))
+        conn.commit()
+    finally:
+        conn.close()
+
+async def _run_export_rebuild(language: Optional[str]):
+    started = datetime.utcnow().isoformat()
+    _set_rebuild_status({"state": "running", "language": language, "started_at": started})
+    try:
+        written = await bulk_export.rebuild_exports(db_read_pool.acquire, extractor, export_writer, language)
+        _set_rebuild_status({"state": "done", "language": language, "started_at": started,
+                             "finished_at": datetime.utcnow().isoformat(), "written": written})
+    except RebuildInProgress as e:
+        _set_rebuild_status({"state": "failed", "language": language, "started_at": started,
+                             "error": f"Another worker is already rebuilding {e}"})
+    except Exception as e:
+        print(f"[EXPORT] Rebuild failed: {e}")
+        _set_rebuild_status({"state": "failed", "language": language, "started_at": started, "error": str(e)})
+
+@app.post("/api/admin/exports/rebuild", status_code=202)
+async def rebuild_exports_api(request: Request, user: str = Depends(verify_token)):
+    """Regenerate the JSONL shards from the database in the background."""
+    global _export_rebuild_task
+    data = await request.json() if request.headers.get("content-type") == "application/json" else {}
+    if _export_rebuild_task is not None and not _export_rebuild_task.done():
+        raise HTTPException(409, "An export rebuild is already running")
+    _export_rebuild_task = asyncio.create_task(_run_export_rebuild(data.get("language") or None))
+    return {"status": "started"}
+
+@app.get("/api/admin/exports")
+async def list_exports(user: str = Depends(verify_token), conn=Depends(db_read)):
+    """Shard manifests per language plus the state of the last rebuild."""
+    manifests = {d.name: export_writer.manifest(d.name)
+                 for d in sorted(EXPORTS.iterdir()) if d.is_dir() and not d.name.startswith(".")}
+    row = conn.execute("SELECT value FROM app_meta WHERE key='export_rebuild'").fetchone()
+    return {"manifests": manifests, "rebuild": json.loads(row["value"]) if row else None}
+
 @app.get("/api/admin/storage-info")
-async def storage_info(user: str = Depends(verify_token)):
+async def storage_info(user: str = Depends(verify_token), conn=Depends(db_read)):
     """Return temporary storage stats."""
-    conn = get_db()
     pending = conn.execute("SELECT COUNT(*) as c FROM submissions WHERE status='PENDING'").fetchone()["c"]
     oldest = conn.execute("SELECT MIN(created_at) as oldest FROM submissions WHERE status='PENDING'").fetchone()["oldest"]
-    conn.close()
     
-    # Calculate storage size
-    pending_dir = STORAGE / "pending"
-    total_size = 0
-    if pending_dir.exists():
-        for f in pending_dir.rglob("*"):
-            if f.is_file():
-                total_size += f.stat().st_size
+    # Byte totals are maintained at write time (see stats.py / storage_usage.py)
+    usage = read_storage_usage(conn)
+    total_size = usage["by_status"].get("PENDING", 0)
     
     return {
         "pending_count": pending,
         "oldest_pending": oldest,
         "retention_days": TEMP_RETENTION_DAYS,
         "storage_bytes": total_size,
-        "storage_mb": round(total_size / (1024 * 1024), 2)
+        "storage_mb": round(total_size / (1024 * 1024), 2),
+        "usage": usage,
+        "retention": read_retention_metrics(conn),
+    }
+
+# ── Routes: Metrics ─────────────────────────────────────────────────────
+@app.get("/metrics")
+async def prometheus_metrics(request: Request, conn=Depends(db_read)):
+    """Prometheus text format, summed over every gunicorn worker (see metrics.py)."""
+    if METRICS_TOKEN and request.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(401, "Not authenticated")
+    # Gauges come from the database, so every worker reports the same value
+    jobs = {r["status"]: r["c"] for r in conn.execute("SELECT status, COUNT(*) as c FROM hf_jobs GROUP BY status")}
+    ingest = {r["status"]: r["c"] for r in conn.execute("SELECT status, COUNT(*) as c FROM ingest_jobs GROUP BY status")}
+    gauges = {
+        "hf_queue_depth": ("HF push jobs queued or running.", {(): jobs.get("QUEUED", 0) + jobs.get("RUNNING", 0)}),
+        "hf_jobs": ("HF push jobs by status.", {(("status", k),): v for k, v in jobs.items()}),
+        "ingest_jobs": ("Submissions waiting for analysis, by job status.", {(("status", k),): v for k, v in ingest.items()}),
+        "submissions": ("Submissions by status.", {(("status", k.split(":", 1)[1]),): v
+                        for k, v in counters.read_counters(conn).items() if k.startswith("status:")}),
     }
+    body = await asyncio.to_thread(metrics.render, gauges)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
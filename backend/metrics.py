@@ -0,0 +1,306 @@
+"""Prometheus metrics shared by every gunicorn worker.
+
+Each process counts in memory (a dict update under a lock, no I/O on the
+request path) and a background thread writes its totals to
+<METRICS_DIR>/<pid>-<token>.json every METRICS_FLUSH_INTERVAL seconds.
+/metrics flushes the serving process, then sums every process's file, so
+a scrape sees all workers with at most one interval of lag. Files of
+processes that have exited are folded into archive.json when a process
+starts, so totals survive worker restarts. Readers take a shared fcntl
+lock on the directory and the fold an exclusive one, so a scrape never
+sees a file counted twice or not at all.
+
+Only counters and histograms live here; gauges are read from the
+database at scrape time (see render()).
+
+Instrumenting code::
+
+    with metrics.stage("pii_scan"):
+        ...
+
+    @metrics.timed("upload")
+    async def stream_upload_to_disk(...): ...
+
+    metrics.inc("submissions_total", language="tamil")
+"""
+import asyncio, atexit, functools, json, os, re, threading, time, uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines run a single process
+    fcntl = None
+
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+PREFIX = "mozhii_"
+
+# Seconds; from a fast SQLite probe up to a slow HF push
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "Time to the response headers, by route template."),
+    "stage_duration_seconds": ("histogram", "Time spent in one pipeline stage."),
+    "sqlite_query_duration_seconds": ("histogram", "Time in sqlite3 execute/executemany/commit, by statement kind and table."),
+    "submissions_total": ("counter", "Submissions that finished analysis."),
+    "ingest_total": ("counter", "Background analysis runs, by outcome."),
+    "duplicate_submissions_total": ("counter", "Submissions flagged as duplicates, by the strongest match kind."),
+    "pii_hits_total": ("counter", "PII matches found in submissions, by type."),
+    "profanity_hits_total": ("counter", "Profanity matches found in submissions."),
+    "image_gps_removed_total": ("counter", "Uploaded images stored without the GPS location they carried."),
+    "reviews_total": ("counter", "Admin review decisions."),
+    "export_outbox_flushed_total": ("counter", "Approved export lines copied from the outbox into the shards."),
+    "hf_pushes_total": ("counter", "Hugging Face push attempts, by outcome."),
+    "admission_rejected_total": ("counter", "Requests refused by admission control (body size, upload slots, rate limits)."),
+    "extract_queue_full_total": ("counter", "Extractions refused because the pool queue was full."),
+    "extract_timeouts_total": ("counter", "Pool jobs that ran past their timeout; their workers are killed."),
+    "extract_cache_evictions_total": ("counter", "Extraction cache entries evicted to stay under EXTRACT_CACHE_MAX_BYTES."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._hists: Dict[Tuple[str, Labels], list] = {}   # bucket counts..., sum, count
+        self.directory: Optional[Path] = None
+        self._file: Optional[Path] = None
+
+    # ── Recording ──
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._hists.get(key)
+            if h is None:
+                h = self._hists[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+                    break
+            h[-2] += seconds
+            h[-1] += 1
+
+    # ── Cross-process files ──
+    def configure(self, directory):
+        """Start sharing this process's totals through directory."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = self.directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+        self._fold_dead()
+        threading.Thread(target=self._loop, name="metrics-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    @contextmanager
+    def _dir_lock(self, exclusive: bool):
+        with open(self.directory / ".lock", "a") as fh:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            return {"counters": [[n, list(l), v] for (n, l), v in self._counters.items()],
+                    "hists": [[n, list(l), h[:]] for (n, l), h in self._hists.items()]}
+
+    def flush(self):
+        if self._file is None:
+            return
+        tmp = self._file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._snapshot()), encoding="utf-8")
+        os.replace(tmp, self._file)
+
+    def _loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[METRICS] Flush failed: {e}")
+
+    def _fold_dead(self):
+        with self._dir_lock(exclusive=True):
+            dead = [p for p in self.directory.glob("*-*.json") if not _pid_alive(int(p.name.split("-", 1)[0]))]
+            if not dead:
+                return
+            archive = self.directory / "archive.json"
+            total = _merge([archive, *dead])
+            tmp = archive.with_suffix(".tmp")
+            tmp.write_text(json.dumps(_unmerge(total)), encoding="utf-8")
+            os.replace(tmp, archive)
+            for p in dead:
+                p.unlink(missing_ok=True)
+
+    def totals(self) -> Tuple[dict, dict]:
+        """Counters and histograms summed over every process (just this one if not configured)."""
+        if self.directory is None:
+            return _merge_snapshots([self._snapshot()])
+        self.flush()
+        with self._dir_lock(exclusive=False):
+            return _merge(self.directory.glob("*.json"))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge_snapshots(snapshots: Iterable[dict]) -> Tuple[dict, dict]:
+    counters, hists = {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, h in snap.get("hists", []):
+            key = (name, tuple(map(tuple, labels)))
+            acc = hists.get(key)
+            hists[key] = h[:] if acc is None else [a + b for a, b in zip(acc, h)]
+    return counters, hists
+
+
+def _merge(paths) -> Tuple[dict, dict]:
+    snapshots = []
+    for p in paths:
+        try:
+            snapshots.append(json.loads(Path(p).read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            pass  # not written yet
+    return _merge_snapshots(snapshots)
+
+
+def _unmerge(totals) -> dict:
+    counters, hists = totals
+    return {"counters": [[n, list(l), v] for (n, l), v in counters.items()],
+            "hists": [[n, list(l), h] for (n, l), h in hists.items()]}
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+
+
+# ── Instrumentation hooks ──
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as pipeline stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("stage_duration_seconds", time.perf_counter() - start, stage=name)
+
+
+def timed(name: str):
+    """Decorator form of stage(), for plain and async functions."""
+    def wrap(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def run_async(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return run
+    return wrap
+
+
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|TABLE(?:\s+IF\s+NOT\s+EXISTS)?)\s+(\w+)", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=1024)
+def _sql_labels(sql: str) -> Tuple[str, str]:
+    words = sql.split(None, 4)
+    if not words:
+        return "other", ""
+    op = words[0].upper()
+    if op == "UPDATE":
+        # UPDATE [OR <conflict>] <table>
+        table = words[3] if len(words) > 3 and words[1].upper() == "OR" else words[1] if len(words) > 1 else ""
+    else:
+        m = _TABLE_RE.search(sql)
+        table = m.group(1) if m else ""
+    return op, table.lower()
+
+
+def observe_query(sql: str, seconds: float):
+    """ConnectionPool observer: statement kind and table only, never the SQL text."""
+    op, table = _sql_labels(sql)
+    REGISTRY.observe("sqlite_query_duration_seconds", seconds, op=op, table=table)
+
+
+# ── Exposition ──
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _le(bound) -> str:
+    return 'le="%s"' % bound
+
+
+def _number(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render(gauges: Dict[str, Tuple[str, Dict[Labels, float]]] = None) -> str:
+    """Prometheus text format for every process's counters and histograms.
+
+    gauges maps a metric name to (help, {labels: value}) for values the
+    caller reads at scrape time.
+    """
+    counters, hists = REGISTRY.totals()
+    lines = []
+    by_name: Dict[str, list] = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), h in hists.items():
+        by_name.setdefault(name, []).append((labels, h))
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ("counter" if name.endswith("_total") else "histogram", ""))
+        full = PREFIX + name
+        lines.append(f"# HELP {full} {text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for labels, value in sorted(by_name[name]):
+            if kind == "counter":
+                lines.append(f"{full}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, n in zip(BUCKETS, value):
+                cumulative += n
+                lines.append(f"{full}_bucket{_labels(labels, _le(bound))} {cumulative}")
+            lines.append(f"{full}_bucket{_labels(labels, _le('+Inf'))} {value[-1]}")
+            lines.append(f"{full}_sum{_labels(labels)} {_number(float(value[-2]))}")
+            lines.append(f"{full}_count{_labels(labels)} {value[-1]}")
+    for name, (text, values) in sorted((gauges or {}).items()):
+        full = PREFIX + name
+        lines.append(f"# HELP {full} {text}")
+        lines.append(f"# TYPE {full} gauge")
+        for labels, value in sorted(values.items()):
+            lines.append(f"{full}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,73 @@
+"""Whole-document PDF text extraction.
+
+A PDF's pages are split into runs, each parsed by a separate pool job
+(see ExtractionExecutor.extract_pdf), and every page's text is cached on
+its own, so a document that timed out half way only re-parses the pages
+it is missing. Opening a PDF walks its whole page tree, so runs are as
+long as the worker count allows (at least PDF_PAGES_PER_TASK, at most
+PDF_MAX_PAGES_PER_TASK pages) rather than a page or two each.
+
+A page whose text has fewer than PDF_SCAN_MIN_CHARS non-space characters
+is treated as image-only. A document where at least PDF_SCAN_PAGE_RATIO
+of the pages are image-only is a scan (the scan_pdf category): its pages
+are pictures of text, which needs OCR rather than the text layer.
+
+Like extraction.py this module has no import-time side effects; its
+functions run inside pool workers.
+"""
+import os
+from typing import List, Tuple
+
+PDF_PAGES_PER_TASK     = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_MAX_PAGES_PER_TASK = int(os.getenv("PDF_MAX_PAGES_PER_TASK", "250"))
+PDF_MAX_PAGES          = int(os.getenv("PDF_MAX_PAGES", "2000"))
+PDF_SCAN_MIN_CHARS     = int(os.getenv("PDF_SCAN_MIN_CHARS", "40"))
+PDF_SCAN_PAGE_RATIO    = float(os.getenv("PDF_SCAN_PAGE_RATIO", "0.8"))
+
+
+def extract_pages(source, start: int = 0, stop: int = None) -> Tuple[int, List[str]]:
+    """Text of pages [start, stop) plus the document's page count.
+
+    source is a path or a binary file object. An unreadable document
+    yields (0, []); a page that fails to parse yields "".
+    """
+    try:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(source)
+        count = min(len(reader.pages), PDF_MAX_PAGES)
+    except Exception:
+        return 0, []
+    texts = []
+    for i in range(start, min(count, stop if stop is not None else count)):
+        try:
+            texts.append(reader.pages[i].extract_text() or "")
+        except Exception:
+            texts.append("")
+    return count, texts
+
+
+def plan_runs(missing: List[int], workers: int) -> List[Tuple[int, int]]:
+    """Split sorted page numbers into [start, stop) runs, about one per worker."""
+    size = min(max(PDF_PAGES_PER_TASK, -(-len(missing) // max(1, workers))), PDF_MAX_PAGES_PER_TASK)
+    runs = []
+    for i in missing:
+        if runs and runs[-1][1] == i and i - runs[-1][0] < size:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return [tuple(r) for r in runs]
+
+
+def join_pages(pages: List[str]) -> str:
+    return "\n".join(p for p in pages if p)
+
+
+def is_image_only(text: str) -> bool:
+    return sum(not c.isspace() for c in text) < PDF_SCAN_MIN_CHARS
+
+
+def is_scanned(pages: List[str]) -> bool:
+    """True when the document is mostly pages without a text layer."""
+    if not pages:
+        return False
+    return sum(map(is_image_only, pages)) >= PDF_SCAN_PAGE_RATIO * len(pages)
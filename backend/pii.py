@@ -0,0 +1,101 @@
+"""Single-pass PII scanner.
+
+All patterns are compiled once into one alternation with named groups, so
+a text is scanned exactly once. Input can be a whole string or a stream of
+chunks (e.g. pages as they are extracted); chunks are stitched with an
+overlap so matches spanning a chunk boundary are still found, once.
+"""
+import re
+from collections import Counter
+from typing import Iterable, List
+
+from .metrics import timed
+
+# Every pattern is anchored at a word boundary, which is factored out below.
+# Order matters: at a given position the first alternative that matches wins,
+# so longer / more specific shapes come first.
+EMAIL_PATTERN = ("email", r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+NUMERIC_PATTERNS = [
+    ("credit_card", r'\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b'),
+    ("ip",          r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\b'),
+    ("phone",       r'\d{3}[-.]?\d{3}[-.]?\d{4}\b'),
+    ("id_number",   r'\d{9,12}\b'),
+]
+PII_PATTERNS = [EMAIL_PATTERN] + NUMERIC_PATTERNS
+
+# The numeric alternatives sit behind a (?=\d) guard so ordinary words only
+# pay for the email branch: about 2x faster than a flat alternation on
+# multi-MB prose (python -m bench.pii_scan).
+PII_RE = re.compile(
+    r"\b(?:(?P<%s>%s)|(?=\d)(?:%s))" % (
+        EMAIL_PATTERN[0], EMAIL_PATTERN[1],
+        "|".join(f"(?P<{name}>{pat})" for name, pat in NUMERIC_PATTERNS),
+    )
+)
+
+CHUNK_CHARS = 64 * 1024
+OVERLAP     = 256   # longer than any non-email match; also gives \b its left context
+MAX_STORED_MATCHES = 500
+
+
+class PIIMatch(dict):
+    """{"type", "start", "end", "source"} — a dict so it serializes as-is."""
+
+
+def _scan_chunks(chunks: Iterable[str], source: str) -> Iterable[PIIMatch]:
+    base = 0          # absolute offset of buf[0]
+    buf = ""
+    emitted_upto = 0  # absolute end of the last emitted match
+    scan_from = 0     # absolute offset where unscanned text begins
+    pending = iter(chunks)
+    final = False
+    while not final:
+        chunk = next(pending, None)
+        if chunk is None:
+            final = True
+        else:
+            buf += chunk
+            if len(buf) - (scan_from - base) < CHUNK_CHARS + OVERLAP:
+                continue
+        # Only matches starting before `cut` are settled; the rest are rescanned
+        # next round once more text has arrived.
+        cut = base + len(buf) if final else base + len(buf) - OVERLAP
+        pos = max(scan_from, emitted_upto) - base
+        for m in PII_RE.finditer(buf, pos):
+            start = base + m.start()
+            if start >= cut:
+                break
+            emitted_upto = base + m.end()
+            yield PIIMatch(type=m.lastgroup, start=start, end=emitted_upto, source=source)
+        scan_from = cut
+        # Keep OVERLAP chars before the cut so \b sees real left context
+        keep_from = max(0, cut - OVERLAP - base)
+        buf = buf[keep_from:]
+        base += keep_from
+
+
+@timed("pii_scan")
+def scan_pii(text, source: str = "text") -> List[PIIMatch]:
+    """Return every PII match in text (a string or an iterable of chunks)."""
+    if isinstance(text, str):
+        whole = text
+        chunks = (whole[i:i + CHUNK_CHARS] for i in range(0, len(whole), CHUNK_CHARS))
+    else:
+        chunks = text or []
+    return list(_scan_chunks(chunks, source))
+
+
+def summarize(matches: List[PIIMatch]) -> dict:
+    """Counts per type plus (capped) match spans for the admin UI."""
+    counts = Counter(m["type"] for m in matches)
+    return {
+        "counts": dict(counts),
+        "total": len(matches),
+        "matches": matches[:MAX_STORED_MATCHES],
+    }
+
+
+def flag_types(matches: List[PIIMatch]) -> List[str]:
+    """Distinct PII types found, in pattern order."""
+    found = {m["type"] for m in matches}
+    return [name for name, _ in PII_PATTERNS if name in found]
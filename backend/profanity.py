@@ -0,0 +1,160 @@
+"""Profanity filter backed by admin-managed, per-language wordlists.
+
+Words live in the profanity_words table. They are compiled into one
+Aho-Corasick automaton, so a scan costs time linear in the text length
+regardless of how many words are listed. Each worker builds the automaton
+once and rebuilds it only when the lists change (tracked by a version
+counter in app_meta, so edits made through another worker are picked up).
+
+Scans look at that counter at most every PROFANITY_CHECK_INTERVAL seconds;
+the worker that handles an edit refreshes straight away, the others within
+the interval.
+"""
+import os, threading, time, unicodedata
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from .metrics import timed
+
+PROFANITY_CHECK_INTERVAL = float(os.getenv("PROFANITY_CHECK_INTERVAL", "30"))
+
+
+def _is_word_char(ch: str) -> bool:
+    return unicodedata.category(ch)[0] in "LMN"
+
+
+def _fold(text: str) -> str:
+    return unicodedata.normalize("NFC", text).casefold()
+
+
+class AhoCorasick:
+    """Multi-pattern matcher; find() yields (end_index, pattern_id) in one pass."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+        self.patterns: List[str] = []
+        for pat in patterns:
+            self._add(pat)
+        self._build()
+
+    def _add(self, pat: str):
+        if not pat:
+            return
+        node = 0
+        for ch in pat:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = nxt
+        self.out[node].append(len(self.patterns))
+        self.patterns.append(pat)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, chars: Iterable[str]):
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, ch in enumerate(chars):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pid in out[node]:
+                yield i, pid
+
+
+class ProfanityFilter:
+    """Thread-safe holder of the compiled automaton for all languages."""
+
+    def __init__(self, get_conn, check_interval: float = PROFANITY_CHECK_INTERVAL):
+        self.get_conn = get_conn
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = None  # time.monotonic() of the last version check
+        self._automaton = AhoCorasick([])
+        self._languages: List[List[str]] = []  # pattern id -> languages listing it
+
+    def _current_version(self, conn) -> str:
+        row = conn.execute("SELECT value FROM app_meta WHERE key='profanity_version'").fetchone()
+        return row["value"] if row else "0"
+
+    def refresh(self, force: bool = False):
+        """Rebuild the automaton if the stored wordlists changed."""
+        self._checked_at = time.monotonic()
+        conn = self.get_conn()
+        try:
+            version = self._current_version(conn)
+            if not force and version == self._version:
+                return
+            words: Dict[str, List[str]] = {}
+            for r in conn.execute("SELECT language, word FROM profanity_words"):
+                words.setdefault(_fold(r["word"]), []).append(r["language"])
+        finally:
+            conn.close()
+        automaton = AhoCorasick(words.keys())
+        languages = [words[p] for p in automaton.patterns]
+        with self._lock:
+            self._automaton, self._languages, self._version = automaton, languages, version
+        print(f"[PROFANITY] Loaded {len(languages)} terms (version {version})")
+
+    @timed("profanity_scan")
+    def scan(self, text: str, source: str = "text") -> List[dict]:
+        """Return whole-word matches as {term, languages, start, end, source}."""
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+        with self._lock:
+            automaton, languages = self._automaton, self._languages
+        if not text or not automaton.patterns:
+            return []
+        # Casefolding can change length (ß -> ss); remember each folded char's origin
+        folded, origin = [], []
+        for idx, ch in enumerate(text):
+            for fch in _fold(ch):
+                folded.append(fch)
+                origin.append(idx)
+        matches = []
+        for end, pid in automaton.find(folded):
+            term = automaton.patterns[pid]
+            start_f = end - len(term) + 1
+            start, stop = origin[start_f], origin[end] + 1
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if stop < len(text) and _is_word_char(text[stop]):
+                continue
+            matches.append({"term": term, "languages": languages[pid],
+                            "start": start, "end": stop, "source": source})
+        return matches
+
+
+def bump_version(conn):
+    conn.execute("""INSERT INTO app_meta (key, value) VALUES ('profanity_version', '1')
+                    ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1""")
+
+
+def default_wordlist() -> List[str]:
+    """better_profanity's bundled English list, used to seed a new database."""
+    try:
+        import better_profanity
+    except ImportError:
+        return []
+    path = Path(better_profanity.__file__).parent / "profanity_wordlist.txt"
+    if not path.exists():
+        return []
+    return [w.strip() for w in path.read_text(encoding="utf-8").splitlines() if w.strip()]
@@ -0,0 +1,132 @@
+"""Retention cleanup for PENDING submissions.
+
+Expired rows are found through the (status, created_at, id) index in
+batches of RETENTION_BATCH_SIZE, oldest first, and a run stops when
+RETENTION_TIME_BUDGET seconds are spent (the next run carries on).
+Deleting a row releases its blob references; each run ends with a blob
+garbage collection, which removes the files nothing else points to.
+Submissions from before the blob store still have a folder at
+STORAGE/pending/<language>/<id>, which is removed directly.
+
+Every gunicorn worker starts the thread, but only the current leader
+(see leader.py) does any work.
+
+Totals are kept in stats_counters ("retention:deleted", "retention:files",
+"retention:bytes", counting the submissions' logical size) and the last
+run's metrics in app_meta.
+"""
+import json, os, shutil, threading, time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from . import dedupe
+from .leader import LeaderLock
+
+RETENTION_BATCH_SIZE  = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_TIME_BUDGET = float(os.getenv("RETENTION_TIME_BUDGET", "30"))    # seconds per run
+RETENTION_INTERVAL    = float(os.getenv("RETENTION_INTERVAL", str(6 * 3600)))
+
+_BUMP = ("INSERT INTO stats_counters (key, value) VALUES (?, ?) "
+         "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value")
+
+
+class RetentionEngine:
+    def __init__(self, get_conn, storage: Path, blobs, lock_path: Path, days: int,
+                 batch_size: int = RETENTION_BATCH_SIZE, time_budget: float = RETENTION_TIME_BUDGET):
+        self.get_conn = get_conn
+        self.storage = Path(storage)
+        self.blobs = blobs
+        self.leader = LeaderLock(lock_path)
+        self.days = days
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+
+    def _purge_batch(self, cutoff: str) -> dict:
+        conn = self.get_conn()
+        try:
+            rows = conn.execute(
+                "SELECT id, language FROM submissions WHERE status='PENDING' AND created_at < ? "
+                "ORDER BY created_at, id LIMIT ?", (cutoff, self.batch_size)).fetchall()
+            if not rows:
+                return {"seen": 0, "deleted": 0, "files": 0, "bytes": 0}
+            now = datetime.utcnow().isoformat()
+            ids = [r["id"] for r in rows]
+            conn.execute("BEGIN IMMEDIATE")
+            # Re-check status: an admin may have approved a row since the SELECT
+            deleted = conn.execute(
+                f"DELETE FROM submissions WHERE id IN ({','.join('?' * len(ids))}) "
+                f"AND status='PENDING' AND created_at < ? RETURNING id, language, file_paths, storage_bytes",
+                (*ids, cutoff)).fetchall()
+            dedupe.forget_submissions(conn, [r["id"] for r in deleted])
+            paths = [fp for r in deleted for fp in json.loads(r["file_paths"] or "[]")]
+            self.blobs.decref(conn, [k for k in map(self.blobs.key_of, paths) if k])
+            conn.executemany(
+                "INSERT INTO audit_log (submission_id, action, admin_user, reason, notes, timestamp) "
+                "VALUES (?, 'AUTO_DELETED', 'system', ?, '', ?)",
+                [(r["id"], f"{self.days}-day retention expired", now) for r in deleted])
+            conn.commit()
+            # Legacy folders go only after the rows are gone, so nothing can still point at them
+            for r in deleted:
+                target = self.storage / "pending" / r["language"] / r["id"]
+                if target.exists():
+                    shutil.rmtree(target, ignore_errors=True)
+            files, size = len(paths), sum(r["storage_bytes"] for r in deleted)
+            conn.executemany(_BUMP, [("retention:deleted", len(deleted)), ("retention:files", files),
+                                     ("retention:bytes", size)])
+            conn.commit()
+            return {"seen": len(rows), "deleted": len(deleted), "files": files, "bytes": size}
+        finally:
+            conn.close()
+
+    def run_once(self) -> dict:
+        """Purge expired rows until done or out of time; returns this run's metrics."""
+        started = time.monotonic()
+        cutoff = (datetime.utcnow() - timedelta(days=self.days)).isoformat()
+        metrics = {"started_at": datetime.utcnow().isoformat(), "cutoff": cutoff,
+                   "deleted": 0, "files": 0, "bytes": 0, "batches": 0, "complete": False}
+        while time.monotonic() - started < self.time_budget:
+            batch = self._purge_batch(cutoff)
+            if batch["seen"]:
+                metrics["batches"] += 1
+            for key in ("deleted", "files", "bytes"):
+                metrics[key] += batch[key]
+            if batch["seen"] < self.batch_size:
+                metrics["complete"] = True
+                break
+        gc = self.blobs.collect_garbage()
+        metrics["blobs_removed"], metrics["blob_bytes_removed"] = gc["removed"], gc["bytes"]
+        metrics["elapsed_s"] = round(time.monotonic() - started, 3)
+        conn = self.get_conn()
+        try:
+            conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('retention_last_run', ?)",
+                         (json.dumps(metrics),))
+            conn.commit()
+        finally:
+            conn.close()
+        if metrics["deleted"]:
+            print(f"[CLEANUP] Deleted {metrics['deleted']} expired submission(s), "
+                  f"{metrics['files']} file(s), {metrics['bytes']} bytes in {metrics['elapsed_s']}s")
+        return metrics
+
+    def _loop(self, interval: float):
+        while True:
+            try:
+                if self.leader.held():
+                    metrics = self.run_once()
+                    if not metrics["complete"]:
+                        # Out of time with work left: come back soon rather than in 6 hours
+                        time.sleep(min(interval, 60))
+                        continue
+            except Exception as e:
+                print(f"[CLEANUP] Error: {e}")
+            time.sleep(interval)
+
+    def start(self, interval: float = RETENTION_INTERVAL):
+        threading.Thread(target=self._loop, args=(interval,), name="retention", daemon=True).start()
+
+
+def read_metrics(conn) -> dict:
+    totals = {r["key"].split(":", 1)[1]: r["value"] for r in conn.execute(
+        "SELECT key, value FROM stats_counters WHERE key LIKE 'retention:%'")}
+    row = conn.execute("SELECT value FROM app_meta WHERE key='retention_last_run'").fetchone()
+    return {"totals": totals, "last_run": json.loads(row["value"]) if row else None}
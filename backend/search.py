@@ -0,0 +1,61 @@
+"""Full-text search over submissions (SQLite FTS5).
+
+submissions_fts is an external-content FTS5 table over contributor_name,
+text_content and extracted_text, kept in sync by triggers. The stock
+unicode61 tokenizer treats combining marks as separators, which shreds
+Tamil and Sinhala words (உலகின் -> உலக + ன), so the Tamil and Sinhala
+vowel signs, viramas and ZWNJ/ZWJ are declared as token characters.
+"""
+import re, unicodedata
+from typing import List
+
+SNIPPET_OPEN  = "\x02"   # highlight markers; the UI escapes text, then swaps these for <mark>
+SNIPPET_CLOSE = "\x03"
+
+_SCRIPT_RANGES = [(0x0B80, 0x0C00), (0x0D80, 0x0E00)]  # Tamil, Sinhala
+TOKENCHARS = "".join(
+    chr(c) for lo, hi in _SCRIPT_RANGES for c in range(lo, hi)
+    if unicodedata.category(chr(c))[0] == "M"
+) + "\u200c\u200d"
+
+FTS_TOKENIZE = f"unicode61 remove_diacritics 2 tokenchars '{TOKENCHARS}'"
+
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS submissions_fts USING fts5(
+        contributor_name, text_content, extracted_text,
+        content='submissions', content_rowid='rowid',
+        tokenize="{FTS_TOKENIZE}"
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS submissions_fts_ai AFTER INSERT ON submissions BEGIN
+        INSERT INTO submissions_fts(rowid, contributor_name, text_content, extracted_text)
+        VALUES (new.rowid, new.contributor_name, new.text_content, new.extracted_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS submissions_fts_ad AFTER DELETE ON submissions BEGIN
+        INSERT INTO submissions_fts(submissions_fts, rowid, contributor_name, text_content, extracted_text)
+        VALUES ('delete', old.rowid, old.contributor_name, old.text_content, old.extracted_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS submissions_fts_au
+    AFTER UPDATE OF contributor_name, text_content, extracted_text ON submissions BEGIN
+        INSERT INTO submissions_fts(submissions_fts, rowid, contributor_name, text_content, extracted_text)
+        VALUES ('delete', old.rowid, old.contributor_name, old.text_content, old.extracted_text);
+        INSERT INTO submissions_fts(rowid, contributor_name, text_content, extracted_text)
+        VALUES (new.rowid, new.contributor_name, new.text_content, new.extracted_text);
+    END""",
+]
+
+_TERM_RE = re.compile(r"[\w" + re.escape(TOKENCHARS) + r"]+")
+
+
+def build_fts_query(search: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Prefix matching helps with Tamil and Sinhala, where suffixes are
+    attached to the stem (மொழி matches மொழியில்). Returns "" if nothing
+    searchable is left.
+    """
+    terms: List[str] = _TERM_RE.findall(unicodedata.normalize("NFC", search or ""))
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def snippet_sql(tokens: int = 12) -> str:
+    return (f"snippet(submissions_fts, -1, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '…', {tokens})")
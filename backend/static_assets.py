@@ -0,0 +1,214 @@
+"""Fingerprinted, precompressed frontend assets.
+
+build() copies frontend/ into STATIC_BUILD/<source digest>/ with:
+
+- every asset renamed to name.<hash>.ext (css/style.css ->
+  css/style.3fa2b1c49e.css), and /static/... references in the CSS, JS
+  and HTML rewritten to the new names;
+- .gz (and .br when the brotli package is installed) next to every text
+  file, kept only if it is actually smaller;
+- manifest.json describing all of it.
+
+Assets are hashed before the files that reference them (images and
+fonts, then CSS/JS, then HTML), so a changed image changes the name of
+the stylesheet that uses it.
+
+AssetStore loads a build into memory (the whole frontend is a few hundred
+KB) and answers /static, / and /admin with:
+
+- the best encoding the client accepts (br > gzip > identity), plus
+  Vary: Accept-Encoding;
+- a strong ETag per encoding, and 304 for a matching If-None-Match;
+- "immutable" caching for hashed names, and no-cache (always
+  revalidate, cheap with the ETag) for HTML and the old unhashed names.
+
+The build directory is named after a digest of the sources, so a
+deploy with changed files never serves a stale build.
+ensure_built() runs at startup and builds only if that directory is
+missing, under an fcntl lock so gunicorn workers don't build twice.
+`python -m backend.cli build-static` does the same at deploy time.
+"""
+import gzip, hashlib, json, mimetypes, os, re, shutil
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines run a single process
+    fcntl = None
+
+STATIC_PREFIX = "/static/"
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".txt", ".map"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+BUILD_VERSION = 1  # bump when the build output changes shape
+
+_ORDER = {".css": 1, ".js": 1, ".html": 2}  # referenced files first
+
+
+def source_digest(src: Path) -> str:
+    """Digest of every source file's path and bytes (and the build format)."""
+    h = hashlib.sha256(f"v{BUILD_VERSION} br={BROTLI_AVAILABLE}".encode())
+    for p in sorted(_sources(src)):
+        h.update(p.relative_to(src).as_posix().encode() + b"\0")
+        h.update(p.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def _sources(src: Path):
+    return [p for p in src.rglob("*") if p.is_file() and not p.name.startswith(".")]
+
+
+def _variants(data: bytes, ext: str) -> Dict[str, bytes]:
+    out = {}
+    if ext not in COMPRESSIBLE:
+        return out
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data) * 0.95:
+        out["gzip"] = gz
+    if BROTLI_AVAILABLE:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data) * 0.95:
+            out["br"] = br
+    return out
+
+
+def build(src: Path, dest_root: Path) -> Path:
+    """Build src into dest_root/<source digest>/; returns that directory."""
+    src, dest_root = Path(src), Path(dest_root)
+    digest = source_digest(src)
+    dest = dest_root / digest
+    if (dest / "manifest.json").exists():
+        return dest
+    tmp = dest_root / f".{digest}.{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    renames: Dict[str, str] = {}   # "/static/css/style.css" -> "/static/css/style.<h>.css"
+    files = {}
+    for p in sorted(_sources(src), key=lambda p: (_ORDER.get(p.suffix.lower(), 0), p.as_posix())):
+        rel = p.relative_to(src).as_posix()
+        ext = p.suffix.lower()
+        data = p.read_bytes()
+        if ext in _ORDER and renames:
+            # Longest first, so /static/css/a.css never matches inside /static/css/a.css.map
+            pattern = re.compile("|".join(re.escape(k) for k in sorted(renames, key=len, reverse=True)))
+            data = pattern.sub(lambda m: renames[m.group(0)], data.decode("utf-8")).encode("utf-8")
+        etag = hashlib.sha256(data).hexdigest()[:10]
+        if ext == ".html":
+            name = rel  # pages keep their names; they are revalidated, not cached forever
+        else:
+            name = f"{rel[:len(rel) - len(ext)]}.{etag}{ext}" if ext else f"{rel}.{etag}"
+            renames[STATIC_PREFIX + rel] = STATIC_PREFIX + name
+        target = tmp / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        variants = _variants(data, ext)
+        for encoding, body in variants.items():
+            (tmp / f"{name}.{'br' if encoding == 'br' else 'gz'}").write_bytes(body)
+        files[rel] = {"name": name, "etag": etag, "encodings": sorted(variants),
+                      "type": mimetypes.guess_type(rel)[0] or "application/octet-stream"}
+
+    (tmp / "manifest.json").write_text(json.dumps({"version": BUILD_VERSION, "source": digest, "files": files},
+                                                  indent=1), encoding="utf-8")
+    try:
+        os.replace(tmp, dest)
+    except OSError:  # another process finished the same build first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return dest
+
+
+def ensure_built(src: Path, dest_root: Path, keep: int = 3) -> Path:
+    """The build for the current sources, building it (once across processes) if needed."""
+    dest_root = Path(dest_root)
+    dest_root.mkdir(parents=True, exist_ok=True)
+    with open(dest_root / ".lock", "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        dest = build(src, dest_root)
+        # Drop all but the newest few builds; a running old deploy may still use the previous one
+        builds = sorted((d for d in dest_root.iterdir() if d.is_dir() and not d.name.startswith(".")),
+                        key=lambda d: d.stat().st_mtime, reverse=True)
+        for old in builds[keep:]:
+            if old != dest:
+                shutil.rmtree(old, ignore_errors=True)
+    return dest
+
+
+def _accepts(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}."""
+    out = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        m = re.search(r"q=([0-9.]+)", params)
+        if m:
+            try:
+                q = float(m.group(1))
+            except ValueError:
+                q = 0.0
+        out[coding.strip().lower()] = q
+    return out
+
+
+class Asset:
+    __slots__ = ("type", "etag", "bodies", "immutable")
+
+    def __init__(self, type_: str, etag: str, bodies: Dict[str, bytes], immutable: bool):
+        self.type = type_
+        self.etag = etag
+        self.bodies = bodies        # encoding ("identity", "gzip", "br") -> bytes
+        self.immutable = immutable
+
+
+class AssetStore:
+    def __init__(self, build_dir: Path):
+        build_dir = Path(build_dir)
+        manifest = json.loads((build_dir / "manifest.json").read_text(encoding="utf-8"))
+        self.assets: Dict[str, Asset] = {}
+        for rel, info in manifest["files"].items():
+            name = info["name"]
+            bodies = {"identity": (build_dir / name).read_bytes()}
+            for encoding in info["encodings"]:
+                bodies[encoding] = (build_dir / f"{name}.{'br' if encoding == 'br' else 'gz'}").read_bytes()
+            self.assets[rel] = Asset(info["type"], info["etag"], bodies, immutable=False)
+            if name != rel:
+                self.assets[name] = Asset(info["type"], info["etag"], bodies, immutable=True)
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self.assets.get(path)
+
+    @staticmethod
+    def negotiate(asset: Asset, accept_encoding: str) -> str:
+        """The encoding to send: br, then gzip, then identity, among those the client accepts."""
+        accepted = _accepts(accept_encoding or "")
+        for encoding in ("br", "gzip"):
+            q = accepted[encoding] if encoding in accepted else accepted.get("*", 0.0)
+            if encoding in asset.bodies and q > 0:
+                return encoding
+        return "identity"
+
+    def respond(self, asset: Asset, accept_encoding: str, if_none_match: str) -> Tuple[int, Dict[str, str], bytes]:
+        """(status, headers, body) for a GET of asset."""
+        encoding = self.negotiate(asset, accept_encoding)
+        etag = f'"{asset.etag}"' if encoding == "identity" else f'"{asset.etag}-{encoding}"'
+        headers = {"ETag": etag, "Vary": "Accept-Encoding",
+                   "Cache-Control": IMMUTABLE if asset.immutable else REVALIDATE}
+        if if_none_match:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            # Weak comparison, as RFC 9110 asks for If-None-Match (a proxy may have weakened the tag)
+            if "*" in tags or etag in tags or f"W/{etag}" in tags:
+                return 304, headers, b""
+        headers["Content-Type"] = asset.type + ("; charset=utf-8" if asset.type.startswith("text/")
+                                                or asset.type.endswith("javascript") else "")
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, headers, asset.bodies[encoding]
@@ -0,0 +1,118 @@
+"""Dashboard counters maintained by triggers.
+
+Every insert, status/language change and delete on submissions (and every
+feedback insert/delete) adjusts a row in stats_counters, so the dashboard
+and the public health-check endpoint read a handful of rows instead of
+counting the corpus. Distinct contributors are tracked through
+contributor_counts (submissions per email).
+
+Counter keys: "status:<STATUS>", "lang:<language>", "contributors", "feedbacks".
+
+Storage usage works the same way from submissions.storage_bytes (bytes on
+disk for the submission's files, recorded when they are written): keys
+"bytes:status:<STATUS>", "bytes:lang:<language>", "bytes:cat:<category>".
+"""
+
+_BUMP = "INSERT INTO stats_counters (key, value) VALUES ({key}, {delta}) " \
+        "ON CONFLICT(key) DO UPDATE SET value = value + {delta};"
+
+STATS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS stats_counters (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS contributor_counts (
+        email TEXT PRIMARY KEY,
+        submissions INTEGER NOT NULL
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_submissions_ai AFTER INSERT ON submissions BEGIN
+        {_BUMP.format(key="'status:' || new.status", delta=1)}
+        {_BUMP.format(key="'lang:' || new.language", delta=1)}
+        INSERT INTO stats_counters (key, value)
+            SELECT 'contributors', 1
+            WHERE NOT EXISTS (SELECT 1 FROM contributor_counts WHERE email = new.contributor_email)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1;
+        INSERT INTO contributor_counts (email, submissions) VALUES (new.contributor_email, 1)
+            ON CONFLICT(email) DO UPDATE SET submissions = submissions + 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_submissions_au AFTER UPDATE OF status, language ON submissions
+    WHEN old.status IS NOT new.status OR old.language IS NOT new.language BEGIN
+        {_BUMP.format(key="'status:' || old.status", delta=-1)}
+        {_BUMP.format(key="'status:' || new.status", delta=1)}
+        {_BUMP.format(key="'lang:' || old.language", delta=-1)}
+        {_BUMP.format(key="'lang:' || new.language", delta=1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_submissions_ad AFTER DELETE ON submissions BEGIN
+        {_BUMP.format(key="'status:' || old.status", delta=-1)}
+        {_BUMP.format(key="'lang:' || old.language", delta=-1)}
+        UPDATE contributor_counts SET submissions = submissions - 1 WHERE email = old.contributor_email;
+        UPDATE stats_counters SET value = value - 1
+            WHERE key = 'contributors'
+            AND EXISTS (SELECT 1 FROM contributor_counts WHERE email = old.contributor_email AND submissions <= 0);
+        DELETE FROM contributor_counts WHERE email = old.contributor_email AND submissions <= 0;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_feedbacks_ai AFTER INSERT ON feedbacks BEGIN
+        {_BUMP.format(key="'feedbacks'", delta=1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_feedbacks_ad AFTER DELETE ON feedbacks BEGIN
+        {_BUMP.format(key="'feedbacks'", delta=-1)}
+    END""",
+]
+
+_STORAGE_KEYS = {
+    "status": "'bytes:status:' || {row}.status",
+    "lang":   "'bytes:lang:' || {row}.language",
+    "cat":    "'bytes:cat:' || COALESCE({row}.data_category, 'raw_text')",
+}
+
+
+def _storage_bumps(row: str, sign: str) -> str:
+    return "\n        ".join(_BUMP.format(key=k.format(row=row), delta=f"{sign}{row}.storage_bytes")
+                           for k in _STORAGE_KEYS.values())
+
+
+STORAGE_SCHEMA = [
+    f"""CREATE TRIGGER IF NOT EXISTS storage_submissions_ai AFTER INSERT ON submissions
+    WHEN new.storage_bytes != 0 BEGIN
+        {_storage_bumps("new", "")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS storage_submissions_au
+    AFTER UPDATE OF status, language, data_category, storage_bytes ON submissions
+    WHEN old.status IS NOT new.status OR old.language IS NOT new.language
+      OR old.data_category IS NOT new.data_category OR old.storage_bytes != new.storage_bytes BEGIN
+        {_storage_bumps("old", "-")}
+        {_storage_bumps("new", "")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS storage_submissions_ad AFTER DELETE ON submissions
+    WHEN old.storage_bytes != 0 BEGIN
+        {_storage_bumps("old", "-")}
+    END""",
+]
+
+
+def rebuild_counters(conn):
+    """Recompute every counter from the base tables (migration / repair)."""
+    conn.execute("DELETE FROM stats_counters WHERE key LIKE 'status:%' OR key LIKE 'lang:%' "
+                 "OR key IN ('contributors', 'feedbacks')")
+    conn.execute("DELETE FROM contributor_counts")
+    conn.execute("""INSERT INTO contributor_counts (email, submissions)
+                    SELECT contributor_email, COUNT(*) FROM submissions GROUP BY contributor_email""")
+    conn.execute("""INSERT INTO stats_counters (key, value)
+                    SELECT 'status:' || status, COUNT(*) FROM submissions GROUP BY status""")
+    conn.execute("""INSERT INTO stats_counters (key, value)
+                    SELECT 'lang:' || language, COUNT(*) FROM submissions GROUP BY language""")
+    conn.execute("INSERT INTO stats_counters (key, value) SELECT 'contributors', COUNT(*) FROM contributor_counts")
+    conn.execute("INSERT INTO stats_counters (key, value) SELECT 'feedbacks', COUNT(*) FROM feedbacks")
+
+
+def rebuild_storage_counters(conn):
+    """Recompute the bytes:* counters from submissions.storage_bytes."""
+    conn.execute("DELETE FROM stats_counters WHERE key LIKE 'bytes:%' AND key != 'bytes:blobs'")
+    for key in _STORAGE_KEYS.values():
+        expr = key.format(row="submissions")
+        conn.execute(f"""INSERT INTO stats_counters (key, value)
+                         SELECT {expr}, SUM(storage_bytes) FROM submissions GROUP BY {expr}""")
+
+
+def read_counters(conn) -> dict:
+    return {r["key"]: r["value"] for r in conn.execute("SELECT key, value FROM stats_counters")}
@@ -0,0 +1,166 @@
+"""Storage usage accounting.
+
+Bytes are recorded per submission (submissions.storage_bytes, the
+logical size of its files) when they are written, and triggers in
+stats.py roll them up per status, language and category, so the admin
+storage view is a handful of counter reads. Physical usage, after
+deduplication, is the blob store's "bytes:blobs" counter.
+
+StorageReconciler runs off the request path (leader worker only, every
+STORAGE_RECONCILE_INTERVAL seconds). It corrects submission sizes and
+blob refcounts that drifted, reports blob files no row knows about and
+submission folders left from the pre-blob-store layout, and recomputes
+the counters. The schedule is kept in app_meta, so a restart only runs it
+when the last run is older than the interval (or there was none, as right
+after the storage migration). Refcounts are counted from a read snapshot
+and corrected by delta in a short write transaction, so uploads are not
+blocked behind the scan.
+"""
+import json, os, threading, time
+from datetime import datetime
+from pathlib import Path
+
+from . import stats as counters
+from .leader import LeaderLock
+
+STORAGE_RECONCILE_INTERVAL = float(os.getenv("STORAGE_RECONCILE_INTERVAL", str(24 * 3600)))
+LEGACY_DIRS = ("pending", "approved", "rejected")
+
+
+def read_usage(conn) -> dict:
+    """Totals and per-status/language/category breakdowns from the counters."""
+    usage = {"by_status": {}, "by_language": {}, "by_category": {}}
+    names = {"status": "by_status", "lang": "by_language", "cat": "by_category"}
+    usage["blob_bytes"] = 0
+    for r in conn.execute("SELECT key, value FROM stats_counters WHERE key LIKE 'bytes:%'"):
+        if r["key"] == "bytes:blobs":
+            usage["blob_bytes"] = r["value"]
+            continue
+        _, kind, name = r["key"].split(":", 2)
+        usage[names[kind]][name] = r["value"]
+    usage["total_bytes"] = sum(usage["by_status"].values())
+    row = conn.execute("SELECT value FROM app_meta WHERE key='storage_reconcile_last_run'").fetchone()
+    usage["last_reconcile"] = json.loads(row["value"]) if row else None
+    return usage
+
+
+class StorageReconciler:
+    def __init__(self, get_conn, storage: Path, blobs, lock_path: Path, batch_size: int = 500):
+        self.get_conn = get_conn
+        self.storage = Path(storage)
+        self.blobs = blobs
+        self.leader = LeaderLock(lock_path)
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+    def run_once(self) -> dict:
+        started = time.monotonic()
+        metrics = {"started_at": datetime.utcnow().isoformat(), "corrected": 0, "refcounts_fixed": 0,
+                   "orphan_blobs": 0, "orphan_bytes": 0, "legacy_dirs": 0}
+        conn = self.get_conn()
+        try:
+            # Pass 1: each submission's size (blobs are immutable, so no lock is needed)
+            after = ""
+            while True:
+                rows = conn.execute("SELECT id, file_paths, storage_bytes FROM submissions WHERE id > ? "
+                                    "ORDER BY id LIMIT ?", (after, self.batch_size)).fetchall()
+                fixes = []
+                for r in rows:
+                    paths = json.loads(r["file_paths"] or "[]")
+                    size = sum(self._file_size(p) for p in paths)
+                    if size != r["storage_bytes"]:
+                        fixes.append((size, r["id"]))
+                conn.executemany("UPDATE submissions SET storage_bytes=? WHERE id=?", fixes)
+                conn.commit()
+                metrics["corrected"] += len(fixes)
+                if len(rows) < self.batch_size:
+                    break
+                after = rows[-1]["id"]
+
+            # Pass 2: blob refcounts, counted from one read snapshot without the write lock.
+            # Writers since then moved refcounts by +1/-1 along with their rows, so the drift
+            # seen in the snapshot is applied as a delta rather than as an absolute value.
+            conn.execute("BEGIN")
+            refs = {}
+            for r in conn.execute("SELECT j.value AS path FROM submissions, json_each(submissions.file_paths) j"):
+                key = self.blobs.key_of(r["path"])
+                if key:
+                    refs[key] = refs.get(key, 0) + 1
+            known = set()
+            drift = []
+            for r in conn.execute("SELECT key, refcount FROM blobs").fetchall():
+                known.add(r["key"])
+                expected = refs.get(r["key"], 0)
+                if r["refcount"] != expected:
+                    drift.append((expected - r["refcount"], time.time(), r["key"]))
+            conn.commit()
+            if drift:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("UPDATE blobs SET refcount = refcount + ?, touched_at=? WHERE key=?", drift)
+                conn.commit()
+            metrics["refcounts_fixed"] = len(drift)
+
+            # Pass 3: files on disk that nothing accounts for
+            if self.blobs.root.exists():
+                for shard in self.blobs.root.iterdir():
+                    if shard.name.startswith(".") or not shard.is_dir():
+                        continue
+                    for sub in shard.iterdir():
+                        for blob in sub.iterdir():
+                            if blob.name not in known:
+                                metrics["orphan_blobs"] += 1
+                                metrics["orphan_bytes"] += self._file_size(blob)
+            for name in LEGACY_DIRS:
+                base = self.storage / name
+                if base.exists():
+                    metrics["legacy_dirs"] += sum(1 for lang in base.iterdir() if lang.is_dir()
+                                                  for d in lang.iterdir() if d.is_dir())
+
+            # Counters are trigger-maintained; recompute them in case anything bypassed the triggers
+            counters.rebuild_storage_counters(conn)
+            conn.execute("DELETE FROM stats_counters WHERE key='bytes:blobs'")
+            conn.execute("INSERT INTO stats_counters (key, value) SELECT 'bytes:blobs', COALESCE(SUM(size), 0) FROM blobs")
+            metrics["elapsed_s"] = round(time.monotonic() - started, 3)
+            conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('storage_reconcile_last_run', ?)",
+                         (json.dumps(metrics),))
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"[STORAGE] Reconciled: {metrics['corrected']} size(s) and {metrics['refcounts_fixed']} refcount(s) "
+              f"corrected, {metrics['orphan_blobs']} orphaned blob(s) ({metrics['orphan_bytes']} bytes), "
+              f"{metrics['legacy_dirs']} legacy folder(s)")
+        return metrics
+
+    def due_in(self, interval: float) -> float:
+        """Seconds until the next run is due (<= 0 when due); a run is due if none was recorded."""
+        conn = self.get_conn()
+        try:
+            row = conn.execute("SELECT value FROM app_meta WHERE key='storage_reconcile_last_run'").fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return 0
+        last = datetime.fromisoformat(json.loads(row["value"])["started_at"])
+        return interval - (datetime.utcnow() - last).total_seconds()
+
+    def _loop(self, interval: float):
+        while True:
+            wait = interval
+            try:
+                if self.leader.held():
+                    wait = self.due_in(interval)
+                    if wait <= 0:
+                        self.run_once()
+                        wait = interval
+            except Exception as e:
+                print(f"[STORAGE] Reconcile error: {e}")
+            time.sleep(min(max(wait, 60), interval))
+
+    def start(self, interval: float = STORAGE_RECONCILE_INTERVAL):
+        threading.Thread(target=self._loop, args=(interval,), name="storage-reconcile", daemon=True).start()
@@ -0,0 +1 @@
+"""Benchmarks and load tests. Run from the repo root, e.g. python -m bench.public_stats_p99."""
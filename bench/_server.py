@@ -0,0 +1,125 @@
+"""Start the app the way Render does (Procfile) against a throwaway DATA_DIR."""
+import atexit, contextlib, os, shutil, signal, socket, subprocess, sys, tempfile, time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+from jose import jwt
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Benchmarks measure the app, not the per-client limits in front of it
+UNLIMITED = {
+    "RATE_SUBMIT_IP": "1000000/1",
+    "RATE_SUBMIT_EMAIL": "1000000/1",
+    "RATE_FEEDBACK_IP": "1000000/1",
+    "RATE_FEEDBACK_EMAIL": "1000000/1",
+}
+JWT_SECRET = "bench-secret"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(env: dict = None, workers: int = 2, log=None):
+    """Run gunicorn with uvicorn workers; yields (base_url, data_dir).
+
+    The server gets its own process group, so the extraction pools and
+    forkserver it starts go down with it.
+    """
+    with tempfile.TemporaryDirectory(prefix="mozhii-bench-") as data_dir:
+        port = _free_port()
+        full_env = dict(os.environ, DATA_DIR=data_dir, STATIC_BUILD=os.path.join(data_dir, "static"),
+                        JWT_SECRET=JWT_SECRET, **UNLIMITED)
+        full_env.update(env or {})
+        cmd = [sys.executable, "-m", "gunicorn", "backend.main:app", "-w", str(workers),
+               "-k", "uvicorn.workers.UvicornWorker", "--bind", f"127.0.0.1:{port}", "--timeout", "120",
+               "--pid", os.path.join(data_dir, "gunicorn.pid")]
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=full_env, start_new_session=True,
+                                stdout=log or subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server exited with {proc.returncode}")
+                try:
+                    if httpx.get(base + "/api/public-stats", timeout=2).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("server did not start within 60s")
+                time.sleep(0.2)
+            yield base, Path(data_dir)
+        finally:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(proc.pid, signal.SIGTERM)
+            try:
+                proc.wait(15)
+            except subprocess.TimeoutExpired:
+                pass
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(proc.pid, signal.SIGKILL)
+
+
+def in_process_app():
+    """Import backend.main against a throwaway DATA_DIR, removed at exit.
+
+    Call before anything else imports backend.main.
+    """
+    data_dir = tempfile.mkdtemp(prefix="mozhii-bench-")
+    # Registered first so it runs last, after main's own atexit flushes
+    atexit.register(shutil.rmtree, data_dir, True)
+    os.environ["DATA_DIR"] = data_dir
+    os.environ.setdefault("STATIC_BUILD", os.path.join(data_dir, "static"))
+    from backend import main
+    return main
+
+
+def server_processes(data_dir) -> list:
+    """PIDs of a serve() server: the gunicorn master and everything in its process group."""
+    master = int((Path(data_dir) / "gunicorn.pid").read_text())
+    pids = []
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                if os.getpgid(int(entry.name)) == master:
+                    pids.append(int(entry.name))
+            except ProcessLookupError:
+                pass
+    return sorted(pids)
+
+
+def peak_rss_mb(pid: int) -> int:
+    """VmHWM of a process in MB (0 once it has exited)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return 0
+
+
+def admin_headers(username: str = "Vipooshan") -> dict:
+    """Authorization for the admin API of a server started by serve()."""
+    token = jwt.encode({"sub": username, "exp": datetime.utcnow() + timedelta(hours=1)}, JWT_SECRET, algorithm="HS256")
+    return {"Authorization": "Bearer " + token}
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def submit_form(n: int, language: str = "english") -> dict:
+    return {"language": language, "contributor_name": f"Bench {n}",
+            "contributor_email": f"bench{n}@example.com", "consent": "true"}
@@ -0,0 +1,86 @@
+"""Honest uploaders vs abusive clients under the real admission limits.
+
+    python -m bench.admission_load [--honest 40] [--abusers 5] [--seconds 20] [--size-mb 2]
+
+Starts the app as the Procfile does with the per-IP submit limit at
+--rate (the production default unless overridden). --honest clients, each
+behind its own X-Forwarded-For address, post two --size-mb uploads and
+honour Retry-After on 429/503. Meanwhile --abusers clients share one
+address and post back to back for --seconds, ignoring Retry-After.
+Reports honest latency including waits and every status both sides got.
+"""
+import argparse, asyncio, collections, os, time
+
+import httpx
+
+from ._server import percentile, serve, submit_form
+
+
+async def post(client, base, ip, n, payload):
+    files = [("files", (f"{ip}-{n}.txt", payload, "text/plain"))]
+    return await client.post(base + "/api/submit", data=submit_form(ip, language="tamil"), files=files,
+                             headers={"X-Forwarded-For": f"10.0.{ip // 250}.{ip % 250}"})
+
+
+async def honest(client, base, ip, payload, codes, latencies):
+    for n in range(2):
+        start = time.perf_counter()
+        while True:
+            try:
+                r = await post(client, base, ip, n, payload)
+            except httpx.HTTPError as e:
+                codes[type(e).__name__] += 1
+                break
+            codes[r.status_code] += 1
+            if r.status_code in (429, 503):
+                await asyncio.sleep(float(r.headers.get("retry-after", "1")))
+                continue
+            break
+        latencies.append(time.perf_counter() - start)
+
+
+async def abuse(client, base, ip, payload, until, codes):
+    n = 0
+    while time.monotonic() < until:
+        try:
+            r = await post(client, base, ip, n, payload)
+            codes[r.status_code] += 1
+        except httpx.HTTPError as e:
+            codes[type(e).__name__] += 1
+        n += 1
+
+
+async def run(base, args):
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    honest_codes, abuser_codes, latencies = collections.Counter(), collections.Counter(), []
+    until = time.monotonic() + args.seconds
+    limits = httpx.Limits(max_connections=args.honest + args.abusers + 10)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[honest(client, base, ip, payload, honest_codes, latencies)
+                               for ip in range(1, args.honest + 1)],
+                             *[abuse(client, base, 10_000, payload, until, abuser_codes) for _ in range(args.abusers)])
+        wall = time.perf_counter() - start
+    print(f"wall {wall:.1f}s; honest responses {dict(honest_codes)}")
+    print("honest submit incl. retries: p50 %.2fs  p95 %.2fs  max %.2fs  (n=%d)" % (
+        percentile(latencies, 0.5), percentile(latencies, 0.95), max(latencies, default=float("nan")),
+        len(latencies)))
+    print(f"abusers (ignore Retry-After, one address): {dict(abuser_codes)}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--honest", type=int, default=40)
+    ap.add_argument("--abusers", type=int, default=5)
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--size-mb", type=int, default=2)
+    ap.add_argument("--rate", default="20/3600", help="RATE_SUBMIT_IP for the server")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    args = ap.parse_args()
+
+    with serve(env={"RATE_SUBMIT_IP": args.rate}, workers=args.workers) as (base, _):
+        asyncio.run(run(base, args))
+
+
+if __name__ == "__main__":
+    main()
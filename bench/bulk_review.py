@@ -0,0 +1,100 @@
+"""Approving N submissions: one bulk request vs N single approve calls.
+
+    python -m bench.bulk_review [--n 100] [--workers 2]
+
+Starts the app as the Procfile does, seeds 2 x --n submissions that each
+carry a small text file, and waits until analysis has made them all
+PENDING. Then approves the first --n with one POST
+/api/admin/submissions/bulk and the other --n with sequential POST
+/api/admin/submission/{id}/approve calls, and reports wall time and what
+each path cost the disk, from /metrics:
+
+- commits: SQLite COMMITs (sqlite_query_duration_seconds, op="COMMIT").
+  In WAL mode with synchronous=NORMAL these do not fsync themselves.
+- shard appends: export_append stages, each of which fsyncs the shard it
+  writes.
+
+Background pollers (ingest, outbox, HF pushes) are slowed right down so
+their own commits stay out of the counts.
+"""
+import argparse, re, time
+
+import httpx
+
+from ._server import admin_headers, serve, submit_form
+
+QUIET = {
+    "METRICS_FLUSH_INTERVAL": "0.2",
+    "INGEST_POLL_INTERVAL": "3600",  # submits still wake their worker
+    "EXPORT_OUTBOX_INTERVAL": "3600",
+    "HF_WORKERS": "0",
+}
+COMMIT_RE = re.compile(r'^mozhii_sqlite_query_duration_seconds_count\{op="COMMIT"[^}]*\} (\S+)$', re.M)
+APPEND_RE = re.compile(r'^mozhii_stage_duration_seconds_count\{stage="export_append"\} (\S+)$', re.M)
+
+
+def seed(client, n):
+    sids = []
+    for i in range(n):
+        text = f"Bulk review benchmark submission {i}: " + " ".join(f"word{i}-{j}" for j in range(40))
+        r = client.post("/api/submit", data={**submit_form(i), "text_content": text},
+                        files=[("files", (f"notes-{i}.txt", f"Attached notes for submission {i}\n" * 20,
+                                          "text/plain"))])
+        r.raise_for_status()
+        sids.append(r.json()["submission_id"])
+    waiting = set(sids)
+    deadline = time.monotonic() + 300
+    while waiting:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{len(waiting)} submissions still not PENDING after 300s")
+        waiting = {sid for sid in waiting if client.get(f"/api/submit/{sid}/status").json()["status"] == "received"}
+        time.sleep(0.2)
+    return sids
+
+
+def disk_counts(client):
+    # Let every worker flush its metrics file first
+    time.sleep(0.5)
+    body = client.get("/metrics").text
+    return (sum(float(v) for v in COMMIT_RE.findall(body)),
+            sum(float(v) for v in APPEND_RE.findall(body)))
+
+
+def measure(client, func):
+    commits, appends = disk_counts(client)
+    start = time.perf_counter()
+    func()
+    wall = time.perf_counter() - start
+    after_commits, after_appends = disk_counts(client)
+    return wall, int(after_commits - commits), int(after_appends - appends)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--n", type=int, default=100, help="submissions per path (bulk allows up to 200)")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    args = ap.parse_args()
+
+    with serve(env=QUIET, workers=args.workers) as (base, _):
+        with httpx.Client(base_url=base, timeout=120) as client:
+            sids = seed(client, 2 * args.n)
+            bulk_ids, single_ids = sids[:args.n], sids[args.n:]
+            headers = admin_headers()
+
+            def bulk():
+                r = client.post("/api/admin/submissions/bulk", headers=headers,
+                                json={"action": "approve", "ids": bulk_ids})
+                r.raise_for_status()
+                assert r.json()["processed"] == len(bulk_ids), r.text
+
+            def sequential():
+                for sid in single_ids:
+                    client.post(f"/api/admin/submission/{sid}/approve", headers=headers).raise_for_status()
+
+            for name, func in (("bulk request", bulk), (f"{args.n} approve calls", sequential)):
+                wall, commits, appends = measure(client, func)
+                print(f"{name:20s} wall {wall * 1000:8.1f}ms  commits {commits:4d}  shard appends (fsyncs) {appends:4d}")
+
+
+if __name__ == "__main__":
+    main()
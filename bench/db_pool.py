@@ -0,0 +1,105 @@
+"""Per-request connection overhead: sqlite3.connect per call vs ConnectionPool.
+
+    python -m bench.db_pool [--calls 20000] [--threads 1,8] [--http-seconds 10]
+
+Part one times what a handler pays around its query, acquire + one
+SELECT COUNT(*) + release, on a throwaway database with --rows
+submissions. "connect" is the old get_db (connect, row_factory, PRAGMA
+journal_mode=WAL, close). "pooled" is ConnectionPool.acquire/close.
+
+Part two (skip with --http-seconds 0) starts the app as the Procfile does
+and drives the dashboard endpoints, which run several queries per request,
+from concurrent clients.
+"""
+import argparse, asyncio, sqlite3, tempfile, threading, time
+from pathlib import Path
+
+import httpx
+
+from backend.db import ConnectionPool
+
+from ._server import admin_headers, percentile, serve
+
+
+def old_get_db(path):
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def make_db(path, rows):
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE submissions (id TEXT PRIMARY KEY, status TEXT, text_content TEXT)")
+    conn.executemany("INSERT INTO submissions VALUES (?, 'PENDING', ?)",
+                     ((f"MZH-{i:08d}", "x" * 200) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def per_call(open_conn, calls, threads):
+    """Mean microseconds per acquire + query + release, over calls split across threads."""
+    def work(n):
+        for _ in range(n):
+            conn = open_conn()
+            conn.execute("SELECT COUNT(*) FROM submissions WHERE status='PENDING'").fetchone()
+            conn.close()
+    workers = [threading.Thread(target=work, args=(calls // threads,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return (time.perf_counter() - start) / (calls // threads * threads) * 1e6
+
+
+async def drive(base, headers, seconds, clients):
+    latencies, errors = [], 0
+    until = time.monotonic() + seconds
+    paths = ["/api/public-stats", "/api/admin/stats", "/api/admin/submissions?limit=20"]
+
+    async def client(c, i):
+        nonlocal errors
+        while time.monotonic() < until:
+            t = time.perf_counter()
+            r = await c.get(base + paths[i % len(paths)], headers=headers)
+            latencies.append(time.perf_counter() - t)
+            errors += r.status_code != 200
+            i += 1
+
+    async with httpx.AsyncClient(timeout=30) as c:
+        await asyncio.gather(*[client(c, i) for i in range(clients)])
+    return latencies, errors
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--calls", type=int, default=20000)
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--threads", default="1,8")
+    ap.add_argument("--http-seconds", type=float, default=10)
+    ap.add_argument("--clients", type=int, default=16)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        make_db(path, args.rows)
+        pool = ConnectionPool(path)
+        for threads in map(int, args.threads.split(",")):
+            connect = per_call(lambda: old_get_db(path), args.calls, threads)
+            pooled = per_call(pool.acquire, args.calls, threads)
+            print(f"{threads} thread(s): connect-per-call {connect:7.1f}us  pooled {pooled:7.1f}us  "
+                  f"({connect / pooled:.0f}x)")
+        pool.close_all()
+
+    if args.http_seconds > 0:
+        with serve() as (base, _):
+            latencies, errors = asyncio.run(drive(base, admin_headers(), args.http_seconds, args.clients))
+        ms = [x * 1000 for x in latencies]
+        print(f"HTTP, {args.clients} clients: {len(ms) / args.http_seconds:.0f} req/s  "
+              f"p50 {percentile(ms, 0.5):.1f}ms  p99 {percentile(ms, 0.99):.1f}ms  non-200: {errors}")
+
+
+if __name__ == "__main__":
+    main()
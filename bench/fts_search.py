@@ -0,0 +1,80 @@
+"""Admin search at 100k+ submissions: the FTS5 path vs the LIKE scan it replaced.
+
+    python -m bench.fts_search [--rows 100000] [--repeat 5]
+
+Fills a throwaway database with --rows submissions of 30-120 random
+Tamil/Sinhala/English words (one in 1000 carries a rare term), then times
+the endpoint's own query builder against the old LIKE '%term%' over name,
+text and ID (count + first page, as the old handler ran). Inserts go
+through the FTS sync triggers, so the fill time includes their overhead.
+"""
+import argparse, random, time
+
+from ._server import in_process_app
+
+WORDS = ("தமிழ் மொழி உலகின் பழமையான மொழிகளில் ஒன்றாகும் இலங்கை இந்தியா பேசப்படுகிறது "
+         "ශ්‍රී ලංකාව සිංහල භාෂාව language ancient history culture poem village river").split()
+RARE = "கம்பராமாயணம்"
+
+LIKE_COUNT = ("SELECT COUNT(*) FROM submissions "
+              "WHERE (contributor_name LIKE ? OR text_content LIKE ? OR id LIKE ?)")
+LIKE_PAGE = ("SELECT * FROM submissions WHERE (contributor_name LIKE ? OR text_content LIKE ? OR id LIKE ?) "
+             "ORDER BY created_at DESC LIMIT 15")
+
+
+def fill(conn, rows, seed=5):
+    rnd = random.Random(seed)
+    batch = []
+    for i in range(rows):
+        text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(30, 120)))
+        if i % 1000 == 0:
+            text += " " + RARE
+        batch.append((f"MZH-{i:08X}", rnd.choice(["tamil", "sinhala", "english"]), "PENDING",
+                      f"name{i}", "bench@example.com", text, f"2025-01-01T00:{i % 60:02d}:{i % 60:02d}.{i:06d}"))
+    conn.executemany("INSERT INTO submissions (id, language, status, contributor_name, contributor_email, "
+                     "text_content, created_at) VALUES (?,?,?,?,?,?,?)", batch)
+    conn.commit()
+
+
+def timed(repeat, func):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    app = in_process_app()
+    conn = app.get_db()
+    try:
+        start = time.perf_counter()
+        fill(conn, args.rows)
+        print(f"inserted {args.rows} submissions (with FTS triggers) in {time.perf_counter() - start:.1f}s")
+
+        def fts(term):
+            count_sql, count_params, query, params = app.submission_list_sql(search=term, limit=15)
+            total = conn.execute(count_sql, count_params).fetchone()["c"]
+            conn.execute(query, params).fetchall()
+            return total
+
+        def like(term):
+            pattern = f"%{term}%"
+            total = conn.execute(LIKE_COUNT, (pattern,) * 3).fetchone()[0]
+            conn.execute(LIKE_PAGE, (pattern,) * 3).fetchall()
+            return total
+
+        for label, term in [("rare term", RARE), ("contributor name", "name123"), ("term in ~all rows", "மொழி")]:
+            fts_ms, fts_hits = timed(args.repeat, lambda: fts(term))
+            like_ms, like_hits = timed(args.repeat, lambda: like(term))
+            print(f"{label:18s} FTS {fts_ms:7.1f}ms ({fts_hits} hits)   LIKE {like_ms:7.1f}ms ({like_hits} hits)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
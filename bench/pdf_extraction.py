@@ -0,0 +1,100 @@
+"""Full-document PDF extraction: page-parallel pool runs, the page cache and scan detection.
+
+    python -m bench.pdf_extraction [--pages 200 1000] [--workers 1 2 4] [--scanned 50]
+
+For each generated text PDF, times the old first-five-pages read, a
+serial full extraction (extract_text_from_file) and ExtractionExecutor.extract_pdf
+with each --workers count: cold, again with the whole-file entry and three
+pages dropped from the cache (only those pages are re-parsed), and a
+whole-file cache hit through extract_text. Then a --scanned page image-only
+PDF must come back as scanned.
+"""
+import argparse, asyncio, os, tempfile, time
+
+from ._server import in_process_app
+from .pdfgen import make_pdf
+
+
+def first_five_pages(path: str) -> str:
+    """What extract_text_from_file returned before full-document extraction."""
+    from PyPDF2 import PdfReader
+    text = ""
+    for page in PdfReader(path).pages[:5]:
+        text += page.extract_text() or ""
+    return text[:5000]
+
+
+def elapsed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--pages", type=int, nargs="+", default=[200, 1000])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--scanned", type=int, default=50)
+    args = ap.parse_args()
+
+    app = in_process_app()
+    from backend.extraction import ExtractionCache, ExtractionExecutor, extract_text_from_file
+
+    workdir = tempfile.mkdtemp(prefix="mozhii-pdf-", dir=str(app.DATA_DIR))
+    for pages in args.pages:
+        path = os.path.join(workdir, f"text-{pages}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(pages, seed=pages))
+        t_old, old = elapsed(lambda: first_five_pages(path))
+        t_serial, serial = elapsed(lambda: extract_text_from_file(path))
+        print(f"{pages} pages ({os.path.getsize(path) // 1024}KB): first 5 pages {t_old:.2f}s -> {len(old)} chars; "
+              f"full serial {t_serial:.2f}s -> {len(serial)} chars")
+
+        for workers in args.workers:
+            executor = ExtractionExecutor(workers=workers, timeout=300)
+            executor.cache = ExtractionCache(app.get_db)
+            digest = f"bench-{pages}-{workers}"
+
+            async def run():
+                t_cold, cold = await timed(executor.extract_pdf(path, digest))
+                conn = app.get_db()
+                try:
+                    dropped = [digest] + [f"{digest}:{i}" for i in (3, pages // 2, pages - 1)]
+                    conn.execute(f"DELETE FROM extraction_cache WHERE hash IN ({','.join('?' * len(dropped))})",
+                                 dropped)
+                    conn.commit()
+                finally:
+                    conn.close()
+                t_partial, partial = await timed(executor.extract_pdf(path, digest))
+                t_hit, _ = await timed(executor.extract_text(path, digest))
+                return t_cold, cold, t_partial, partial, t_hit
+
+            try:
+                t_cold, cold, t_partial, partial, t_hit = asyncio.run(run())
+            finally:
+                executor.shutdown()
+            same = cold["text"] == partial["text"] == serial
+            print(f"  workers={workers}: cold {t_cold:.2f}s, 3 pages re-parsed {t_partial:.3f}s, "
+                  f"whole-file hit {t_hit * 1000:.1f}ms, same text as serial: {same}, scanned={cold['scanned']}")
+
+    if args.scanned:
+        path = os.path.join(workdir, f"scanned-{args.scanned}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(args.scanned, scanned=True))
+        executor = ExtractionExecutor(workers=max(args.workers))
+        try:
+            t_scan, result = elapsed(lambda: asyncio.run(executor.extract_pdf(path)))
+        finally:
+            executor.shutdown()
+        print(f"{args.scanned} scanned pages: {t_scan:.2f}s, {result['image_only_pages']} image-only, "
+              f"scanned={result['scanned']}")
+
+
+if __name__ == "__main__":
+    main()
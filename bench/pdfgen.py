@@ -0,0 +1,51 @@
+"""Synthetic PDFs for the extraction benchmarks, written without any PDF library."""
+import random, zlib
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua").split()
+
+
+def make_pdf(pages: int, scanned: bool = False, lines: int = 45, seed: int = 0) -> bytes:
+    """A PDF of pages pages: lines of text each, or (scanned) one full-page image and no text."""
+    rnd = random.Random(seed)
+    objs = []  # object bodies; object ids are 1-based
+
+    def add(body: bytes) -> int:
+        objs.append(body)
+        return len(objs)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pixels = zlib.compress(bytes(rnd.randrange(256) for _ in range(200 * 200)))
+    image = add(b"<< /Type /XObject /Subtype /Image /Width 200 /Height 200 /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n" % len(pixels)
+                + pixels + b"\nendstream")
+    pages_id = add(b"")  # filled in once the kids exist
+    kids = []
+    for _ in range(pages):
+        if scanned:
+            content = b"q 500 0 0 700 50 50 cm /Im1 Do Q"
+        else:
+            parts = [b"BT /F1 10 Tf 50 780 Td 12 TL"]
+            for _ in range(lines):
+                parts.append(b"(" + " ".join(rnd.choice(WORDS) for _ in range(12)).encode() + b") '")
+            parts.append(b"ET")
+            content = b"\n".join(parts)
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+                        b"/Resources << /Font << /F1 %d 0 R >> /XObject << /Im1 %d 0 R >> >> "
+                        b"/Contents %d 0 R >>" % (pages_id, font, image, stream)))
+    objs[pages_id - 1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids)
+                          + b"] /Count %d >>" % pages)
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, catalog, xref)
+    return bytes(out)
@@ -0,0 +1,82 @@
+"""p50/p99 latency of /api/public-stats, idle and while PDF uploads are extracted.
+
+    python -m bench.public_stats_p99 [--seconds 20] [--uploaders 4] [--pages 60]
+
+Starts the app as the Procfile does (gunicorn, 2 uvicorn workers) on a
+temporary DATA_DIR. Pollers hit /api/public-stats back to back, first on
+an idle server and then while uploaders keep posting multi-page PDFs,
+whose extraction runs in the ingest worker's process pool.
+"""
+import argparse, asyncio, collections, time
+
+import httpx
+
+from ._server import percentile, serve, submit_form
+from .pdfgen import make_pdf
+
+
+async def poll(client, base, until, latencies):
+    while time.monotonic() < until:
+        t = time.perf_counter()
+        r = await client.get(base + "/api/public-stats")
+        r.raise_for_status()
+        latencies.append(time.perf_counter() - t)
+
+
+async def upload(client, base, until, pdfs, n, codes):
+    i = 0
+    while time.monotonic() < until:
+        name, data = pdfs[i % len(pdfs)]
+        files = [("files", (f"{n}-{i}-{name}", data, "application/pdf"))]
+        try:
+            r = await client.post(base + "/api/submit", data=submit_form(n), files=files)
+            codes[r.status_code] += 1
+            if r.status_code in (429, 503):
+                await asyncio.sleep(float(r.headers.get("retry-after", "1")))
+        except httpx.HTTPError as e:
+            codes[type(e).__name__] += 1
+        i += 1
+
+
+async def phase(base, seconds, pollers, uploaders, pdfs):
+    latencies, codes = [], collections.Counter()
+    until = time.monotonic() + seconds
+    async with httpx.AsyncClient(timeout=60) as client:
+        await asyncio.gather(*[poll(client, base, until, latencies) for _ in range(pollers)],
+                             *[upload(client, base, until, pdfs, n, codes) for n in range(uploaders)])
+    return latencies, codes
+
+
+def report(label, latencies, codes=None):
+    ms = [x * 1000 for x in latencies]
+    line = "%-16s n=%-6d p50 %7.1fms  p99 %7.1fms  max %7.1fms" % (
+        label, len(ms), percentile(ms, 0.50), percentile(ms, 0.99), max(ms, default=float("nan")))
+    if codes:
+        line += "  uploads " + ", ".join(f"{k}: {v}" for k, v in sorted(codes.items(), key=str))
+    print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--pollers", type=int, default=4)
+    ap.add_argument("--uploaders", type=int, default=4)
+    ap.add_argument("--pages", type=int, default=60)
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    args = ap.parse_args()
+
+    # Different seeds, so the extraction cache can't answer for repeats within a round
+    pdfs = [(f"doc{s}.pdf", make_pdf(args.pages, seed=s)) for s in range(8)]
+    print(f"{len(pdfs)} PDFs of {args.pages} pages, {sum(len(d) for _, d in pdfs) // len(pdfs) // 1024} KB each")
+    with serve(workers=args.workers) as (base, _):
+        report("idle", *asyncio.run(phase(base, args.seconds, args.pollers, 0, pdfs))[:1])
+        report("during uploads", *asyncio.run(phase(base, args.seconds, args.pollers, args.uploaders, pdfs)))
+        # Extraction work left behind by the uploads still counts against the pool
+        metrics = httpx.get(base + "/metrics").text
+        for line in metrics.splitlines():
+            if line.startswith(("mozhii_extract_timeouts_total", "mozhii_ingest_jobs")):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""A burst of large uploads at once: admission outcome, latency and worker memory.
+
+    python -m bench.upload_burst [--clients 150] [--size-mb 8]
+
+Starts the app as the Procfile does and fires --clients simultaneous
+--size-mb uploads, each from its own X-Forwarded-For address so the
+per-IP limit stays out of the way. Uploads past UPLOAD_SLOTS should get
+503 with Retry-After, quickly and without their bodies being spooled.
+Afterwards prints the peak RSS (VmHWM) of every server process, which
+should stay near its idle size rather than grow with the burst.
+"""
+import argparse, asyncio, collections, os, time
+
+import httpx
+
+from ._server import peak_rss_mb, percentile, serve, server_processes, submit_form
+
+
+async def post(client, base, n, payload):
+    start = time.perf_counter()
+    files = [("files", (f"burst-{n}.txt", payload, "text/plain"))]
+    try:
+        r = await client.post(base + "/api/submit", data=submit_form(n), files=files,
+                              headers={"X-Forwarded-For": f"10.1.{n // 250}.{n % 250}"})
+        return r.status_code, time.perf_counter() - start
+    except httpx.HTTPError as e:
+        return type(e).__name__, time.perf_counter() - start
+
+
+async def burst(base, clients, payload):
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=clients + 10)) as client:
+        return await asyncio.gather(*[post(client, base, n, payload) for n in range(clients)])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--clients", type=int, default=150)
+    ap.add_argument("--size-mb", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    args = ap.parse_args()
+
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    with serve(workers=args.workers) as (base, data_dir):
+        idle = {pid: peak_rss_mb(pid) for pid in server_processes(data_dir)}
+        start = time.perf_counter()
+        results = asyncio.run(burst(base, args.clients, payload))
+        wall = time.perf_counter() - start
+        peak = {pid: peak_rss_mb(pid) for pid in server_processes(data_dir)}
+
+    outcomes = collections.Counter(code for code, _ in results)
+    print(f"burst of {args.clients} x {args.size_mb}MB: wall {wall:.1f}s {dict(outcomes)}")
+    for code in sorted(outcomes, key=str):
+        latencies = [t for c, t in results if c == code]
+        print(f"  {code}: p50 {percentile(latencies, 0.5):.2f}s  max {max(latencies):.2f}s")
+    # Processes started during the burst (extraction pool workers) have no idle figure
+    print("  peak RSS per server process (MB), idle -> after burst:",
+          ", ".join(f"{idle.get(pid, '-')}->{rss}" for pid, rss in sorted(peak.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -212,6 +212,7 @@ function renderSubmissions(submissions, total) {
             <td>
                 <div style="font-weight:500">${s.contributor_name}</div>
                 <div style="font-size:12px;color:var(--text-muted)">${maskedEmail}</div>
+                ${s.snippet ? `<div class="search-snippet">${renderSnippet(s.snippet)}</div>` : ""}
             </td>
             <td><span class="status-badge status-${s.status}">${s.status}</span></td>
             <td style="font-size:13px;color:var(--text-muted)">${date}</td>
@@ -242,6 +243,30 @@ function goToPage(page) {
     loadSubmissions();
 }
 
+/* ── Image thumbnails ───────────────────────────────────────── */
+// <img> can't send the Authorization header, so thumbnails are fetched and shown as blob URLs
+async function loadThumbnails(container) {
+    for (const img of container.querySelectorAll("img[data-thumb]")) {
+        try {
+            const res = await fetch(img.dataset.thumb, { headers: { "Authorization": "Bearer " + token } });
+            if (!res.ok) { img.remove(); continue; }
+            img.src = URL.createObjectURL(await res.blob());
+            img.onload = () => URL.revokeObjectURL(img.src);
+        } catch (e) { img.remove(); }
+    }
+}
+
+function describeImage(info) {
+    if (!info || (!info.width && !info.error)) return "";
+    if (info.error) return `Could not be decoded: ${escapeHtml(info.error)}`;
+    const parts = [`${info.width} × ${info.height}`, info.format];
+    if (info.frames > 1) parts.push(`${info.frames} frames`);
+    if (info.exif && (info.exif.make || info.exif.model)) parts.push(escapeHtml([info.exif.make, info.exif.model].filter(Boolean).join(" ")));
+    if (info.exif && info.exif.datetime_original) parts.push(escapeHtml(info.exif.datetime_original));
+    if (info.gps_removed) parts.push("GPS location removed");
+    return parts.join(" · ");
+}
+
 /* ── View Submission Detail ────────────────────────────────── */
 async function viewSubmission(sid) {
     try {
@@ -254,14 +279,31 @@ async function viewSubmission(sid) {
         const maskedEmail = s.contributor_email.replace(/(.{2}).*(@.*)/, "$1***$2");
 
         let flagsHtml = "";
-        if (pii.length > 0) flagsHtml += `<span class="flag-badge flag-pii"><i class="fas fa-exclamation-triangle"></i> PII Detected</span>`;
-        if (prof === true || prof === "true") flagsHtml += `<span class="flag-badge flag-profanity"><i class="fas fa-exclamation-triangle"></i> Profanity Detected</span>`;
+        const piiInfo = JSON.parse(s.pii_matches || '{"counts":{},"matches":[]}');
+        const piiCounts = Object.entries(piiInfo.counts).map(([k, v]) => `${k.replace("_", " ")} ×${v}`).join(", ");
+        if (pii.length > 0) flagsHtml += `<span class="flag-badge flag-pii"><i class="fas fa-exclamation-triangle"></i> PII Detected${piiCounts ? ` (${piiCounts})` : ""}</span>`;
+        // Older rows store a bare boolean, newer ones the list of matched terms
+        const profTerms = Array.isArray(prof) ? [...new Set(prof.map(m => m.term))] : [];
+        const hasProf = prof === true || prof === "true" || profTerms.length > 0;
+        if (hasProf) flagsHtml += `<span class="flag-badge flag-profanity"><i class="fas fa-exclamation-triangle"></i> Profanity Detected${profTerms.length ? ` (${escapeHtml(profTerms.join(", "))})` : ""}</span>`;
         if (s.duplicate_flag) flagsHtml += `<span class="flag-badge flag-duplicate"><i class="fas fa-copy"></i> Possible Duplicate</span>`;
-        if (!pii.length && !prof && !s.duplicate_flag) flagsHtml += `<span class="flag-badge flag-clean"><i class="fas fa-check-circle"></i> Clean</span>`;
+        if (!pii.length && !hasProf && !s.duplicate_flag) flagsHtml += `<span class="flag-badge flag-clean"><i class="fas fa-check-circle"></i> Clean</span>`;
+        const dupMatches = JSON.parse(s.duplicate_matches || "[]");
+        if (dupMatches.length > 0) {
+            flagsHtml += `<div style="font-size:13px;margin-top:8px;color:var(--text-muted)">Matches: ` +
+                dupMatches.map(m => `<a href="#" onclick="viewSubmission('${m.id}');return false">${m.id}</a> (${m.kind}, ${Math.round(m.score * 100)}%)`).join(", ") +
+                `</div>`;
+        }
 
         let previewsHtml = "";
         if (s.file_previews && s.file_previews.length > 0) {
-            previewsHtml = s.file_previews.map(fp => `
+            previewsHtml = s.file_previews.map(fp => fp.image ? `
+                <div style="margin-top:8px">
+                    <div style="font-size:13px;font-weight:600;margin-bottom:4px"><i class="fas fa-image"></i> ${escapeHtml(fp.file)}</div>
+                    ${fp.thumbnail ? `<img class="file-thumb" data-thumb="${fp.thumbnail}" alt="${escapeHtml(fp.file)}">` : ""}
+                    <div style="font-size:12px;color:var(--text-muted)">${describeImage(fp.image)}</div>
+                </div>
+            ` : `
                 <div style="margin-top:8px">
                     <div style="font-size:13px;font-weight:600;margin-bottom:4px"><i class="fas fa-file"></i> ${fp.file}</div>
                     <div class="text-preview">${escapeHtml(fp.preview || "[No text extracted]")}</div>
@@ -285,7 +327,7 @@ async function viewSubmission(sid) {
             ${s.text_content ? `
             <div class="detail-section">
                 <h4><i class="fas fa-align-left"></i> Text Content</h4>
-                <div class="text-preview">${escapeHtml(s.text_content)}</div>
+                <div class="text-preview">${highlightSpans(s.text_content, piiInfo.matches.filter(m => m.source === "text"))}</div>
             </div>` : ""}
 
             ${previewsHtml ? `
@@ -308,6 +350,8 @@ async function viewSubmission(sid) {
             </div>` : ""}
         `;
 
+        loadThumbnails(document.getElementById("detailContent"));
+
         // Actions
         const actions = document.getElementById("detailActions");
         if (s.status === "PENDING") {
@@ -632,3 +676,21 @@ function escapeHtml(text) {
     div.textContent = text || "";
     return div.innerHTML;
 }
+
+// Search snippets arrive with \x02 / \x03 around matched terms
+function renderSnippet(snippet) {
+    return escapeHtml(snippet).replace(/\x02/g, "<mark>").replace(/\x03/g, "</mark>");
+}
+
+// Escape text and wrap each {start, end} span (e.g. PII matches) in <mark>
+function highlightSpans(text, spans) {
+    text = text || "";
+    let html = "", pos = 0;
+    [...spans].sort((a, b) => a.start - b.start).forEach(m => {
+        if (m.start < pos) return;
+        html += escapeHtml(text.slice(pos, m.start));
+        html += `<mark class="pii-mark" title="${m.type}">${escapeHtml(text.slice(m.start, m.end))}</mark>`;
+        pos = m.end;
+    });
+    return html + escapeHtml(text.slice(pos));
+}
@@ -0,0 +1,50 @@
+import os, tempfile
+
+# backend.main creates its database, storage and exports under DATA_DIR at import time
+_data_dir = tempfile.mkdtemp(prefix="mozhii-tests-")
+os.environ["DATA_DIR"] = _data_dir
+os.environ.setdefault("STATIC_BUILD", os.path.join(_data_dir, "static"))
+# Ingest and HF pushes are driven by the tests (drain_ingest, run_once), not by background workers
+os.environ["INGEST_WORKERS"] = "0"
+os.environ["HF_WORKERS"] = "0"
+for _limit in ("RATE_SUBMIT_IP", "RATE_SUBMIT_EMAIL", "RATE_FEEDBACK_IP", "RATE_FEEDBACK_EMAIL"):
+    os.environ[_limit] = "1000000/1"
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    from backend import main
+    return main
+
+
+@pytest.fixture
+def client(app_module):
+    """TestClient without the lifespan; ingest runs via drain_ingest."""
+    from fastapi.testclient import TestClient
+    return TestClient(app_module.app)
+
+
+@pytest.fixture
+def admin_headers(app_module):
+    return {"Authorization": "Bearer " + app_module.create_token("Vipooshan")}
+
+
+@pytest.fixture
+def submit(client):
+    def submit(text="", files=(), **form):
+        data = {"language": "tamil", "contributor_name": "Test", "contributor_email": "test@example.com",
+                "consent": "true", "text_content": text, **form}
+        r = client.post("/api/submit", data=data, files=[("files", f) for f in files] or None)
+        assert r.status_code == 202, r.text
+        return r.json()["submission_id"]
+    return submit
+
+
+@pytest.fixture
+def drain_ingest(app_module):
+    def drain():
+        while app_module.ingest_pipeline.run_once():
+            pass
+    return drain
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+
+def test_rate_limit_refusal_runs_off_the_loop_and_carries_cors_headers(client, app_module, monkeypatch):
+    takes = []
+
+    def take(key, limit):
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()  # a worker thread, not the event loop
+        takes.append(key)
+        return 7.2
+
+    monkeypatch.setattr(app_module.rate_limiter, "take", take)
+    r = client.post("/api/feedback", json={"message": "hello"}, headers={"Origin": "https://example.org"})
+    assert r.status_code == 429
+    assert r.headers["retry-after"] == "8"
+    assert r.headers["access-control-allow-origin"] in ("*", "https://example.org")
+    assert takes and takes[0].startswith("/api/feedback:ip:")
+
+
+def test_missing_content_length_is_refused_with_cors_headers(client):
+    r = client.post("/api/feedback", content=iter([b"{}"]),
+                    headers={"Origin": "https://example.org", "Content-Type": "application/json"})
+    assert r.status_code == 411
+    assert "access-control-allow-origin" in r.headers
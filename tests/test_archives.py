@@ -0,0 +1,52 @@
+import io, zipfile
+
+import pytest
+
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def _outcome(app_module, sid):
+    conn = app_module.get_db()
+    try:
+        status = conn.execute("SELECT status FROM submissions WHERE id=?", (sid,)).fetchone()["status"]
+        audits = [(r["action"], r["reason"]) for r in conn.execute(
+            "SELECT action, reason FROM audit_log WHERE submission_id=?", (sid,))]
+        jobs = conn.execute("SELECT COUNT(*) FROM ingest_jobs WHERE submission_id=?", (sid,)).fetchone()[0]
+    finally:
+        conn.close()
+    return status, audits, jobs
+
+
+@pytest.mark.parametrize("name, archive, reason", [
+    # 4MB of zeros deflates to a few KB: far past the 100:1 ratio once over the 1MB floor
+    ("bomb.zip", _zip([("zeros.txt", b"\0" * (4 * 1024 * 1024))]), "compression ratio"),
+    ("many.zip", _zip([(f"f{i}.txt", b"x") for i in range(1001)], zipfile.ZIP_STORED), "more than 1000 files"),
+    ("nested.zip", _zip([("readme.txt", b"hello"), ("inner.zip", _zip([("a.txt", b"a")]))]), "nested archive"),
+    ("traversal.zip", _zip([("../../etc/cron.d/evil", b"* * * * * root true")]), "unsafe member path"),
+])
+def test_hostile_archives_are_auto_rejected(app_module, submit, drain_ingest, name, archive, reason):
+    sid = submit(files=[(name, archive, "application/zip")])
+    drain_ingest()
+
+    status, audits, jobs = _outcome(app_module, sid)
+    assert status == "REJECTED"
+    assert len(audits) == 1
+    action, audit_reason = audits[0]
+    assert action == "AUTO_REJECTED"
+    assert audit_reason.startswith(f"Archive {name} rejected") and reason in audit_reason
+    assert jobs == 0
+
+
+def test_plain_archive_is_analysed(app_module, submit, drain_ingest):
+    sid = submit(files=[("notes.zip", _zip([("a.txt", "archive member text".encode("utf-8")),
+                                            ("docs/b.txt", b"second member")]), "application/zip")])
+    drain_ingest()
+
+    status, audits, _ = _outcome(app_module, sid)
+    assert status == "PENDING" and audits == []
@@ -0,0 +1,28 @@
+import json
+
+
+def test_a_bare_until_date_includes_that_day(client, admin_headers, submit, drain_ingest, app_module):
+    created = {"2021-01-30T08:00:00": None, "2021-01-31T00:00:00": None,
+               "2021-01-31T23:59:59.500000": None, "2021-02-01T00:00:00": None}
+    for i, ts in enumerate(created):
+        created[ts] = submit(f"export window text number {i}")
+    drain_ingest()
+    r = client.post("/api/admin/submissions/bulk", headers=admin_headers,
+                    json={"action": "approve", "ids": list(created.values())})
+    assert r.json()["processed"] == 4
+    conn = app_module.get_db()
+    try:
+        conn.executemany("UPDATE submissions SET created_at=? WHERE id=?", created.items())
+        conn.commit()
+    finally:
+        conn.close()
+
+    def exported(**params):
+        r = client.get("/api/admin/export", headers=admin_headers, params={"since": "2021-01-01", **params})
+        assert r.status_code == 200, r.text
+        return [json.loads(line)["created_at"] for line in r.text.splitlines()]
+
+    assert exported(until="2021-01-31") == ["2021-01-30T08:00:00", "2021-01-31T00:00:00",
+                                            "2021-01-31T23:59:59.500000"]
+    # A full timestamp is still an exclusive bound
+    assert exported(until="2021-01-31T00:00:00") == ["2021-01-30T08:00:00"]
@@ -0,0 +1,28 @@
+def test_bulk_approve_queues_one_job_with_an_item_per_submission(client, admin_headers, submit, drain_ingest,
+                                                                 app_module):
+    sids = [submit(f"bulk review text number {i}") for i in range(3)]
+    drain_ingest()
+
+    r = client.post("/api/admin/submissions/bulk", headers=admin_headers,
+                    json={"action": "approve", "ids": sids + ["MZH-FFFFFFFF"]})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["processed"] == 3
+    job_id = body["hf_job_ids"]["raw_text"]
+    assert [res.get("hf_job_id") for res in body["results"]] == [job_id] * 3 + [None]
+
+    conn = app_module.get_db()
+    try:
+        items = [r["submission_id"] for r in conn.execute(
+            "SELECT submission_id FROM hf_job_items WHERE job_id=? ORDER BY submission_id", (job_id,))]
+        assert items == sorted(sids)
+        assert conn.execute("SELECT submission_id FROM hf_jobs WHERE id=?", (job_id,)).fetchone()[0] == ""
+    finally:
+        conn.close()
+
+    detail = client.get(f"/api/admin/submission/{sids[1]}", headers=admin_headers).json()
+    assert [j["id"] for j in detail["hf_jobs"]] == [job_id]
+
+    again = client.post("/api/admin/submissions/bulk", headers=admin_headers,
+                        json={"action": "approve", "ids": sids[:1]}).json()
+    assert again["processed"] == 0 and again["hf_job_ids"] == {}
@@ -0,0 +1,9 @@
+import threading
+
+
+def test_importing_main_starts_no_background_workers(app_module):
+    # backend.cli imports main for its database and extractor; the workers belong to the server
+    names = {t.name for t in threading.enumerate()}
+    assert not names & {"export-outbox", "retention", "storage-reconcile"}
+    assert not any(n.startswith(("ingest-", "hf-queue-")) for n in names)
+    assert app_module._start_workers in app_module.app.router.on_startup
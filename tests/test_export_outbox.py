@@ -0,0 +1,71 @@
+import json, sqlite3
+
+from backend.export_outbox import ExportOutbox, EXPORT_OUTBOX_SCHEMA
+from backend.export_writer import ExportWriter
+
+
+def _shard_ids(writer, lang):
+    ids = []
+    for shard in writer.manifest(lang)["shards"]:
+        with open(writer.root / lang / shard["name"], encoding="utf-8") as f:
+            ids += [json.loads(line)["id"] for line in f]
+    return ids
+
+
+def test_failed_flush_keeps_the_approval_export_and_hf_job(client, admin_headers, submit, drain_ingest,
+                                                            app_module, monkeypatch):
+    sid = submit("outbox approval text")
+    drain_ingest()
+
+    def broken(lang, fetch):
+        raise OSError("disk full")
+    monkeypatch.setattr(app_module.export_writer, "append_from", broken)
+    r = client.post(f"/api/admin/submission/{sid}/approve", headers=admin_headers)
+    assert r.status_code == 200
+    assert r.json()["hf_job_id"] is not None
+
+    conn = app_module.get_db()
+    try:
+        rows = conn.execute("SELECT entry FROM export_outbox WHERE language='tamil'").fetchall()
+        assert [json.loads(r["entry"])["id"] for r in rows] == [sid]
+        assert app_module.hf_jobs.jobs_for(conn, sid)
+    finally:
+        conn.close()
+    assert sid not in _shard_ids(app_module.export_writer, "tamil")
+
+    monkeypatch.undo()
+    app_module.export_outbox.flush("tamil")
+    app_module.export_outbox.flush("tamil")
+    assert _shard_ids(app_module.export_writer, "tamil").count(sid) == 1
+    conn = app_module.get_db()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM export_outbox").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_rows_left_after_a_crashed_flush_are_not_written_twice(tmp_path):
+    db = tmp_path / "outbox.db"
+
+    def get_conn():
+        conn = sqlite3.connect(db)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    conn = get_conn()
+    for stmt in EXPORT_OUTBOX_SCHEMA:
+        conn.execute(stmt)
+    writer = ExportWriter(tmp_path / "exports", compression="")
+    outbox = ExportOutbox(get_conn, writer, batch=2)
+    outbox.add(conn, "tamil", [{"id": f"MZH-{i}"} for i in range(5)])
+    conn.commit()
+
+    # A flush that wrote the shard and died before deleting its rows
+    writer.append_from("tamil", lambda after: outbox._pending(conn, "tamil", after))
+    assert conn.execute("SELECT COUNT(*) FROM export_outbox").fetchone()[0] == 5
+    conn.close()
+
+    assert outbox.flush() == 3
+    assert _shard_ids(writer, "tamil") == [f"MZH-{i}" for i in range(5)]
+    assert writer.manifest("tamil")["outbox_id"] == 5
+    assert outbox.flush() == 0
@@ -0,0 +1,49 @@
+import pytest
+
+from backend import main
+from backend.extraction import ExtractionCache
+
+
+def cached_bytes(conn):
+    row = conn.execute("SELECT value FROM stats_counters WHERE key='extraction_cache:bytes'").fetchone()
+    return row["value"] if row else 0
+
+
+@pytest.fixture
+def conn():
+    conn = main.get_db()
+    conn.execute("DELETE FROM extraction_cache")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_byte_counter_follows_inserts_updates_and_evictions(conn):
+    cache = ExtractionCache(main.get_db, max_bytes=1000, evict_to=0.9)
+    cache.put_many({"a": "x" * 300, "b": "y" * 300})
+    assert cached_bytes(conn) == 600
+    cache.put("a", "x" * 100)  # same key, new text
+    assert cached_bytes(conn) == 400
+    cache.put("c", "z" * 700)  # 1100 bytes: evict the oldest until at most 900 are left
+    assert cached_bytes(conn) == conn.execute("SELECT SUM(size) s FROM extraction_cache").fetchone()["s"] == 800
+    assert cache.get("b") is None and cache.get("c") == "z" * 700
+
+
+def test_hits_are_written_in_batches(conn):
+    cache = ExtractionCache(main.get_db, touch_batch=3)
+    cache.put_many({"a": "1", "b": "2", "c": "3"})
+    conn.execute("UPDATE extraction_cache SET last_used=0")
+    conn.commit()
+    assert cache.get("a") == "1" and cache.get_many(["b"]) == {"b": "2"}
+    assert conn.execute("SELECT MAX(last_used) m FROM extraction_cache").fetchone()["m"] == 0
+    cache.get("c")  # third pending hit flushes
+    assert conn.execute("SELECT COUNT(*) n FROM extraction_cache WHERE last_used > 0").fetchone()["n"] == 3
+
+
+def test_eviction_uses_the_batched_hits(conn):
+    cache = ExtractionCache(main.get_db, max_bytes=30, evict_to=1.0)
+    cache.put("old", "o" * 10)
+    cache.put("new", "n" * 10)
+    cache.get("old")  # pending, written by the next put
+    cache.put("third", "t" * 15)
+    assert cache.get("new") is None and cache.get("old") == "o" * 10
@@ -0,0 +1,60 @@
+import asyncio, time
+
+import pytest
+
+from backend.extraction import ExtractionExecutor, ExtractionQueueFull
+
+
+def spin():
+    while True:
+        pass
+
+
+def nap(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.fixture
+def executor():
+    ex = ExtractionExecutor(workers=2, max_queue=4, timeout=30)
+    yield ex
+    ex.shutdown()
+
+
+def test_timeout_kills_the_worker(executor):
+    async def go():
+        await executor.run(nap, 0)
+        pool = executor._pool
+        workers = list(pool._processes.values())
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(spin, timeout=1)
+        assert executor.depth == 0
+        assert executor._pool is None
+        for proc in workers:
+            proc.join(5)
+        assert not any(proc.is_alive() for proc in workers)
+        # The next job gets a fresh pool
+        assert await executor.run(nap, 0) == 0
+        assert executor._pool is not pool
+    asyncio.run(go())
+
+
+def test_jobs_sharing_a_killed_pool_are_rerun(executor):
+    async def go():
+        return await asyncio.gather(executor.run(spin, timeout=1), executor.run(nap, 1.5),
+                                    executor.run(nap, 0.2), return_exceptions=True)
+    hung, slow, queued = asyncio.run(go())
+    assert isinstance(hung, asyncio.TimeoutError)
+    assert (slow, queued) == (1.5, 0.2)
+    assert executor.depth == 0
+
+
+def test_queue_cap(executor):
+    async def go():
+        jobs = [asyncio.ensure_future(executor.run(nap, 0.5)) for _ in range(4)]
+        await asyncio.sleep(0)
+        with pytest.raises(ExtractionQueueFull):
+            await executor.run(nap, 0)
+        return await asyncio.gather(*jobs)
+    assert asyncio.run(go()) == [0.5] * 4
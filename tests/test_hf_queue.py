@@ -0,0 +1,181 @@
+import json, time
+
+import pytest
+
+from backend import hf_queue
+from backend.hf_queue import HFPushQueue
+
+
+class FakeHfApi:
+    """Records create_repo/create_commit calls; fails the next `failures` commits."""
+
+    def __init__(self, token=None, failures=0):
+        self.token = token
+        self.failures = failures
+        self.repos, self.commits = [], []
+
+    def create_repo(self, repo_id, **kwargs):
+        self.repos.append(repo_id)
+
+    def create_commit(self, repo_id, operations, commit_message, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("503 Service Unavailable")
+        self.commits.append({"repo_id": repo_id, "paths": sorted(p for p, _ in operations),
+                             "message": commit_message})
+
+
+@pytest.fixture
+def conn(app_module):
+    conn = app_module.get_db()
+    conn.execute("DELETE FROM hf_job_items")
+    conn.execute("DELETE FROM hf_jobs")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def make_queue(app_module, api, repo="org/raw"):
+    settings = {"hf_token": "hf_test", "repo_raw_text": repo}
+    return HFPushQueue(app_module.get_db, lambda: settings, api_factory=lambda token: api,
+                       operation_factory=lambda path, source: (path, source), batch_window=0)
+
+
+def job(conn, job_id):
+    return conn.execute("SELECT * FROM hf_jobs WHERE id=?", (job_id,)).fetchone()
+
+
+def text_file(name):
+    return [{"name": name, "content": "hello"}]
+
+
+def test_batch_is_one_commit_with_an_item_per_submission(app_module, conn):
+    api = FakeHfApi()
+    queue = make_queue(app_module, api)
+    job_id = queue.enqueue_batch(conn, "raw_text", [("MZH-AAAA0001", "tamil", text_file("a.txt")),
+                                                    ("MZH-AAAA0002", "sinhala", text_file("b.txt"))])
+    single = queue.enqueue(conn, "raw_text", text_file("c.txt"), "MZH-AAAA0003", "tamil")
+    conn.commit()
+
+    assert job(conn, job_id)["submission_id"] == "" and job(conn, single)["submission_id"] == "MZH-AAAA0003"
+    assert [j["id"] for j in queue.jobs_for(conn, "MZH-AAAA0002")] == [job_id]
+    plan = [r["detail"] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT job_id FROM hf_job_items WHERE submission_id=?", ("x",))]
+    assert "idx_hf_job_items_submission" in plan[0]
+
+    assert queue.run_once() == 2
+    assert api.repos == ["org/raw"]
+    assert len(api.commits) == 1
+    assert api.commits[0]["paths"] == ["sinhala/MZH-AAAA0002/b.txt", "tamil/MZH-AAAA0001/a.txt",
+                                       "tamil/MZH-AAAA0003/c.txt"]
+    assert "3 approved submission(s)" in api.commits[0]["message"]
+    assert {job(conn, i)["status"] for i in (job_id, single)} == {"DONE"}
+    summary = queue.summary(conn)
+    assert {j["id"]: j["submission_ids"] for j in summary["jobs"]}[job_id] == ["MZH-AAAA0001", "MZH-AAAA0002"]
+
+
+def test_failed_push_backs_off_then_succeeds(app_module, conn, monkeypatch):
+    monkeypatch.setattr(hf_queue, "HF_BACKOFF_BASE", 30)
+    api = FakeHfApi(failures=2)
+    queue = make_queue(app_module, api)
+    job_id = queue.enqueue(conn, "raw_text", text_file("a.txt"), "MZH-BBBB0001", "tamil")
+    conn.commit()
+
+    def backoff():
+        # _finish schedules from the wall clock, whatever time the claim used
+        return job(conn, job_id)["next_attempt_at"] - time.time()
+
+    assert queue.run_once(now=time.time() + 1) == 1
+    row = job(conn, job_id)
+    assert (row["status"], row["attempts"]) == ("QUEUED", 1)
+    assert "503" in row["last_error"]
+    assert 30 * 0.8 - 5 <= backoff() <= 30 * 1.2
+    assert queue.run_once(now=time.time() + 1) == 0  # not due yet
+
+    assert queue.run_once(now=row["next_attempt_at"]) == 1
+    row = job(conn, job_id)
+    assert row["attempts"] == 2 and 60 * 0.8 - 5 <= backoff() <= 60 * 1.2
+
+    assert queue.run_once(now=row["next_attempt_at"]) == 1
+    row = job(conn, job_id)
+    assert (row["status"], row["attempts"], len(api.commits)) == ("DONE", 3, 1)
+
+
+def test_gives_up_after_max_attempts_and_can_be_retried(app_module, conn, monkeypatch):
+    monkeypatch.setattr(hf_queue, "HF_MAX_ATTEMPTS", 2)
+    api = FakeHfApi(failures=5)
+    queue = make_queue(app_module, api)
+    job_id = queue.enqueue(conn, "raw_text", text_file("a.txt"), "MZH-CCCC0001", "tamil")
+    conn.commit()
+    queue.run_once(now=time.time() + 1)
+    queue.run_once(now=time.time() + hf_queue.HF_BACKOFF_MAX * 2)
+    assert job(conn, job_id)["status"] == "FAILED"
+    assert queue.retry(conn, job_id)
+    conn.commit()
+    assert (job(conn, job_id)["status"], job(conn, job_id)["attempts"]) == ("QUEUED", 0)
+
+
+def test_expired_lease_is_claimed_again(app_module, conn):
+    queue = make_queue(app_module, FakeHfApi())
+    job_id = queue.enqueue(conn, "raw_text", text_file("a.txt"), "MZH-DDDD0001", "tamil")
+    conn.commit()
+    now = time.time() + 1
+    claimed = queue._claim(now)  # a worker that dies before _push
+    assert [j["id"] for j in claimed] == [job_id]
+    assert queue.run_once(now=now + 1) == 0  # still leased
+    assert queue.run_once(now=now + hf_queue.HF_LEASE_SECONDS + 1) == 1
+    assert job(conn, job_id)["status"] == "DONE"
+
+
+def test_unconfigured_repo_is_skipped(app_module, conn):
+    api = FakeHfApi()
+    queue = make_queue(app_module, api, repo="")
+    job_id = queue.enqueue(conn, "raw_text", text_file("a.txt"), "MZH-EEEE0001", "tamil")
+    conn.commit()
+    assert queue.run_once() == 1
+    assert job(conn, job_id)["status"] == "SKIPPED" and api.commits == []
+
+
+def test_job_whose_files_are_all_missing_fails(app_module, conn, tmp_path):
+    present = tmp_path / "present.txt"
+    present.write_text("here")
+    api = FakeHfApi()
+    queue = make_queue(app_module, api)
+    gone = queue.enqueue(conn, "raw_text", [{"name": "a.txt", "path": str(tmp_path / "gone-a.txt")}],
+                         "MZH-FFFF0001", "tamil")
+    partial = queue.enqueue(conn, "raw_text", [{"name": "b.txt", "path": str(present)},
+                                               {"name": "c.txt", "path": str(tmp_path / "gone-c.txt")}],
+                            "MZH-FFFF0002", "tamil")
+    conn.commit()
+
+    assert queue.run_once() == 2
+    assert api.commits[0]["paths"] == ["tamil/MZH-FFFF0002/b.txt"]
+    row = job(conn, gone)
+    assert row["status"] == "FAILED" and "gone-a.txt" in row["last_error"]
+    row = job(conn, partial)
+    assert row["status"] == "DONE" and "1 file(s) missing" in row["last_error"]
+
+
+def test_migrate_blobs_rewrites_queued_job_paths(app_module, conn, submit):
+    from backend.blobstore import migrate_legacy_files
+
+    sid = submit("legacy submission with a file")
+    legacy = app_module.STORAGE / "pending" / "tamil" / sid / "notes.txt"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_text("notes from before the blob store")
+    conn.execute("UPDATE submissions SET file_paths=?, file_hashes='[]' WHERE id=?",
+                 (f'["{legacy}"]', sid))
+    api = FakeHfApi()
+    queue = make_queue(app_module, api)
+    job_id = queue.enqueue(conn, "raw_text", [{"name": "notes.txt", "path": str(legacy)}], sid, "tamil")
+    conn.commit()
+
+    migrate_legacy_files(app_module.blob_store, app_module.STORAGE)
+    assert not legacy.exists()
+    path = json.loads(job(conn, job_id)["files"])[0]["path"]
+    assert app_module.blob_store.key_of(path)
+    assert path == json.loads(conn.execute("SELECT file_paths FROM submissions WHERE id=?", (sid,)).fetchone()[0])[0]
+
+    assert queue.run_once() == 1
+    assert job(conn, job_id)["status"] == "DONE"
+    assert api.commits[0]["paths"] == [f"tamil/{sid}/notes.txt"]
@@ -0,0 +1,34 @@
+import io
+
+from PIL import Image
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 30, 30)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_images_skip_the_pool_and_analysis_stamps_updated_at(app_module, submit, drain_ingest, monkeypatch):
+    sid = submit("caption for the picture", files=[("photo.png", _png(), "image/png")])
+
+    parsed = []
+    real_run = app_module.extractor.run
+
+    async def run(func, *args, **kwargs):
+        parsed.append(func.__name__)
+        return await real_run(func, *args, **kwargs)
+
+    monkeypatch.setattr(app_module.extractor, "run", run)
+    drain_ingest()
+    assert "extract_text_from_file" not in parsed
+
+    conn = app_module.get_db()
+    try:
+        row = conn.execute("SELECT status, created_at, updated_at, extracted_text FROM submissions WHERE id=?",
+                           (sid,)).fetchone()
+    finally:
+        conn.close()
+    assert row["status"] == "PENDING"
+    assert row["updated_at"] and row["updated_at"] >= row["created_at"]
+    assert "[Image file]" not in row["extracted_text"]
@@ -0,0 +1,58 @@
+import random
+
+from backend.pii import CHUNK_CHARS, OVERLAP, PII_RE, _scan_chunks, flag_types, scan_pii, summarize
+
+
+def spans(matches):
+    return [(m["type"], m["start"], m["end"]) for m in matches]
+
+
+def whole_string(text):
+    return [(m.lastgroup, m.start(), m.end()) for m in PII_RE.finditer(text)]
+
+
+def test_a_match_straddling_the_chunk_boundary_is_reported_once():
+    email = "someone.long@example.org"
+    # The chunk edge itself, and the first settled cut (two chunks in, less the overlap)
+    for start in (CHUNK_CHARS - 10, 2 * CHUNK_CHARS - OVERLAP - 10):
+        text = "x " * (start // 2) + email + " tail" + "y " * CHUNK_CHARS
+        assert text[start:start + len(email)] == email
+
+        matches = scan_pii(text)
+        assert spans(matches) == [("email", start, start + len(email))]
+        assert text[matches[0]["start"]:matches[0]["end"]] == email
+
+
+def test_chunked_scan_equals_one_finditer_over_the_whole_string():
+    rnd = random.Random(7)
+    samples = ["user{}@example.com", "077-{:03d}-4567", "192.168.{}.1", "4111 1111 1111 {:04d}", "98765{:04d}1"]
+    words = []
+    while sum(len(w) + 1 for w in words) < 3 * CHUNK_CHARS:
+        words.append(rnd.choice(samples).format(rnd.randrange(1000)) if rnd.random() < 0.1 else "word")
+    text = " ".join(words)
+
+    expected = whole_string(text)
+    assert len(expected) > 100
+    assert spans(scan_pii(text)) == expected
+    # Uneven chunks, as pages arrive from the extractor
+    cuts = sorted(rnd.sample(range(1, len(text)), 40))
+    chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+    assert spans(_scan_chunks(chunks, "file")) == expected
+    assert spans(_scan_chunks([text[i:i + 1000] for i in range(0, len(text), 1000)], "file")) == expected
+
+
+def test_offsets_source_and_counts():
+    text = "mail a@b.org or call 077-123-4567, twice: 077-123-4567 from 10.0.0.1"
+    matches = scan_pii(text, source="notes.txt")
+    assert [text[m["start"]:m["end"]] for m in matches] == ["a@b.org", "077-123-4567", "077-123-4567", "10.0.0.1"]
+    assert {m["source"] for m in matches} == {"notes.txt"}
+
+    summary = summarize(matches)
+    assert summary["counts"] == {"email": 1, "phone": 2, "ip": 1}
+    assert summary["total"] == 4
+    assert flag_types(matches) == ["email", "ip", "phone"]
+
+
+def test_email_top_level_domain_does_not_accept_a_pipe():
+    assert scan_pii("x@y.c|m") == []
+    assert spans(scan_pii("x@y.com|z")) == [("email", 0, 7)]
@@ -0,0 +1,42 @@
+from backend.profanity import ProfanityFilter, bump_version
+
+
+def add_word(conn, word):
+    conn.execute("INSERT OR IGNORE INTO profanity_words (language, word, added_by, created_at) "
+                 "VALUES ('english', ?, 'test', '')", (word,))
+    bump_version(conn)
+    conn.commit()
+
+
+def test_scan_checks_the_version_at_most_once_per_interval(app_module):
+    queries = []
+
+    def get_conn():
+        conn = app_module.get_db()
+        queries.append(1)
+        return conn
+
+    pf = ProfanityFilter(get_conn, check_interval=3600)
+    for _ in range(50):
+        pf.scan("nothing to see here")
+    assert len(queries) == 1
+
+
+def test_edits_are_picked_up_after_the_interval(app_module):
+    pf = ProfanityFilter(app_module.get_db, check_interval=3600)
+    assert pf.scan("a zorblax appears") == []
+    conn = app_module.get_db()
+    try:
+        add_word(conn, "zorblax")
+    finally:
+        conn.close()
+    assert pf.scan("a zorblax appears") == []  # another worker's edit, not checked yet
+    pf._checked_at -= 3600
+    assert [m["term"] for m in pf.scan("a zorblax appears")] == ["zorblax"]
+
+
+def test_admin_edit_refreshes_the_handling_worker(app_module, client, admin_headers):
+    r = client.post("/api/admin/profanity-words", headers=admin_headers,
+                    json={"language": "english", "words": ["quuxword"]})
+    assert r.status_code == 200
+    assert [m["term"] for m in app_module.profanity_filter.scan("say quuxword")] == ["quuxword"]
@@ -0,0 +1,102 @@
+import hashlib, io, json, sqlite3
+
+from backend import dedupe
+
+TEXT = ("தமிழ் மொழி உலகின் மிகப் பழமையான மொழிகளில் ஒன்றாகும். "
+        "இது இலங்கை மற்றும் இந்தியாவில் பேசப்படுகிறது. ") * 3
+
+
+def test_rededupe_rebuilds_flags_without_holding_the_write_lock(app_module, submit, drain_ingest, monkeypatch):
+    first = submit(TEXT)
+    exact = submit(TEXT)
+    near = submit(TEXT.replace("மொழி", "மொழீ", 1) + " மேலும்")
+    drain_ingest()
+
+    conn = app_module.get_db()
+    try:
+        conn.execute("UPDATE submissions SET duplicate_flag=0, duplicate_matches=NULL WHERE id IN (?,?,?)",
+                     (first, exact, near))
+        conn.execute("DELETE FROM content_hashes WHERE submission_id IN (?,?,?)", (first, exact, near))
+        conn.commit()
+
+        # Matching runs in the parent; another writer must get the lock meanwhile
+        writes = []
+        real_find = dedupe.find_near_duplicates
+
+        def find_and_write(*args, **kwargs):
+            other = sqlite3.connect(app_module.DB_PATH, timeout=0)
+            other.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('rededupe_test', 'x')")
+            other.commit()
+            other.close()
+            writes.append(1)
+            return real_find(*args, **kwargs)
+
+        monkeypatch.setattr(dedupe, "find_near_duplicates", find_and_write)
+        result = dedupe.rededupe_corpus(conn, workers=1, batch_size=2)
+        assert writes and result["submissions"] >= 3
+
+        rows = {r["id"]: r for r in conn.execute(
+            "SELECT id, duplicate_flag, duplicate_matches FROM submissions WHERE id IN (?,?,?)", (first, exact, near))}
+        assert rows[first]["duplicate_flag"] == 0
+        assert {"id": first, "kind": "exact", "score": 1.0} in json.loads(rows[exact]["duplicate_matches"])
+        assert any(m["id"] == first and m["kind"] == "near" for m in json.loads(rows[near]["duplicate_matches"]))
+        assert conn.execute("SELECT COUNT(*) n FROM content_hashes WHERE submission_id=?", (first,)).fetchone()["n"]
+    finally:
+        conn.close()
+
+
+def _jpeg_with_gps() -> bytes:
+    from PIL import Image
+    exif = Image.Exif()
+    gps = exif.get_ifd(0x8825)
+    gps[1], gps[2], gps[3], gps[4] = "N", (6.0, 55.0, 12.3), "E", (80.0, 1.0, 2.0)
+    buf = io.BytesIO()
+    Image.new("RGB", (96, 64), (20, 120, 200)).save(buf, "JPEG", exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def test_rededupe_keeps_the_hash_of_an_image_uploaded_with_gps(app_module, submit, drain_ingest):
+    original = _jpeg_with_gps()
+    digest = hashlib.sha256(original).hexdigest()
+    sid = submit(files=[("holiday.jpg", original, "image/jpeg")])
+    drain_ingest()
+
+    conn = app_module.get_db()
+    try:
+        row = conn.execute("SELECT file_hashes, metadata FROM submissions WHERE id=?", (sid,)).fetchone()
+        assert json.loads(row["file_hashes"]) != [digest]  # the GPS-free copy replaced it
+        assert json.loads(row["metadata"])["images"][0]["original_sha256"] == digest
+
+        dedupe.rededupe_corpus(conn, workers=1)
+        hashes = {r["hash"] for r in conn.execute("SELECT hash FROM content_hashes WHERE submission_id=? "
+                                                  "AND kind='file'", (sid,))}
+        assert digest in hashes and json.loads(row["file_hashes"])[0] in hashes
+    finally:
+        conn.close()
+
+    again = submit(files=[("holiday-again.jpg", original, "image/jpeg")])
+    drain_ingest()
+    conn = app_module.get_db()
+    try:
+        matches = json.loads(conn.execute("SELECT duplicate_matches FROM submissions WHERE id=?",
+                                          (again,)).fetchone()["duplicate_matches"])
+    finally:
+        conn.close()
+    assert {"id": sid, "kind": "exact", "score": 1.0} in matches
+
+
+def test_ingest_and_rededupe_sign_a_text_and_image_submission_alike(app_module, submit, drain_ingest):
+    sid = submit(TEXT + " ஒரு புகைப்படத்துடன்", files=[("photo.jpg", _jpeg_with_gps(), "image/jpeg"),
+                                                      ("notes.txt", "கூடுதல் குறிப்புகள் இங்கே".encode(), "text/plain")])
+    drain_ingest()
+
+    conn = app_module.get_db()
+    try:
+        def signature():
+            return conn.execute("SELECT signature FROM minhash_signatures WHERE submission_id=?",
+                                (sid,)).fetchone()["signature"]
+        at_ingest = signature()
+        dedupe.rededupe_corpus(conn, workers=1)
+        assert signature() == at_ingest
+    finally:
+        conn.close()
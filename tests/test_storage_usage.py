@@ -0,0 +1,59 @@
+import json, sqlite3
+
+
+def test_reconcile_fixes_refcount_drift_without_holding_the_write_lock(app_module, submit, drain_ingest,
+                                                                       monkeypatch):
+    sid = submit(files=[("notes.txt", "reconciler blob text".encode("utf-8"), "text/plain")])
+    drain_ingest()
+    reconciler = app_module.storage_reconciler
+
+    conn = app_module.get_db()
+    try:
+        key = app_module.blob_store.key_of(json.loads(conn.execute(
+            "SELECT file_paths FROM submissions WHERE id=?", (sid,)).fetchone()["file_paths"])[0])
+        conn.execute("UPDATE blobs SET refcount = refcount + 2 WHERE key=?", (key,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Another writer gets the lock mid-scan and takes a reference of its own
+    writes = []
+    real_key_of = app_module.blob_store.key_of
+
+    def key_of_and_write(path):
+        if not writes:
+            other = sqlite3.connect(app_module.DB_PATH, timeout=0)
+            other.execute("UPDATE blobs SET refcount = refcount + 1 WHERE key=?", (key,))
+            other.commit()
+            other.close()
+            writes.append(1)
+        return real_key_of(path)
+
+    monkeypatch.setattr(app_module.blob_store, "key_of", key_of_and_write)
+    result = reconciler.run_once()
+    monkeypatch.undo()
+    assert writes and result["refcounts_fixed"] >= 1
+
+    conn = app_module.get_db()
+    try:
+        refs = sum(1 for r in conn.execute("SELECT j.value AS path FROM submissions, json_each(submissions.file_paths) j")
+                   if real_key_of(r["path"]) == key)
+        # The drift is gone; the concurrent +1 survives
+        assert conn.execute("SELECT refcount FROM blobs WHERE key=?", (key,)).fetchone()[0] == refs + 1
+    finally:
+        conn.close()
+
+
+def test_reconcile_is_not_due_again_until_the_interval_passes(app_module):
+    reconciler = app_module.storage_reconciler
+    conn = app_module.get_db()
+    try:
+        conn.execute("DELETE FROM app_meta WHERE key='storage_reconcile_last_run'")
+        conn.commit()
+    finally:
+        conn.close()
+    assert reconciler.due_in(3600) <= 0
+
+    reconciler.run_once()
+    assert reconciler.due_in(3600) > 3500
+    assert reconciler.due_in(0) <= 0